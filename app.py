@@ -4,18 +4,20 @@ Main Streamlit Application with Enhanced Map Visualization
 """
 
 import streamlit as st
-import streamlit.components.v1 as components
+from streamlit_folium import st_folium
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from pathlib import Path
 import sys
+import uuid
 
 # Add src to path for imports
 sys.path.append('src')
 from utils.csv_data_loader import (
     load_optimization_results,
+    load_results_metadata,
     calculate_metrics_from_csv,
     get_available_states,
     load_coverage_data,
@@ -24,10 +26,18 @@ from utils.csv_data_loader import (
 from utils.choropleth_map import (
     create_choropleth_map,
     create_simple_markers_map,
+    viewport_feature_batch,
+    marker_layer_update,
+    CHOROPLETH_VIEWS,
     load_school_data,
     load_arts_facilities,
     load_hospital_data
 )
+from utils.deck_map import create_choropleth_deck, create_simple_markers_deck
+from utils.leaflet_page import create_choropleth_page, create_simple_markers_page
+from utils.manifest import refresh_manifest
+from utils.map_artifacts import embed_map
+from config import MAP_ENGINE, MAP_ENGINES
 
 # Page configuration
 st.set_page_config(
@@ -37,6 +47,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Pick up changed data files; cached loaders are keyed on file fingerprints
+refresh_manifest()
+
 # Initialize session state for analysis
 if 'analysis_run' not in st.session_state:
     st.session_state.analysis_run = False
@@ -50,6 +63,8 @@ if 'last_service' not in st.session_state:
     st.session_state.last_service = None
 if 'last_activation' not in st.session_state:
     st.session_state.last_activation = None
+# Whether the previous run showed the viewport map, so that its browser map still holds what was sent
+coverage_map_mounted = st.session_state.pop('coverage_map_shown', False)
 
 # Title and description
 st.title("🏫 School Infrastructure Sharing Decision Support System")
@@ -90,9 +105,21 @@ with st.sidebar:
         help="Percentage of high schools to activate as shared service locations"
     )
 
+    # Map rendering engine (default from DSS_MAP_ENGINE)
+    map_engine = st.radio(
+        "Map Engine",
+        options=list(MAP_ENGINES),
+        index=MAP_ENGINES.index(MAP_ENGINE),
+        format_func=lambda engine: {'folium': "Leaflet", 'leaflet': "Leaflet (lightweight)",
+                                    'pydeck': "WebGL (large states)"}[engine],
+        horizontal=True,
+        help="WebGL draws large states faster; Leaflet switches views and rates inside the map, "
+             "and its lightweight variant builds the same page several times faster"
+    )
+
     # Load data preview to show actual numbers
     with st.spinner("Loading state data..."):
-        preview_data = load_optimization_results(state, service)
+        preview_data = load_results_metadata(state, service)
         if preview_data and 'metadata' in preview_data:
             total_schools = preview_data['metadata'].get('n_schools', 1000)
             total_facilities = preview_data['metadata'].get('n_facilities', 500)
@@ -155,43 +182,48 @@ if run_analysis or (st.session_state.analysis_run and not params_changed):
         optimized_data = results['optimized'][activation]
         activated_schools_list = optimized_data.get('activated_schools', [])
 
-        if activated_schools_list:
-            # Map controls
-            map_controls = st.columns([2, 2, 2, 1])
+        if len(activated_schools_list) > 0:
+            # Map controls (the choropleth view is switched inside the map)
+            map_controls = st.columns([2, 2, 1, 1, 1, 1])
 
             with map_controls[0]:
-                # Choropleth view toggle
-                view_type = st.radio(
-                    "Map View",
-                    options=["Distance (km)", "% Improvement", "Coverage Status"],
-                    horizontal=True,
-                    help="Choose how to visualize coverage improvements"
-                )
-
-            with map_controls[1]:
                 show_facilities = st.checkbox("Show Existing Facilities", value=True)
 
-            with map_controls[2]:
+            with map_controls[1]:
                 show_schools = st.checkbox("Show Activated Schools", value=True)
 
-            with map_controls[3]:
+            with map_controls[2]:
                 use_simple_map = st.checkbox("Fast Mode", value=False,
                                              help="Use simpler map for faster loading")
 
-            # Display map info with legend based on view type
-            if view_type == "Coverage Status":
-                legend_text = """
-                **Map Legend:**
-                - 🟢 Green areas: Newly covered (within 10km after optimization)
-                - 🟡 Yellow areas: Already covered (within 10km before)
-                - 🔴 Red areas: Not covered (>10km even after optimization)
-                """
-            else:
-                legend_text = f"""
-                **Map Legend:**
-                - Colored areas: CBGs with distance improvement
-                - Gray areas: CBGs with no change (already well-served)
-                """
+            with map_controls[3]:
+                rate_sweep = st.checkbox("Rate Sweep", value=False, disabled=map_engine == 'pydeck',
+                                         help="Compare activation rates with a slider inside the map")
+
+            with map_controls[4]:
+                viewport_mode = st.checkbox("Viewport Mode", value=False, disabled=map_engine != 'folium',
+                                            help="Send only the CBGs in view, adding more as you pan and zoom; "
+                                                 "marker toggles then update only their layer")
+
+            with map_controls[5]:
+                raster = st.checkbox("Raster Overview", value=False, disabled=map_engine == 'pydeck',
+                                     help="Draw low zooms from pre-rendered tiles "
+                                          "(needs `python src/ingest.py raster` and a running tile server)")
+
+            # WebGL maps are coloured server-side, so the view is chosen here
+            view_type = CHOROPLETH_VIEWS[0]
+            if map_engine == 'pydeck' and not use_simple_map:
+                view_type = st.radio("Map View", options=CHOROPLETH_VIEWS, horizontal=True)
+
+            view_hint = ("with the Map View selector above" if map_engine == 'pydeck'
+                         else "with the selector in the top-right corner of the map")
+            legend_text = f"""
+            **Map Legend:** switch between Distance (km), % Improvement and
+            Coverage Status {view_hint}.
+            - Distance / % Improvement: colored CBGs improved, gray CBGs unchanged
+            - Coverage Status: 🟢 newly covered (within 10km after optimization),
+              🟡 already covered, 🔴 not covered (>10km even after optimization)
+            """
 
             st.info(f"""
             {legend_text}
@@ -202,7 +234,46 @@ if run_analysis or (st.session_state.analysis_run and not params_changed):
             # Create and display map
             with st.spinner(f"Loading map with {len(activated_schools_list)} school locations..."):
                 try:
-                    if use_simple_map:
+                    if map_engine == 'pydeck':
+                        # WebGL rendering for large states (same inputs as the folium maps)
+                        if use_simple_map:
+                            the_map = create_simple_markers_deck(
+                                state=state,
+                                service=service,
+                                activated_schools=activated_schools_list,
+                                show_facilities=show_facilities
+                            )
+                        else:
+                            the_map = create_choropleth_deck(
+                                state=state,
+                                service=service,
+                                activation_rate=activation,
+                                activated_schools=activated_schools_list,
+                                view_type=view_type,
+                                show_facilities=show_facilities,
+                                show_schools=show_schools
+                            )
+                    elif map_engine == 'leaflet':
+                        # Page written directly, without a folium element tree
+                        if use_simple_map:
+                            the_map = create_simple_markers_page(
+                                state=state,
+                                service=service,
+                                activated_schools=activated_schools_list,
+                                show_facilities=show_facilities
+                            )
+                        else:
+                            the_map = create_choropleth_page(
+                                state=state,
+                                service=service,
+                                activation_rate=activation,
+                                activated_schools=activated_schools_list,
+                                show_facilities=show_facilities,
+                                show_schools=show_schools,
+                                rate_sweep=rate_sweep,
+                                raster=raster
+                            )
+                    elif use_simple_map:
                         # Fast loading: just markers, no choropleth
                         the_map = create_simple_markers_map(
                             state=state,
@@ -211,21 +282,62 @@ if run_analysis or (st.session_state.analysis_run and not params_changed):
                             show_facilities=show_facilities
                         )
                     else:
-                        # Full choropleth map
+                        # Full choropleth map; in viewport mode markers are added by st_folium
                         the_map = create_choropleth_map(
                             state=state,
                             service=service,
                             activation_rate=activation,
                             activated_schools=activated_schools_list,
-                            view_type=view_type,
-                            show_facilities=show_facilities,
-                            show_schools=show_schools
+                            show_facilities=show_facilities and not viewport_mode,
+                            show_schools=show_schools and not viewport_mode,
+                            rate_sweep=rate_sweep,
+                            viewport=viewport_mode,
+                            raster=raster
                         )
 
-                    if the_map:
-                        # Render map as HTML component (larger height for better visibility)
-                        map_html = the_map._repr_html_()
-                        components.html(map_html, height=700, scrolling=True)
+                    if map_engine == 'pydeck':
+                        st.session_state.pop('coverage_map_sent', None)
+                        st.session_state.pop('coverage_markers_sent', None)
+                        st.pydeck_chart(the_map, use_container_width=True)
+                    elif map_engine == 'leaflet':
+                        st.session_state.pop('coverage_map_sent', None)
+                        st.session_state.pop('coverage_markers_sent', None)
+                        embed_map(the_map, height=700)
+                    elif the_map and viewport_mode and not use_simple_map:
+                        # Only CBGs and marker layers the browser has not received for this map are sent;
+                        # the marker checkboxes leave the map itself unchanged
+                        last_view = st.session_state.get('coverage_map') or {}
+                        map_token = f"{state}|{service}|{activation}|{rate_sweep}|{raster}"
+                        if not coverage_map_mounted or st.session_state.get('coverage_map_token') != map_token:
+                            # A newly built (or remounted) map starts empty in the browser
+                            st.session_state.coverage_map_token = map_token
+                            st.session_state.coverage_map_nonce = uuid.uuid4().hex
+                        st.session_state.coverage_map_shown = True
+                        map_token = f"{map_token}|{st.session_state.coverage_map_nonce}"
+                        batch = viewport_feature_batch(
+                            state, service, activation,
+                            bounds=last_view.get('bounds'),
+                            zoom=last_view.get('zoom'),
+                            sent=st.session_state.setdefault('coverage_map_sent', {}),
+                            token=map_token,
+                            raster=raster
+                        )
+                        markers = marker_layer_update(
+                            state, service, activated_schools_list,
+                            show_facilities=show_facilities,
+                            show_schools=show_schools,
+                            sent=st.session_state.setdefault('coverage_markers_sent', {}),
+                            token=map_token
+                        )
+                        st_folium(the_map, key='coverage_map', height=700, use_container_width=True,
+                                  feature_group_to_add=[batch, markers],
+                                  returned_objects=['bounds', 'zoom'])
+                    elif the_map:
+                        # A later viewport map starts empty in the browser
+                        st.session_state.pop('coverage_map_sent', None)
+                        st.session_state.pop('coverage_markers_sent', None)
+                        # Served as a static page, cached by the browser across reruns
+                        embed_map(the_map.get_root().render(), height=700)
                     else:
                         st.warning("Could not create map. Using fallback visualization.")
                         # Fallback: show school counts by region
@@ -328,9 +440,9 @@ if run_analysis or (st.session_state.analysis_run and not params_changed):
                 # Summary statistics
                 st.markdown("##### Coverage Statistics by CBG")
 
-                # Calculate distance reduction if not present
-                if 'distance_reduction_km' not in coverage_df.columns:
-                    coverage_df['distance_reduction_km'] = (coverage_df['mindist_current'] - coverage_df['mindist_sol']) / 1000
+                coverage_rate = coverage_df.attrs.get('activation_rate', activation)
+                if coverage_rate != activation:
+                    st.caption(f"No coverage data at {activation}% activation; showing the nearest available rate ({coverage_rate}%).")
 
                 stats_col1, stats_col2, stats_col3 = st.columns(3)
                 with stats_col1:
@@ -341,8 +453,8 @@ if run_analysis or (st.session_state.analysis_run and not params_changed):
                     avg_reduction = coverage_df['distance_reduction_km'].mean()
                     st.metric("Avg Distance Reduction", f"{avg_reduction:.2f} km")
                 with stats_col3:
-                    # Calculate newly covered (within 10km after but not before)
-                    newly_covered = ((coverage_df['mindist_sol'] <= 10000) & (coverage_df['mindist_current'] > 10000)).sum()
+                    # Newly covered: within 10km after but not before
+                    newly_covered = coverage_df['newly_covered'].sum()
                     st.metric("Newly Covered CBGs", f"{newly_covered:,}")
 
                 # Distribution chart
@@ -375,7 +487,7 @@ if run_analysis or (st.session_state.analysis_run and not params_changed):
             optimized_data = results['optimized'][activation]
             pairings = optimized_data.get('facility_school_pairings', [])
             
-            if pairings:
+            if len(pairings) > 0:
                 st.success(f"**{len(pairings)} facility-school pairings** in this optimization scenario")
                 
                 # Load facility and school data for name lookups
@@ -528,7 +640,7 @@ if run_analysis or (st.session_state.analysis_run and not params_changed):
             optimized_data = results['optimized'][activation]
             activated_schools_list = optimized_data.get('activated_schools', [])
 
-            if activated_schools_list:
+            if len(activated_schools_list) > 0:
                 st.success(f"**{len(activated_schools_list)} schools selected for activation**")
 
                 # Try to load school details
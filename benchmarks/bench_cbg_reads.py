@@ -0,0 +1,92 @@
+"""
+Benchmark: reading one state's CBGs from the national geopackage
+
+Compares the original read (GEOID LIKE '48%' through gpd.read_file, then
+to_crs) with the indexed GEOID range predicate through pyogrio's Arrow reader
+and with a per-state GeoParquet partition. Works on a copy of the geopackage,
+so the original is left unindexed; without --gpkg a synthetic national
+geopackage with the real CBG count is generated.
+
+Usage (from the repository root):
+    python benchmarks/bench_cbg_reads.py [--gpkg data/census/cbg_shapes_2020.gpkg] [--state TX]
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from utils.cbg_store import index_cbg_geopackage, read_cbg_geopackage, read_cbg_partition
+from utils.manifest import STATES, resolve_state
+
+N_CBGS = 222783
+N_TX_CBGS = 18638
+
+
+def make_geopackage(path: Path, n_cbgs: int = N_CBGS, seed: int = 0) -> None:
+    """
+    National-sized geopackage in NAD83 with Texas' real CBG share, rows in
+    random state order and ~50-vertex polygons
+    """
+    rng = np.random.default_rng(seed)
+    others = [state.fips for state in STATES if state.code != 'TX']
+    share = (1 - N_TX_CBGS / n_cbgs) / len(others)
+    fips = rng.choice(others + ['48'], n_cbgs, p=[share] * len(others) + [N_TX_CBGS / n_cbgs])
+    geoids = [f"{f}{i:010d}" for i, f in enumerate(fips)]
+    points = shapely.points(rng.uniform(-120, -70, n_cbgs), rng.uniform(25, 48, n_cbgs))
+    gdf = gpd.GeoDataFrame({'GEOID': geoids}, geometry=shapely.buffer(points, 0.01, quad_segs=12), crs=4269)
+    gdf.to_file(path, layer='cbg_shapes_2020', driver='GPKG')
+
+
+def timed(label: str, func, repeat: int):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<44} {best * 1e3:9.1f} ms  ({len(result):,} CBGs)")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--gpkg', type=Path, help="National CBG geopackage (default: synthetic)")
+    parser.add_argument('--state', default='TX', help="State to read")
+    parser.add_argument('--repeat', type=int, default=3, help="Timings per method (best is reported)")
+    args = parser.parse_args()
+
+    state = resolve_state(args.state)
+    with tempfile.TemporaryDirectory() as tmp:
+        gpkg = Path(tmp) / "cbg_shapes_2020.gpkg"
+        if args.gpkg:
+            shutil.copy(args.gpkg, gpkg)
+        else:
+            print(f"Generating a synthetic geopackage with {N_CBGS:,} CBGs...")
+            make_geopackage(gpkg)
+
+        def like_read():
+            gdf = gpd.read_file(gpkg, where=f"GEOID LIKE '{state.fips}%'")
+            return gdf.to_crs(epsg=4326)
+
+        print(f"{state.name} ({state.fips}):")
+        old = timed("LIKE predicate, no index (original)", like_read, args.repeat)
+        timed("range predicate, no index, Arrow", lambda: read_cbg_geopackage(gpkg, state.fips), args.repeat)
+        index_cbg_geopackage(gpkg)
+        new = timed("range predicate, GEOID index, Arrow", lambda: read_cbg_geopackage(gpkg, state.fips), args.repeat)
+        print(f"  speedup: {old / new:.1f}x")
+
+        partition = Path(tmp) / f"state={state.code}.parquet"
+        read_cbg_geopackage(gpkg, state.fips).to_parquet(partition, index=False)
+        part = timed("per-state GeoParquet partition", lambda: read_cbg_partition(partition), args.repeat)
+        print(f"  speedup: {old / part:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Micro-benchmark: list-cell parsing of the optimization result CSVs
+
+Compares ast.literal_eval (the original parse path) with the NumPy parsers in
+utils.cell_parser on a synthetic 50%-activation Texas-sized cell.
+
+Usage (from the repository root):
+    python benchmarks/bench_cell_parser.py [--schools 2000] [--pairs-per-school 4]
+"""
+
+import argparse
+import ast
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from utils.cell_parser import parse_pairing_array, parse_school_ids
+
+
+def make_cells(n_schools: int, pairs_per_school: int, seed: int = 0):
+    """Build 'open facility NCESSCH' and 'assignment(NCARID,NCESSCH)' cells at 50% activation"""
+    rng = np.random.default_rng(seed)
+    opened = 480000000000 + rng.choice(10**6, n_schools // 2, replace=False)
+    school_cell = str(opened.tolist())
+    schools = np.repeat(opened, pairs_per_school)
+    facilities = rng.integers(1, 10**6, len(schools))
+    pairing_cell = str(list(zip(facilities.tolist(), schools.tolist())))
+    return school_cell, pairing_cell
+
+
+def bench(label: str, func, number: int) -> float:
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"  {label:<28} {seconds * 1e3:9.3f} ms")
+    return seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--schools', type=int, default=2000, help="High schools in the state (|J|)")
+    parser.add_argument('--pairs-per-school', type=int, default=4, help="Facilities assigned per opened school")
+    parser.add_argument('--number', type=int, default=20, help="Calls per timing")
+    args = parser.parse_args()
+
+    school_cell, pairing_cell = make_cells(args.schools, args.pairs_per_school)
+
+    # Both paths must agree before timing them
+    assert parse_school_ids(school_cell).tolist() == ast.literal_eval(school_cell)
+    assert [tuple(p) for p in parse_pairing_array(pairing_cell).tolist()] == ast.literal_eval(pairing_cell)
+
+    print(f"School cell: {len(school_cell):,} chars, {args.schools // 2:,} IDs")
+    old = bench("ast.literal_eval", lambda: ast.literal_eval(school_cell), args.number)
+    new = bench("parse_school_ids", lambda: parse_school_ids(school_cell), args.number)
+    print(f"  speedup: {old / new:.1f}x")
+
+    n_pairs = args.schools // 2 * args.pairs_per_school
+    print(f"Pairing cell: {len(pairing_cell):,} chars, {n_pairs:,} pairs")
+    old = bench("ast.literal_eval", lambda: ast.literal_eval(pairing_cell), args.number)
+    new = bench("parse_pairing_array", lambda: parse_pairing_array(pairing_cell), args.number)
+    print(f"  speedup: {old / new:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: choropleth layer build time and HTML payload
+
+Compares the original per-CBG loop (one folium.GeoJson layer, style lambda
+and tooltip per CBG) with add_choropleth_layer (one FeatureCollection with
+the values of every view, styled client-side) on a synthetic
+Texas-sized state. Build time includes rendering the map to HTML; the new
+path starts from geometries already simplified, as served by the geometry
+cache.
+
+Usage (from the repository root):
+    python benchmarks/bench_choropleth.py [--cbgs 18638] [--view "Distance (km)"]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import branca.colormap as cm
+import folium
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from utils.cbg_store import DETAIL_TOLERANCES, simplify_cbg_geometries
+from utils.choropleth_map import add_choropleth_layer
+from utils.coverage_store import add_coverage_columns
+
+
+def make_merged(n_cbgs: int, seed: int = 0) -> gpd.GeoDataFrame:
+    """CBG polygons (~50 vertices) over Texas joined with random coverage"""
+    rng = np.random.default_rng(seed)
+    points = shapely.points(rng.uniform(-106, -94, n_cbgs), rng.uniform(26, 36, n_cbgs))
+    current = rng.gamma(2.0, 6000.0, n_cbgs)
+    coverage = add_coverage_columns(pd.DataFrame({
+        'GEOID': [f"48{i:010d}" for i in range(n_cbgs)],
+        'mindist_current': current,
+        'mindist_sol': current * rng.choice([1.0, 0.5, 0.2], n_cbgs),
+    }), 25)
+    cbg = gpd.GeoDataFrame({'GEOID': coverage['GEOID']},
+                           geometry=shapely.buffer(points, 0.02, quad_segs=12), crs=4326)
+    return cbg.merge(coverage, on='GEOID', how='left')
+
+
+def legacy_layer(m: folium.Map, merged: gpd.GeoDataFrame, view_type: str) -> None:
+    """The original loop: one GeoJson layer per CBG (Distance view)"""
+    column = 'distance_reduction_km'
+    max_val = float(merged[column][merged[column] > 0].quantile(0.95))
+    colormap = cm.LinearColormap(colors=['#f5f5f5', '#c7e9c0', '#74c476', '#238b45'], vmin=0, vmax=max_val)
+    merged_simple = merged.copy()
+    merged_simple['geometry'] = merged_simple['geometry'].simplify(0.001)
+    layer = folium.FeatureGroup(name='Coverage')
+    for idx, row in merged_simple.iterrows():
+        value = row.get(column, 0)
+        if pd.isna(value):
+            value = 0
+        if value > 0:
+            color, opacity = colormap(value), 0.6
+        else:
+            color, opacity = '#e0e0e0', 0.3
+        folium.GeoJson(
+            row['geometry'].__geo_interface__,
+            style_function=lambda x, c=color, o=opacity: {
+                'fillColor': c, 'color': '#666', 'weight': 0.3, 'fillOpacity': o
+            },
+            tooltip=f"GEOID: {row['GEOID']}<br>"
+                    f"Distance reduction: {row.get('distance_reduction_km', 0):.1f} km<br>"
+                    f"Improvement: {row.get('pct_improvement', 0):.1f}%"
+        ).add_to(layer)
+    layer.add_to(m)
+    colormap.add_to(m)
+
+
+def build(label: str, add_layer, merged: gpd.GeoDataFrame, view_type: str):
+    start = time.perf_counter()
+    m = folium.Map(location=(31.0, -99.0), zoom_start=6, tiles=None)
+    add_layer(m, merged, view_type)
+    html = m.get_root().render()
+    seconds = time.perf_counter() - start
+    print(f"  {label:<34} {seconds:8.2f} s  {len(html.encode()) / 1e6:8.1f} MB")
+    return seconds, len(html)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cbgs', type=int, default=18638, help="CBGs in the state (Texas: 18,638)")
+    parser.add_argument('--view', default="Distance (km)", help="View type for the new layer")
+    args = parser.parse_args()
+
+    merged = make_merged(args.cbgs)
+    print(f"{args.cbgs:,} CBGs, view {args.view!r}:")
+    old_s, old_b = build("per-CBG GeoJson loop (original)", legacy_layer, merged, args.view)
+    simplified = simplify_cbg_geometries(merged, DETAIL_TOLERANCES['medium']).merge(
+        merged.drop(columns='geometry'), on='GEOID')
+    new_s, new_b = build("single FeatureCollection", add_choropleth_layer, simplified, args.view)
+    print(f"  build speedup: {old_s / new_s:.1f}x, payload: {new_b / old_b:.0%} of original")
+
+
+if __name__ == '__main__':
+    main()
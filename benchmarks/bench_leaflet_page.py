@@ -0,0 +1,109 @@
+"""
+Benchmark: folium element tree vs the lightweight Leaflet page emitter
+
+Builds the full coverage map page (GeoJSON choropleth, facility and school
+markers, view control) both ways for each state and reports the build time
+and page size. The folium time includes _repr_html_(), as the app renders
+it. Both paths get the same simplified geometry and points. Without --gpkg,
+tessellated synthetic states with each state's approximate CBG count are
+used (see bench_topojson), with uniformly scattered facilities and schools.
+
+Usage (from the repository root):
+    python benchmarks/bench_leaflet_page.py [--gpkg data/census/cbg_shapes_2020.gpkg] [--states TX,RI] [--detail medium]
+"""
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import folium
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from bench_topojson import SYNTHETIC_STATES, synthetic_cbgs, with_coverage
+from utils.cbg_store import DETAIL_TOLERANCES, read_cbg_geopackage, simplify_cbg_geometries
+from utils.choropleth_map import (
+    FACILITY_MAX_MARKERS,
+    add_choropleth_layer,
+    add_facility_markers,
+    add_school_markers,
+    facility_markers,
+    school_markers
+)
+from utils.leaflet_page import write_leaflet_page
+from utils.manifest import resolve_state
+
+
+def synthetic_points(merged, n: int, seed: int) -> pd.DataFrame:
+    """Points scattered uniformly over the CBGs' extent"""
+    x0, y0, x1, y1 = merged.total_bounds
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'lon': rng.uniform(x0, x1, n),
+        'lat': rng.uniform(y0, y1, n),
+        'name': [f"Organization {i}" for i in range(n)],
+        'City': 'Springfield',
+    }, index=[f"{seed}{i:08d}" for i in range(n)])
+
+
+def build_folium(merged, view: str, facilities, schools) -> int:
+    m = folium.Map(location=(0, 0), zoom_start=6, tiles='cartodbpositron')
+    add_choropleth_layer(m, merged, view)
+    add_facility_markers(m, facilities, 'arts')
+    add_school_markers(m, schools, list(schools.index))
+    folium.LayerControl().add_to(m)
+    return len(m._repr_html_().encode())
+
+
+def build_page(merged, view: str, facilities, schools) -> int:
+    buffer = io.StringIO()
+    markers = [dict(facility_markers(facilities, 'arts'), max_markers=FACILITY_MAX_MARKERS),
+               school_markers(schools, list(schools.index))]
+    write_leaflet_page(buffer, (0, 0), merged, view, markers=markers)
+    return len(buffer.getvalue().encode())
+
+
+def timed(build, repeat: int, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = build(*args)
+        best = min(best, time.perf_counter() - start)
+    return size, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--gpkg', type=Path, help="National CBG geopackage (default: synthetic states)")
+    parser.add_argument('--states', default=','.join(SYNTHETIC_STATES), help="Comma-separated state codes")
+    parser.add_argument('--detail', default='medium', choices=DETAIL_TOLERANCES, help="Map detail level")
+    parser.add_argument('--view', default="Distance (km)", help="View type")
+    parser.add_argument('--facilities', type=int, default=10000, help="Facilities per state")
+    parser.add_argument('--schools', type=int, default=1500, help="Activated schools per state")
+    parser.add_argument('--repeat', type=int, default=3, help="Builds per path (best is reported)")
+    args = parser.parse_args()
+
+    print(f"Detail {args.detail!r}, {args.facilities:,} facilities, {args.schools:,} schools "
+          f"(best of {args.repeat}):")
+    print(f"  {'state':<6} {'CBGs':>7} {'folium':>10} {'build':>7} {'emitter':>10} {'build':>7} {'speedup':>8}")
+    for code in args.states.split(','):
+        state = resolve_state(code)
+        cbg = read_cbg_geopackage(args.gpkg, state.fips) if args.gpkg else synthetic_cbgs(state.code)
+        merged = with_coverage(cbg[['GEOID', cbg.geometry.name]])
+        merged = simplify_cbg_geometries(merged, DETAIL_TOLERANCES[args.detail]).merge(
+            merged.drop(columns=merged.geometry.name), on='GEOID')
+        facilities = synthetic_points(merged, args.facilities, 1)
+        schools = synthetic_points(merged, args.schools, 2).rename(columns={'name': 'School Name'})
+
+        folium_bytes, folium_s = timed(build_folium, args.repeat, merged, args.view, facilities, schools)
+        page_bytes, page_s = timed(build_page, args.repeat, merged, args.view, facilities, schools)
+        print(f"  {state.code:<6} {len(merged):>7,} {folium_bytes / 1e6:>8.1f} MB {folium_s:>6.2f}s "
+              f"{page_bytes / 1e6:>8.1f} MB {page_s:>6.2f}s {folium_s / page_s:>7.1f}x")
+    print("folium's page is wrapped in an escaped iframe by _repr_html_; the emitter's page is sent as is.")
+
+
+if __name__ == '__main__':
+    main()
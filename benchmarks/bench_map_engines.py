@@ -0,0 +1,75 @@
+"""
+Benchmark: folium (Leaflet) vs pydeck (WebGL) choropleth engines
+
+Builds the coverage choropleth with each engine for each state and reports
+the build time (layer construction plus serialization, i.e. what a rerun
+pays) and the payload sent to the browser. Both engines get the same
+simplified geometry. Without --gpkg, tessellated synthetic states with
+each state's approximate CBG count are used (see bench_topojson).
+
+Usage (from the repository root):
+    python benchmarks/bench_map_engines.py [--gpkg data/census/cbg_shapes_2020.gpkg] [--states TX,RI] [--detail medium]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import folium
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from bench_topojson import SYNTHETIC_STATES, synthetic_cbgs, with_coverage
+from utils.cbg_store import DETAIL_TOLERANCES, read_cbg_geopackage, simplify_cbg_geometries
+from utils.choropleth_map import add_choropleth_layer
+from utils.deck_map import CompactDeck, choropleth_polygon_layer
+from utils.manifest import resolve_state
+
+
+def build_folium(merged, view: str) -> int:
+    m = folium.Map(location=(0, 0), zoom_start=6, tiles=None)
+    add_choropleth_layer(m, merged, view)
+    return len(m.get_root().render().encode())
+
+
+def build_pydeck(merged, view: str) -> int:
+    deck = CompactDeck(layers=[choropleth_polygon_layer(merged, view)], map_provider=None)
+    return len(deck.to_json().encode())
+
+
+def timed(build, merged, view: str, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = build(merged, view)
+        best = min(best, time.perf_counter() - start)
+    return size, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--gpkg', type=Path, help="National CBG geopackage (default: synthetic states)")
+    parser.add_argument('--states', default=','.join(SYNTHETIC_STATES), help="Comma-separated state codes")
+    parser.add_argument('--detail', default='medium', choices=DETAIL_TOLERANCES, help="Map detail level")
+    parser.add_argument('--view', default="Distance (km)", help="View type")
+    parser.add_argument('--repeat', type=int, default=3, help="Builds per engine (best is reported)")
+    args = parser.parse_args()
+
+    print(f"Detail {args.detail!r}, view {args.view!r} (best of {args.repeat}):")
+    print(f"  {'state':<6} {'CBGs':>7} {'folium':>10} {'build':>7} {'pydeck':>10} {'build':>7}")
+    for code in args.states.split(','):
+        state = resolve_state(code)
+        cbg = read_cbg_geopackage(args.gpkg, state.fips) if args.gpkg else synthetic_cbgs(state.code)
+        merged = with_coverage(cbg[['GEOID', cbg.geometry.name]])
+        merged = simplify_cbg_geometries(merged, DETAIL_TOLERANCES[args.detail]).merge(
+            merged.drop(columns=merged.geometry.name), on='GEOID')
+
+        folium_bytes, folium_s = timed(build_folium, merged, args.view, args.repeat)
+        deck_bytes, deck_s = timed(build_pydeck, merged, args.view, args.repeat)
+        print(f"  {state.code:<6} {len(merged):>7,} {folium_bytes / 1e6:>8.1f} MB {folium_s:>6.2f}s "
+              f"{deck_bytes / 1e6:>8.1f} MB {deck_s:>6.2f}s")
+    print("Browser-side draw time is not measured: deck.gl draws on the GPU, Leaflet builds one SVG path per CBG.")
+
+
+if __name__ == '__main__':
+    main()
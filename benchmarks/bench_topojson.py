@@ -0,0 +1,101 @@
+"""
+Benchmark: choropleth payload as GeoJSON vs quantized TopoJSON
+
+Renders the coverage layer both ways for each state and reports the HTML
+payload. The GeoJSON path uses per-polygon simplified geometry (as
+load_simplified_cbg_geometries serves it); the TopoJSON path simplifies
+the shared arcs. Without --gpkg, tessellated synthetic states with each
+state's approximate CBG count are used, so neighbours share edges as real
+CBGs do.
+
+Usage (from the repository root):
+    python benchmarks/bench_topojson.py [--gpkg data/census/cbg_shapes_2020.gpkg] [--states TX,RI] [--detail medium]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import folium
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from utils.cbg_store import DETAIL_TOLERANCES, read_cbg_geopackage, simplify_cbg_geometries
+from utils.choropleth_map import CBG_TOPOLOGY_OBJECT, add_choropleth_layer
+from utils.coverage_store import add_coverage_columns
+from utils.manifest import resolve_state
+from utils.topojson_encoder import build_topology
+
+# Approximate 2020 CBG counts and extents of the default states
+SYNTHETIC_STATES = {
+    'TX': (18638, (-106.6, 25.8, -93.5, 36.5)),
+    'CA': (25607, (-124.4, 32.5, -114.1, 42.0)),
+    'RI': (815, (-71.9, 41.1, -71.1, 42.0)),
+}
+
+
+def synthetic_cbgs(state_code: str, seed: int = 0) -> gpd.GeoDataFrame:
+    """Voronoi tessellation of the state's extent with its CBG count"""
+    n_cbgs, (x0, y0, x1, y1) = SYNTHETIC_STATES[state_code]
+    rng = np.random.default_rng(seed)
+    points = shapely.multipoints(np.column_stack([rng.uniform(x0, x1, n_cbgs), rng.uniform(y0, y1, n_cbgs)]))
+    cells = shapely.get_parts(shapely.voronoi_polygons(points, extend_to=shapely.box(x0, y0, x1, y1)))
+    cells = shapely.intersection(cells, shapely.box(x0, y0, x1, y1))
+    # Densify so edges have a realistic vertex count before simplification
+    cells = shapely.segmentize(cells, (x1 - x0) / 2000)
+    fips = resolve_state(state_code).fips
+    return gpd.GeoDataFrame({'GEOID': [f"{fips}{i:010d}" for i in range(len(cells))]}, geometry=cells, crs=4326)
+
+
+def with_coverage(cbg: gpd.GeoDataFrame, seed: int = 0) -> gpd.GeoDataFrame:
+    rng = np.random.default_rng(seed)
+    current = rng.gamma(2.0, 6000.0, len(cbg))
+    coverage = add_coverage_columns(pd.DataFrame({
+        'GEOID': cbg['GEOID'],
+        'mindist_current': current,
+        'mindist_sol': current * rng.choice([1.0, 0.5, 0.2], len(cbg)),
+    }), 25)
+    return cbg.merge(coverage, on='GEOID', how='left')
+
+
+def render(merged: gpd.GeoDataFrame, view: str, topology=None) -> int:
+    m = folium.Map(location=(0, 0), zoom_start=6, tiles=None)
+    add_choropleth_layer(m, merged, view, topology)
+    return len(m.get_root().render().encode())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--gpkg', type=Path, help="National CBG geopackage (default: synthetic states)")
+    parser.add_argument('--states', default=','.join(SYNTHETIC_STATES), help="Comma-separated state codes")
+    parser.add_argument('--detail', default='medium', choices=DETAIL_TOLERANCES, help="Map detail level")
+    parser.add_argument('--view', default="Distance (km)", help="View type")
+    args = parser.parse_args()
+
+    tolerance = DETAIL_TOLERANCES[args.detail]
+    print(f"Detail {args.detail!r} (tolerance {tolerance}), view {args.view!r}:")
+    print(f"  {'state':<6} {'CBGs':>7} {'GeoJSON':>10} {'TopoJSON':>10} {'ratio':>7} {'encode':>8}")
+    for code in args.states.split(','):
+        state = resolve_state(code)
+        cbg = read_cbg_geopackage(args.gpkg, state.fips) if args.gpkg else synthetic_cbgs(state.code)
+        merged = with_coverage(cbg[['GEOID', cbg.geometry.name]])
+
+        simplified = simplify_cbg_geometries(merged, tolerance).merge(
+            merged.drop(columns=merged.geometry.name), on='GEOID')
+        geojson_bytes = render(simplified, args.view)
+
+        start = time.perf_counter()
+        topology = build_topology(merged, CBG_TOPOLOGY_OBJECT, tolerance=tolerance)
+        encode_s = time.perf_counter() - start
+        topojson_bytes = render(merged, args.view, topology)
+
+        print(f"  {state.code:<6} {len(merged):>7,} {geojson_bytes / 1e6:>8.1f} MB {topojson_bytes / 1e6:>8.1f} MB "
+              f"{topojson_bytes / geojson_bytes:>6.0%} {encode_s:>7.1f}s")
+
+
+if __name__ == '__main__':
+    main()
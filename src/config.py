@@ -42,11 +42,52 @@ def get_processed_data_path():
     return get_data_path() / "processed"
 
 
+def get_store_path():
+    """Get the path to the compiled data stores written by src/ingest.py"""
+    env_path = os.environ.get('DSS_STORE_PATH')
+    if env_path:
+        return Path(env_path)
+    return get_data_path() / "store"
+
+
+def get_static_path():
+    """Get the directory Streamlit serves at app/static (server.enableStaticServing)"""
+    # Streamlit only serves ./static next to the main script, so this follows the base path
+    return get_base_path() / "static"
+
+
+def get_tile_server_port():
+    """Get the port of the local vector tile server (src/tile_server.py)"""
+    return int(os.environ.get('DSS_TILE_PORT', 8765))
+
+
+def get_tile_server_url():
+    """Get the URL the browser fetches CBG vector tiles from"""
+    env_url = os.environ.get('DSS_TILE_URL')
+    if env_url:
+        return env_url.rstrip('/')
+    return f"http://localhost:{get_tile_server_port()}"
+
+
+def get_map_engine():
+    """Get the default map rendering engine: 'folium' (Leaflet), 'leaflet' (lightweight page) or 'pydeck' (WebGL)"""
+    engine = os.environ.get('DSS_MAP_ENGINE', 'folium').lower()
+    return engine if engine in MAP_ENGINES else 'folium'
+
+
+# Map rendering engines selectable in the app
+MAP_ENGINES = ('folium', 'leaflet', 'pydeck')
+
 # Export paths for easy importing
 BASE_PATH = get_base_path()
 DATA_PATH = get_data_path()
 CENSUS_PATH = get_census_path()
 PROCESSED_PATH = get_processed_data_path()
+STORE_PATH = get_store_path()
+STATIC_PATH = get_static_path()
+TILE_SERVER_PORT = get_tile_server_port()
+TILE_SERVER_URL = get_tile_server_url()
+MAP_ENGINE = get_map_engine()
 
 # Debug: print paths when running in debug mode
 if os.environ.get('DSS_DEBUG'):
@@ -55,3 +96,6 @@ if os.environ.get('DSS_DEBUG'):
     print(f"  DATA_PATH: {DATA_PATH}")
     print(f"  CENSUS_PATH: {CENSUS_PATH}")
     print(f"  PROCESSED_PATH: {PROCESSED_PATH}")
+    print(f"  STORE_PATH: {STORE_PATH}")
+    print(f"  STATIC_PATH: {STATIC_PATH}")
+    print(f"  TILE_SERVER_URL: {TILE_SERVER_URL}")
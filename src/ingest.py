@@ -0,0 +1,196 @@
+"""
+Offline ingest for SchoolShare DSS
+Compiles the raw data files into the fast stores read by the app
+
+Usage (from the repository root):
+    python src/ingest.py manifest       # scan data/ -> data/store/manifest.json
+    python src/ingest.py results        # optimization CSVs -> Parquet result store
+    python src/ingest.py coverage       # coverage CSVs -> memory-mapped CBG x rate matrices
+    python src/ingest.py points         # HS_/OM_/HO_ pickles -> per-state WGS84 GeoParquet
+    python src/ingest.py orgmap         # OrgMap workbook -> state-partitioned Parquet
+    python src/ingest.py cbg            # GEOID index on the CBG geopackage (--partition: per-state GeoParquet)
+    python src/ingest.py tiles          # CBG geopackage -> vector tile pyramid (MBTiles)
+    python src/ingest.py raster         # coverage choropleth -> low-zoom PNG tile pyramids (after coverage)
+    python src/ingest.py assets         # Leaflet/plugin JS, CSS and fonts from the CDNs -> static/vendor
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from utils.coverage_store import COVERAGE_STORE_PATH, build_coverage_store
+from config import DATA_PATH
+from utils.cbg_store import CBG_GPKG_PATH, CBG_STORE_PATH, build_cbg_partitions, index_cbg_geopackage
+from utils.map_assets import ASSETS_PATH, build_map_assets
+from utils.manifest import MANIFEST_FILE, ORGMAP_FILE, SERVICES, DataManifest, resolve_state
+from utils.point_store import ORGMAP_STORE_PATH, POINT_STORE_PATH, build_orgmap_store, build_point_store
+from utils.raster_tiles import (
+    DEFAULT_RASTER_MAXZOOM,
+    DEFAULT_RASTER_MINZOOM,
+    RASTER_TILES_PATH,
+    build_raster_tiles
+)
+from utils.result_store import RESULT_STORE_PATH, build_result_store
+from utils.vector_tiles import CBG_TILES_PATH, DEFAULT_MAXZOOM, DEFAULT_MINZOOM, build_cbg_tiles
+
+
+def ingest_manifest(args: argparse.Namespace) -> None:
+    """Scan the data directories and persist the manifest"""
+    manifest = DataManifest.scan()
+    manifest.save(args.out)
+    print(f"Wrote {len(manifest.entries)} entries to {args.out}")
+
+
+def ingest_results(args: argparse.Namespace) -> None:
+    """Compile the optimization result CSVs"""
+    print(f"Compiling optimization results into {args.out}")
+    counts = build_result_store(store_path=args.out)
+    for service, n_files in counts.items():
+        print(f"{service}: {n_files} result files")
+
+
+def ingest_coverage(args: argparse.Namespace) -> None:
+    """Compile the per-rate coverage CSVs"""
+    print(f"Compiling coverage matrices into {args.out}")
+    counts = build_coverage_store(store_path=args.out)
+    for service, n_states in counts.items():
+        print(f"{service}: {n_states} states")
+
+
+def ingest_points(args: argparse.Namespace) -> None:
+    """Convert the processed school and facility pickles"""
+    print(f"Converting school and facility locations into {args.out}")
+    counts = build_point_store(store_path=args.out)
+    for kind, n_states in counts.items():
+        print(f"{kind}: {n_states} states")
+
+
+def ingest_orgmap(args: argparse.Namespace) -> None:
+    """Convert the OrgMap workbook"""
+    if not args.xlsx.exists():
+        print(f"OrgMap workbook not found: {args.xlsx}")
+        return
+    print(f"Converting {args.xlsx} into {args.out}")
+    n_orgs = build_orgmap_store(args.xlsx, store_path=args.out)
+    print(f"{n_orgs} organizations")
+
+
+def ingest_cbg(args: argparse.Namespace) -> None:
+    """Index the CBG geopackage and optionally split it by state"""
+    if not args.gpkg.exists():
+        print(f"CBG geopackage not found: {args.gpkg}")
+        return
+    tables = index_cbg_geopackage(args.gpkg)
+    print(f"Indexed GEOID in {', '.join(tables)}")
+    if args.partition:
+        print(f"Writing per-state CBG partitions into {args.out}")
+        counts = build_cbg_partitions(args.gpkg, store_path=args.out)
+        print(f"{len(counts)} states, {sum(counts.values())} CBGs")
+
+
+def ingest_tiles(args: argparse.Namespace) -> None:
+    """Cut the CBG geopackage into vector tiles"""
+    if not args.gpkg.exists():
+        print(f"CBG geopackage not found: {args.gpkg}")
+        return
+    print(f"Building CBG vector tiles (zoom {args.minzoom}-{args.maxzoom}) into {args.out}")
+    counts = build_cbg_tiles(args.gpkg, args.out, args.minzoom, args.maxzoom)
+    for zoom, n_tiles in counts.items():
+        print(f"zoom {zoom}: {n_tiles} tiles")
+
+
+def ingest_raster(args: argparse.Namespace) -> None:
+    """Render the coverage choropleth into raster tiles"""
+    states = [resolve_state(code).code for code in args.states.split(',')] if args.states else None
+    for service in args.services.split(','):
+        mode = "metadata only, tiles rendered on demand" if args.lazy else f"zoom {args.minzoom}-{args.maxzoom}"
+        print(f"Rendering {service} raster tiles ({mode}) into {args.out / service}")
+        counts = build_raster_tiles(service, args.out, args.minzoom, args.maxzoom, states, args.workers, args.lazy)
+        print(f"{len(counts)} states, {sum(counts.values())} tiles")
+
+
+def ingest_assets(args: argparse.Namespace) -> None:
+    """Download the map scripts, stylesheets and fonts for self-hosting"""
+    print(f"Fetching map assets into {args.out}")
+    manifest = build_map_assets(args.out)
+    print(f"{len(manifest)} assets served locally")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compile SchoolShare DSS data stores")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    manifest = subparsers.add_parser('manifest', help="Scan the data directories into a JSON manifest")
+    manifest.add_argument('--out', type=Path, default=MANIFEST_FILE,
+                          help=f"Output file (default: {MANIFEST_FILE})")
+    manifest.set_defaults(func=ingest_manifest)
+
+    results = subparsers.add_parser('results', help="Compile optimization result CSVs to Parquet")
+    results.add_argument('--out', type=Path, default=RESULT_STORE_PATH,
+                         help=f"Output directory (default: {RESULT_STORE_PATH})")
+    results.set_defaults(func=ingest_results)
+
+    coverage = subparsers.add_parser('coverage', help="Compile coverage CSVs to memory-mapped matrices")
+    coverage.add_argument('--out', type=Path, default=COVERAGE_STORE_PATH,
+                          help=f"Output directory (default: {COVERAGE_STORE_PATH})")
+    coverage.set_defaults(func=ingest_coverage)
+
+    points = subparsers.add_parser('points', help="Convert school/facility pickles to WGS84 GeoParquet")
+    points.add_argument('--out', type=Path, default=POINT_STORE_PATH,
+                        help=f"Output directory (default: {POINT_STORE_PATH})")
+    points.set_defaults(func=ingest_points)
+
+    orgmap = subparsers.add_parser('orgmap', help="Convert the OrgMap workbook to state-partitioned Parquet")
+    orgmap.add_argument('--xlsx', type=Path, default=DATA_PATH / ORGMAP_FILE,
+                        help=f"OrgMap workbook (default: {DATA_PATH / ORGMAP_FILE})")
+    orgmap.add_argument('--out', type=Path, default=ORGMAP_STORE_PATH,
+                        help=f"Output directory (default: {ORGMAP_STORE_PATH})")
+    orgmap.set_defaults(func=ingest_orgmap)
+
+    cbg = subparsers.add_parser('cbg', help="Add a GEOID index to the CBG geopackage")
+    cbg.add_argument('--gpkg', type=Path, default=CBG_GPKG_PATH,
+                     help=f"CBG geopackage (default: {CBG_GPKG_PATH})")
+    cbg.add_argument('--partition', action='store_true',
+                     help="Also write one WGS84 GeoParquet per state")
+    cbg.add_argument('--out', type=Path, default=CBG_STORE_PATH,
+                     help=f"Partition directory (default: {CBG_STORE_PATH})")
+    cbg.set_defaults(func=ingest_cbg)
+
+    tiles = subparsers.add_parser('tiles', help="Cut the CBG geopackage into an MBTiles vector tile pyramid")
+    tiles.add_argument('--gpkg', type=Path, default=CBG_GPKG_PATH,
+                       help=f"CBG geopackage (default: {CBG_GPKG_PATH})")
+    tiles.add_argument('--minzoom', type=int, default=DEFAULT_MINZOOM,
+                       help=f"Lowest zoom level (default: {DEFAULT_MINZOOM})")
+    tiles.add_argument('--maxzoom', type=int, default=DEFAULT_MAXZOOM,
+                       help=f"Highest zoom level (default: {DEFAULT_MAXZOOM})")
+    tiles.add_argument('--out', type=Path, default=CBG_TILES_PATH,
+                       help=f"MBTiles file (default: {CBG_TILES_PATH})")
+    tiles.set_defaults(func=ingest_tiles)
+
+    raster = subparsers.add_parser('raster', help="Render the coverage choropleth into low-zoom PNG tiles")
+    raster.add_argument('--services', default=','.join(SERVICES),
+                        help=f"Comma-separated services (default: {','.join(SERVICES)})")
+    raster.add_argument('--states', help="Comma-separated state codes (default: every state with coverage)")
+    raster.add_argument('--minzoom', type=int, default=DEFAULT_RASTER_MINZOOM,
+                        help=f"Lowest zoom level (default: {DEFAULT_RASTER_MINZOOM})")
+    raster.add_argument('--maxzoom', type=int, default=DEFAULT_RASTER_MAXZOOM,
+                        help=f"Highest zoom level, vector CBGs above it (default: {DEFAULT_RASTER_MAXZOOM})")
+    raster.add_argument('--workers', type=int, help="Render processes (default: one per CPU)")
+    raster.add_argument('--lazy', action='store_true',
+                        help="Only write metadata; the tile server renders and caches tiles on request")
+    raster.add_argument('--out', type=Path, default=RASTER_TILES_PATH,
+                        help=f"Output directory (default: {RASTER_TILES_PATH})")
+    raster.set_defaults(func=ingest_raster)
+
+    assets = subparsers.add_parser('assets', help="Download the map JS/CSS assets to serve them locally")
+    assets.add_argument('--out', type=Path, default=ASSETS_PATH,
+                        help=f"Output directory (default: {ASSETS_PATH})")
+    assets.set_defaults(func=ingest_assets)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
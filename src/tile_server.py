@@ -0,0 +1,180 @@
+"""
+Local vector tile server for SchoolShare DSS
+Serves the CBG vector tiles built by `python src/ingest.py tiles` and the
+raster choropleth tiles built by `python src/ingest.py raster`
+
+Usage (from the repository root):
+    python src/tile_server.py [--port 8765] [--mbtiles data/store/tiles/cbg.mbtiles] [--raster data/store/tiles/raster]
+
+Routes:
+    /cbg/{z}/{x}/{y}.pbf  - gzip-compressed Mapbox Vector Tile (204 where empty)
+    /cbg.json             - TileJSON describing the pyramid
+    /raster/{service}/{rate}/{view}/{z}/{x}/{y}.png
+                          - choropleth PNG tile (204 where empty); tiles of a
+                            pyramid built with --lazy are rendered on first
+                            request and cached on disk
+
+The map loads tiles straight from the browser, so the server must be
+reachable at DSS_TILE_URL (default http://localhost:<DSS_TILE_PORT>).
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from config import TILE_SERVER_PORT, TILE_SERVER_URL
+from utils.manifest import SERVICES
+from utils.raster_tiles import RASTER_TILES_PATH, read_raster_metadata, render_tile, tile_path
+from utils.vector_tiles import CBG_TILE_LAYER, CBG_TILES_PATH, read_metadata, read_tile
+
+_TILE_RE = re.compile(rf'^/{CBG_TILE_LAYER}/(\d+)/(\d+)/(\d+)\.pbf$')
+_RASTER_RE = re.compile(rf'^/raster/({"|".join(SERVICES)})/(\d+)/([a-z]+)/(\d+)/(\d+)/(\d+)\.png$')
+METADATA_TTL = 10  # Seconds a raster pyramid's metadata is reused before re-reading
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    """
+    Serves vector tiles from one MBTiles file and raster tiles from their
+    pyramids. ThreadingHTTPServer runs each request in a new thread, so all
+    requests share one read-only MBTiles connection, reopened when the file
+    is replaced by a rebuild.
+    """
+
+    mbtiles: Path = CBG_TILES_PATH
+    raster: Path = RASTER_TILES_PATH
+    _db_lock = threading.Lock()
+    _db = None  # (file identity, connection)
+    _render_lock = threading.Lock()
+    _metadata = {}
+
+    def _read_mbtiles(self, read, *args):
+        """Result of read(connection, *args) on the shared MBTiles connection"""
+        stat = self.mbtiles.stat()
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        with self._db_lock:
+            if TileHandler._db is None or TileHandler._db[0] != identity:
+                if TileHandler._db is not None:
+                    TileHandler._db[1].close()
+                conn = sqlite3.connect(f"file:{self.mbtiles}?mode=ro", uri=True, check_same_thread=False)
+                TileHandler._db = (identity, conn)
+            return read(TileHandler._db[1], *args)
+
+    def _raster_metadata(self, service: str):
+        cached = self._metadata.get(service)
+        if cached is None or time.monotonic() - cached[0] > METADATA_TTL:
+            cached = (time.monotonic(), read_raster_metadata(self.raster / service))
+            self._metadata[service] = cached
+        return cached[1]
+
+    def _raster_tile(self, service: str, rate: int, view: str, z: int, x: int, y: int):
+        """PNG bytes of a raster tile (rendered if the pyramid is lazy), None where empty"""
+        root = self.raster / service
+        path = tile_path(root, rate, view, z, x, y)
+        if path.exists():
+            return path.read_bytes() or None
+        metadata = self._raster_metadata(service)
+        if (metadata is None or metadata.get('complete')
+                or not metadata['minzoom'] <= z <= metadata['maxzoom']
+                or rate not in metadata['rates'] or view not in metadata['views'].values()):
+            return None
+        # One render at a time: a render already holds the state geometry and all its paths
+        with self._render_lock:
+            if path.exists():
+                return path.read_bytes() or None
+            return render_tile(root, metadata, rate, view, z, x, y)
+
+    def _send(self, status: int, body: bytes = b'', headers: dict = None) -> None:
+        self.send_response(status)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        path = self.path.split('?', 1)[0]
+        match = _TILE_RE.match(path)
+        if match and not self.mbtiles.exists():
+            self._send(404)
+        elif match:
+            z, x, y = (int(v) for v in match.groups())
+            data = self._read_mbtiles(read_tile, z, x, y)
+            if data is None:
+                self._send(204, headers={'Cache-Control': 'public, max-age=86400'})
+                return
+            self._send(200, data, {
+                'Content-Type': 'application/vnd.mapbox-vector-tile',
+                'Content-Encoding': 'gzip',
+                'Cache-Control': 'public, max-age=86400',
+            })
+        elif _RASTER_RE.match(path):
+            service, rate, view, z, x, y = _RASTER_RE.match(path).groups()
+            data = self._raster_tile(service, int(rate), view, int(z), int(x), int(y))
+            if data is None:
+                self._send(204, headers={'Cache-Control': 'public, max-age=86400'})
+                return
+            self._send(200, data, {'Content-Type': 'image/png', 'Cache-Control': 'public, max-age=86400'})
+        elif path == f'/{CBG_TILE_LAYER}.json' and not self.mbtiles.exists():
+            self._send(404)
+        elif path == f'/{CBG_TILE_LAYER}.json':
+            metadata = self._read_mbtiles(read_metadata)
+            tilejson = {
+                'tilejson': '3.0.0',
+                'name': metadata.get('name'),
+                'tiles': [f"{TILE_SERVER_URL}/{CBG_TILE_LAYER}/{{z}}/{{x}}/{{y}}.pbf"],
+                'minzoom': int(metadata.get('minzoom', 0)),
+                'maxzoom': int(metadata.get('maxzoom', 14)),
+                'bounds': [float(v) for v in metadata.get('bounds', '-180,-85,180,85').split(',')],
+                'vector_layers': json.loads(metadata.get('json', '{}')).get('vector_layers', []),
+            }
+            self._send(200, json.dumps(tilejson).encode(), {'Content-Type': 'application/json'})
+        else:
+            self._send(404)
+
+    do_HEAD = do_GET
+
+    def log_message(self, format: str, *args) -> None:
+        """Tile requests are too frequent to log"""
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve SchoolShare DSS CBG vector tiles")
+    parser.add_argument('--port', type=int, default=TILE_SERVER_PORT,
+                        help=f"Port to listen on (default: {TILE_SERVER_PORT}, env DSS_TILE_PORT)")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument('--mbtiles', type=Path, default=CBG_TILES_PATH,
+                        help=f"MBTiles file (default: {CBG_TILES_PATH})")
+    parser.add_argument('--raster', type=Path, default=RASTER_TILES_PATH,
+                        help=f"Raster tile root (default: {RASTER_TILES_PATH})")
+    args = parser.parse_args(argv)
+
+    rasters = [service for service in SERVICES if (args.raster / service / "metadata.json").exists()]
+    if not args.mbtiles.exists() and not rasters:
+        print(f"No tiles found: {args.mbtiles} (run `python src/ingest.py tiles`), "
+              f"{args.raster} (run `python src/ingest.py raster`)")
+        return 1
+    TileHandler.mbtiles = args.mbtiles
+    TileHandler.raster = args.raster
+    server = ThreadingHTTPServer((args.host, args.port), TileHandler)
+    if args.mbtiles.exists():
+        print(f"Serving {args.mbtiles} on http://{args.host}:{args.port}/{CBG_TILE_LAYER}/{{z}}/{{x}}/{{y}}.pbf")
+    for service in rasters:
+        print(f"Serving {args.raster / service} on "
+              f"http://{args.host}:{args.port}/raster/{service}/{{rate}}/{{view}}/{{z}}/{{x}}/{{y}}.png")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+CBG geometry reads for SchoolShare DSS
+
+The national cbg_shapes_2020.gpkg holds every census block group in the US.
+States are selected with a GEOID range predicate (GEOID >= '48' AND
+GEOID < '49'), which SQLite answers from the GEOID index added by
+`python src/ingest.py cbg`; a LIKE pattern cannot use that index and scans
+the whole table. Reads go through pyogrio's Arrow reader, with a fiona
+fallback where pyogrio is unavailable.
+
+`python src/ingest.py cbg --partition` additionally writes one WGS84
+GeoParquet per state to STORE_PATH/cbg/state=<code>.parquet, which the loader
+prefers over the geopackage.
+
+Map builders ask for a detail level rather than simplifying themselves; each
+(state, tolerance) is simplified once and shared (see
+choropleth_map.load_simplified_cbg_geometries).
+"""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict
+
+import geopandas as gpd
+
+from config import CENSUS_PATH, STORE_PATH
+from .manifest import CBG_SHAPES_FILE, STATES
+
+CBG_GPKG_PATH = CENSUS_PATH / CBG_SHAPES_FILE
+CBG_STORE_PATH = STORE_PATH / "cbg"
+GEOID_COLUMN = 'GEOID'
+
+# Simplification tolerance (degrees) per map detail level
+DETAIL_TOLERANCES = {
+    'high': 0.0002,
+    'medium': 0.001,
+    'low': 0.005,
+}
+DEFAULT_DETAIL = 'medium'
+
+# Coarsest detail level per map zoom whose tolerance stays near one screen pixel
+ZOOM_DETAILS = [(8, 'low'), (10, 'medium')]
+
+
+def detail_for_zoom(zoom: int) -> str:
+    """Detail level to draw CBGs with at a Leaflet zoom level"""
+    for max_zoom, detail in ZOOM_DETAILS:
+        if zoom <= max_zoom:
+            return detail
+    return 'high'
+
+
+def fips_predicate(fips: str, column: str = GEOID_COLUMN) -> str:
+    """Index-friendly GEOID range predicate selecting one state"""
+    upper = fips[:-1] + chr(ord(fips[-1]) + 1)
+    return f"{column} >= '{fips}' AND {column} < '{upper}'"
+
+
+def read_cbg_geopackage(gpkg_path: Path, fips: str) -> gpd.GeoDataFrame:
+    """
+    Read one state's CBGs from the national geopackage in WGS84
+
+    Args:
+        gpkg_path: National CBG geopackage
+        fips: Two-digit state FIPS code
+
+    Returns:
+        GeoDataFrame of the state's CBGs
+    """
+    where = fips_predicate(fips)
+    try:
+        import pyogrio
+        gdf = pyogrio.read_dataframe(gpkg_path, where=where, use_arrow=True)
+    except ImportError:
+        gdf = gpd.read_file(gpkg_path, where=where, engine='fiona')
+
+    if gdf.crs is None or gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(epsg=4326)
+    return gdf
+
+
+def simplify_cbg_geometries(gdf: gpd.GeoDataFrame, tolerance: float) -> gpd.GeoDataFrame:
+    """
+    Copy of the CBGs (GEOID and geometry only) simplified to a tolerance
+
+    Args:
+        gdf: WGS84 CBG geometries
+        tolerance: Simplification tolerance in degrees
+    """
+    simplified = gdf[[GEOID_COLUMN, gdf.geometry.name]].copy()
+    simplified[GEOID_COLUMN] = simplified[GEOID_COLUMN].astype(str)
+    simplified['geometry'] = simplified.geometry.simplify(tolerance)
+    return simplified
+
+
+def read_cbg_partition(path: Path) -> gpd.GeoDataFrame:
+    """Read a per-state CBG partition written by build_cbg_partitions()"""
+    return gpd.read_parquet(path)
+
+
+def _feature_tables(gpkg_path: Path):
+    with closing(sqlite3.connect(gpkg_path)) as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT table_name FROM gpkg_contents WHERE data_type = 'features'")]
+
+
+def index_cbg_geopackage(gpkg_path: Path = CBG_GPKG_PATH) -> list:
+    """
+    Add a GEOID attribute index to every feature table of the geopackage
+
+    Returns:
+        Names of the indexed tables
+    """
+    tables = _feature_tables(gpkg_path)
+    with closing(sqlite3.connect(gpkg_path)) as conn, conn:
+        for table in tables:
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS "idx_{table}_{GEOID_COLUMN}" ON "{table}" ("{GEOID_COLUMN}")')
+        conn.execute("ANALYZE")
+    return tables
+
+
+def build_cbg_partitions(gpkg_path: Path = CBG_GPKG_PATH, store_path: Path = CBG_STORE_PATH) -> Dict[str, int]:
+    """
+    Split the geopackage into per-state WGS84 GeoParquet files
+
+    Returns:
+        Number of CBGs written per state code
+    """
+    store_path.mkdir(parents=True, exist_ok=True)
+    counts = {}
+    for state in STATES:
+        gdf = read_cbg_geopackage(gpkg_path, state.fips)
+        if len(gdf):
+            gdf.to_parquet(store_path / f"state={state.code}.parquet", index=False)
+            counts[state.code] = len(gdf)
+    return counts
+
@@ -0,0 +1,141 @@
+"""
+Fast parsers for the list-valued cells of the optimization result CSVs
+
+The 'open facility NCESSCH' and 'assignment(NCARID,NCESSCH)' rows hold Python
+list literals with thousands of IDs per activation column. Evaluating them with
+ast.literal_eval builds a syntax tree for every cell; these parsers instead blank
+out the list punctuation in one str.translate pass and hand the remaining digits
+to NumPy's C text reader. Cells that are not plain integer lists fall back to
+ast.literal_eval.
+"""
+
+import ast
+import warnings
+from typing import Union
+
+import numpy as np
+
+# List punctuation mapped to spaces; quoted IDs (which may keep leading zeros) are left
+# to the literal parser
+_SEPARATORS = str.maketrans({c: ' ' for c in "[](),\t\r\n"})
+
+EMPTY_IDS = np.empty(0, dtype=np.int64)
+EMPTY_PAIRS = np.empty((0, 2), dtype=np.int64)
+
+
+def _is_empty(cell) -> bool:
+    """Empty cells are NaN, blank or '0.0' (no schools opened)"""
+    if cell is None:
+        return True
+    if isinstance(cell, float):
+        return np.isnan(cell) or cell == 0.0
+    text = str(cell).strip()
+    return text in ('', '0.0', '[]', 'nan')
+
+
+def _fast_ints(text: str) -> np.ndarray:
+    """
+    Read every integer from a list literal of integers
+
+    Raises:
+        ValueError: if the cell holds anything other than digits and list punctuation
+                    (quoted IDs included)
+    """
+    stripped = text.strip()
+    if not (stripped.startswith('[') and stripped.endswith(']')):
+        raise ValueError("cell is not a list literal")
+    digits = text.translate(_SEPARATORS)
+    packed = digits.replace(' ', '')
+    if not (packed.isascii() and packed.isdigit()):
+        raise ValueError("cell is not a list of integers")
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            return np.fromstring(digits, dtype=np.int64, sep=' ')
+        except DeprecationWarning as e:
+            raise ValueError(str(e))
+
+
+def _literal_cell(text: str, strict: bool):
+    """Fallback: evaluate the cell as a Python literal"""
+    try:
+        return list(ast.literal_eval(text))
+    except (ValueError, SyntaxError, TypeError) as e:
+        if strict:
+            raise ValueError(f"Malformed list cell: {text[:80]!r}") from e
+        return None
+
+
+def _id_array(values) -> np.ndarray:
+    """Type IDs as int64 when they are all integral, else as strings"""
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'iu':
+        return arr.astype(np.int64)
+    if arr.dtype.kind == 'f' and np.all(np.mod(arr, 1) == 0):
+        return arr.astype(np.int64)
+    return arr.astype(str)
+
+
+def parse_school_ids(cell: Union[str, float, None], strict: bool = False) -> np.ndarray:
+    """
+    Parse an 'open facility NCESSCH' cell into an array of school IDs
+
+    Args:
+        cell: Raw cell value, e.g. "[480000012345, 480000054321]"
+        strict: Raise ValueError on a cell that neither parser can read
+                (otherwise an empty array is returned)
+
+    Returns:
+        1-D int64 array of NCESSCH IDs (string array if IDs are not integral)
+    """
+    if _is_empty(cell):
+        return EMPTY_IDS
+    text = str(cell)
+    try:
+        return _fast_ints(text)
+    except ValueError:
+        pass
+
+    values = _literal_cell(text, strict)
+    if not values:
+        return EMPTY_IDS
+    return _id_array(values)
+
+
+def parse_pairing_array(cell: Union[str, float, None], strict: bool = False) -> np.ndarray:
+    """
+    Parse an 'assignment(NCARID,NCESSCH)' cell into an (n, 2) array
+
+    Args:
+        cell: Raw cell value, e.g. "[(1001, 480000012345), (1002, 480000054321)]"
+        strict: Raise ValueError on a cell that neither parser can read
+                (otherwise an empty array is returned)
+
+    Returns:
+        Array with columns (facility_id, school_id); int64 when all IDs are integral
+    """
+    if _is_empty(cell):
+        return EMPTY_PAIRS
+    text = str(cell)
+    try:
+        ids = _fast_ints(text)
+        # Every pair contributes exactly one '(' and two integers
+        if len(ids) == 2 * text.count('('):
+            return ids.reshape(-1, 2)
+    except ValueError:
+        pass
+
+    values = _literal_cell(text, strict)
+    if not values:
+        return EMPTY_PAIRS
+    try:
+        facility_ids, school_ids = zip(*values)
+    except (TypeError, ValueError) as e:
+        if strict:
+            raise ValueError(f"Malformed pairing cell: {text[:80]!r}") from e
+        return EMPTY_PAIRS
+
+    facility_ids, school_ids = _id_array(facility_ids), _id_array(school_ids)
+    if facility_ids.dtype != school_ids.dtype:
+        facility_ids, school_ids = facility_ids.astype(str), school_ids.astype(str)
+    return np.column_stack([facility_ids, school_ids])
@@ -3,49 +3,61 @@ Choropleth Map Visualization for DSS App v2
 Provides CBG-level choropleth maps with facility markers
 """
 
+import base64
+import hashlib
+import json
+import sqlite3
 import folium
 import folium.plugins
-from folium.plugins import MarkerCluster
 import pandas as pd
 import geopandas as gpd
 import numpy as np
+import shapely
 import streamlit as st
+from contextlib import closing
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 import branca.colormap as cm
+from branca.element import MacroElement, Template
+from folium.elements import JSCSSMixin
+from folium.map import Layer
 
 # Import configurable paths
-from config import DATA_PATH, CENSUS_PATH
-
-
-# State mappings
-STATE_TO_FIPS = {
-    'Alabama': '01', 'Arizona': '04', 'Arkansas': '05', 'California': '06',
-    'Colorado': '08', 'Connecticut': '09', 'Delaware': '10', 'District of Columbia': '11',
-    'Florida': '12', 'Georgia': '13', 'Idaho': '16', 'Illinois': '17',
-    'Indiana': '18', 'Iowa': '19', 'Kansas': '20', 'Kentucky': '21',
-    'Louisiana': '22', 'Maine': '23', 'Maryland': '24', 'Massachusetts': '25',
-    'Michigan': '26', 'Minnesota': '27', 'Mississippi': '28', 'Missouri': '29',
-    'Montana': '30', 'Nebraska': '31', 'Nevada': '32', 'New Hampshire': '33',
-    'New Jersey': '34', 'New Mexico': '35', 'New York': '36', 'North Carolina': '37',
-    'North Dakota': '38', 'Ohio': '39', 'Oklahoma': '40', 'Oregon': '41',
-    'Pennsylvania': '42', 'Rhode Island': '44', 'South Carolina': '45',
-    'South Dakota': '46', 'Tennessee': '47', 'Texas': '48', 'Utah': '49',
-    'Vermont': '50', 'Virginia': '51', 'Washington': '53', 'West Virginia': '54',
-    'Wisconsin': '55', 'Wyoming': '56'
-}
-
-STATE_CODE_TO_FIPS = {
-    'AL': '01', 'AZ': '04', 'AR': '05', 'CA': '06', 'CO': '08', 'CT': '09',
-    'DC': '11', 'DE': '10', 'FL': '12', 'GA': '13', 'ID': '16', 'IL': '17',
-    'IN': '18', 'IA': '19', 'KS': '20', 'KY': '21', 'LA': '22', 'ME': '23',
-    'MD': '24', 'MA': '25', 'MI': '26', 'MN': '27', 'MS': '28', 'MO': '29',
-    'MT': '30', 'NE': '31', 'NV': '32', 'NH': '33', 'NJ': '34', 'NM': '35',
-    'NY': '36', 'NC': '37', 'ND': '38', 'OH': '39', 'OK': '40', 'OR': '41',
-    'PA': '42', 'RI': '44', 'SC': '45', 'SD': '46', 'TN': '47', 'TX': '48',
-    'UT': '49', 'VT': '50', 'VA': '51', 'WA': '53', 'WV': '54', 'WI': '55',
-    'WY': '56'
-}
+from config import TILE_SERVER_URL
+from .cbg_store import (
+    DEFAULT_DETAIL,
+    DETAIL_TOLERANCES,
+    detail_for_zoom,
+    read_cbg_geopackage,
+    read_cbg_partition,
+    simplify_cbg_geometries
+)
+from .coverage_store import (
+    COVERAGE_RADIUS_M,
+    DECAMETRES_MISSING,
+    CoverageSweep,
+    coverage_fingerprint,
+    load_coverage_data,
+    load_coverage_sweep
+)
+from .manifest import STATES, cache_key, canonical_service, get_manifest, nearest_rate, resolve_state
+from .map_assets import use_local_assets
+from .marker_layer import first_column, marker_layer, point_coordinates
+from .point_store import ARTS_COLUMNS, HOSPITAL_COLUMNS, SCHOOL_COLUMNS, load_orgmap_facilities, load_points
+from .topojson_encoder import build_topology, with_properties
+from .vector_tiles import CBG_TILE_LAYER, DEFAULT_MAXZOOM, read_metadata
+
+CBG_TOPOLOGY_OBJECT = 'cbg'
+VIEWPORT_PADDING = 0.25  # Fraction of the viewport added on each side of a batch query
+INITIAL_ZOOM = 6
+RASTER_VERSION_DIGITS = 12  # Hex digits of the fingerprint in raster tile URLs
+MAP_VIEWPORT_PX = (1200, 700)  # Assumed map size (width, height) before st_folium reports bounds
+FACILITY_MAX_MARKERS = 2000  # Facility markers per zoom level before clustering
+
+
+# State mappings (derived from the manifest's single state table)
+STATE_TO_FIPS = {state.name: state.fips for state in STATES}
+STATE_CODE_TO_FIPS = {state.code: state.fips for state in STATES}
 
 STATE_CENTERS = {
     'Texas': (31.0, -99.0), 'California': (36.7, -119.4), 'New York': (42.9, -75.5),
@@ -70,189 +82,126 @@ STATE_CENTERS = {
 # Data paths are imported from config module above
 
 
-@st.cache_data(ttl=3600)
-def load_coverage_data(state: str, service: str, activation_rate: int) -> Optional[pd.DataFrame]:
+def load_cbg_geometries(state: str) -> Optional[gpd.GeoDataFrame]:
     """
-    Load CBG-level coverage data from optimization results
+    Load CBG geometries for the state, from its GeoParquet partition when
+    compiled, otherwise from the national geopackage
     """
-    fips = STATE_TO_FIPS.get(state)
-    if not fips:
+    resolved = resolve_state(state)
+    if not resolved:
         return None
-
-    # Find state code
-    state_code = None
-    for code, f in STATE_CODE_TO_FIPS.items():
-        if f == fips:
-            state_code = code
-            break
-
-    if not state_code:
+    manifest = get_manifest()
+    version = (manifest.fingerprint(resolved.code, None, 'cbg_partition')
+               or manifest.fingerprint(None, None, 'cbg_shapes'))
+    if version is None:
         return None
+    return _load_cbg_geometries(resolved.code, resolved.fips, version)
 
-    # Determine data directory
-    if 'arts' in service.lower():
-        data_dir = DATA_PATH / "raw/result_arts_250425/coverages"
-    else:
-        data_dir = DATA_PATH / "raw/result_hospital_250507/coverages"
 
-    # Find coverage file
-    pattern = f"{state_code}_{fips}_coverage_mindist_numfacility_{activation_rate}perc.csv"
-    file_path = data_dir / pattern
+@st.cache_data(max_entries=60)
+def _load_cbg_geometries(state_code: str, fips: str, source_version: Tuple) -> Optional[gpd.GeoDataFrame]:
+    """Cached loader keyed by state and the fingerprint of the file read"""
+    manifest = get_manifest()
+    try:
+        partition = manifest.path(state_code, None, 'cbg_partition')
+        if partition is not None:
+            return read_cbg_partition(partition)
 
-    if not file_path.exists():
-        # Try to find closest activation rate
-        files = list(data_dir.glob(f"{state_code}_{fips}_coverage_*.csv"))
-        if files:
-            file_path = files[0]
-        else:
+        gpkg_path = manifest.path(None, None, 'cbg_shapes')
+        if gpkg_path is None:
             return None
+        # Read only CBGs for this state (indexed GEOID range)
+        return read_cbg_geopackage(gpkg_path, fips)
+    except Exception as e:
+        st.warning(f"Could not load CBG geometries: {e}")
+        return None
 
-    # Load data
-    df = pd.read_csv(file_path, dtype={'GEOID': str})
-
-    # Zero-pad GEOID to 12 characters (fixes leading zero issue)
-    df['GEOID'] = df['GEOID'].str.zfill(12)
 
-    # Calculate derived metrics
-    df['distance_reduction_m'] = df['mindist_current'] - df['mindist_sol']
-    df['distance_reduction_km'] = df['distance_reduction_m'] / 1000
+def load_simplified_cbg_geometries(state: str, detail: str = DEFAULT_DETAIL) -> Optional[gpd.GeoDataFrame]:
+    """
+    CBG geometries simplified for a map detail level ('high', 'medium', 'low')
 
-    # Calculate percentage improvement
-    df['pct_improvement'] = np.where(
-        df['mindist_current'] > 0,
-        (df['distance_reduction_m'] / df['mindist_current']) * 100,
-        0
-    )
+    Each (state, tolerance) is simplified once and the result is shared
+    across reruns and sessions; callers must not modify it.
+    """
+    resolved = resolve_state(state)
+    if not resolved:
+        return None
+    manifest = get_manifest()
+    version = (manifest.fingerprint(resolved.code, None, 'cbg_partition')
+               or manifest.fingerprint(None, None, 'cbg_shapes'))
+    if version is None:
+        return None
+    return _load_simplified_cbg_geometries(resolved.code, DETAIL_TOLERANCES[detail], version)
 
-    # Determine coverage status (within 10km)
-    df['covered_before'] = df['mindist_current'] <= 10000
-    df['covered_after'] = df['mindist_sol'] <= 10000
-    df['newly_covered'] = (~df['covered_before']) & df['covered_after']
 
-    return df
+@st.cache_resource(max_entries=150)
+def _load_simplified_cbg_geometries(state_code: str, tolerance: float,
+                                    source_version: Tuple) -> Optional[gpd.GeoDataFrame]:
+    """Cached simplification keyed by (state code, tolerance) and source fingerprint"""
+    gdf = load_cbg_geometries(state_code)
+    if gdf is None:
+        return None
+    return simplify_cbg_geometries(gdf, tolerance)
 
 
-@st.cache_data(ttl=3600)
-def load_cbg_geometries(state: str) -> Optional[gpd.GeoDataFrame]:
+def load_cbg_topology(state: str, detail: str = DEFAULT_DETAIL) -> Optional[Dict]:
     """
-    Load CBG geometries for the state from the geopackage
+    Quantized TopoJSON topology of the state's CBGs for a detail level
+
+    Built once per (state, tolerance) from the unsimplified geometry, in the
+    row order of load_cbg_geometries(state); simplification runs on the
+    shared arcs, so neighbouring CBGs never gap. Callers must not modify it.
     """
-    fips = STATE_TO_FIPS.get(state)
-    if not fips:
+    resolved = resolve_state(state)
+    if not resolved:
         return None
-
-    gpkg_path = CENSUS_PATH / "cbg_shapes_2020.gpkg"
-    if not gpkg_path.exists():
+    manifest = get_manifest()
+    version = (manifest.fingerprint(resolved.code, None, 'cbg_partition')
+               or manifest.fingerprint(None, None, 'cbg_shapes'))
+    if version is None:
         return None
+    return _load_cbg_topology(resolved.code, DETAIL_TOLERANCES[detail], version)
 
-    try:
-        # Read only CBGs for this state (filter by GEOID prefix)
-        gdf = gpd.read_file(
-            gpkg_path,
-            where=f"GEOID LIKE '{fips}%'"
-        )
-
-        # Ensure WGS84 projection
-        if gdf.crs is None or gdf.crs.to_epsg() != 4326:
-            gdf = gdf.to_crs(epsg=4326)
 
-        return gdf
-    except Exception as e:
-        st.warning(f"Could not load CBG geometries: {e}")
+@st.cache_resource(max_entries=150)
+def _load_cbg_topology(state_code: str, tolerance: float, source_version: Tuple) -> Optional[Dict]:
+    """Cached topology keyed by (state code, tolerance) and source fingerprint"""
+    gdf = load_cbg_geometries(state_code)
+    if gdf is None:
         return None
+    return build_topology(gdf, CBG_TOPOLOGY_OBJECT, tolerance=tolerance)
 
 
-def load_school_data(state: str) -> Optional[gpd.GeoDataFrame]:
+def load_school_data(state: str) -> Optional[pd.DataFrame]:
     """
     Load school location data for the state
     """
-    fips = STATE_TO_FIPS.get(state)
-    if not fips:
-        return None
-
-    file_path = DATA_PATH / f"processed/HS_gdf_meters_clipped_{fips}.pkl"
-    if not file_path.exists():
-        return None
-
-    try:
-        gdf = pd.read_pickle(file_path)
-        if hasattr(gdf, 'to_crs'):
-            gdf = gdf.to_crs(epsg=4326)
-        return gdf
-    except Exception as e:
-        return None
+    return load_points('schools', state, SCHOOL_COLUMNS)
 
 
 def load_arts_facilities(state: str) -> Optional[pd.DataFrame]:
     """
     Load arts facility data from OrgMap
     """
-    fips = STATE_TO_FIPS.get(state)
-    if not fips:
+    resolved = resolve_state(state)
+    if not resolved:
         return None
 
-    # Try pickled processed file first
-    processed_path = DATA_PATH / f"processed/OM_gdf_meters_clipped_{fips}.pkl"
-    if processed_path.exists():
-        try:
-            gdf = pd.read_pickle(processed_path)
-            if hasattr(gdf, 'to_crs'):
-                gdf = gdf.to_crs(epsg=4326)
-            return gdf
-        except:
-            pass
-
-    # Fall back to raw OrgMap Excel
-    orgmap_path = DATA_PATH / "raw/OrgMap/OrgMap_05_15_2023.xlsx"
-    if not orgmap_path.exists():
-        return None
+    # Try the point store / processed file first
+    facilities = load_points('arts', state, ARTS_COLUMNS)
+    if facilities is not None:
+        return facilities
 
-    try:
-        # Get state code for filtering
-        state_abbr = None
-        for code, f in STATE_CODE_TO_FIPS.items():
-            if f == fips:
-                state_abbr = code
-                break
-
-        df = pd.read_excel(orgmap_path)
-        # Filter to state
-        df = df[df['State'] == state_abbr].copy()
-
-        # Rename columns for consistency
-        df = df.rename(columns={
-            'OrgName': 'name',
-            'Latitude': 'lat',
-            'Longitude': 'lon',
-            'Address': 'address',
-            'City': 'city',
-            'NTEECC': 'org_type'
-        })
-
-        return df
-    except Exception as e:
-        return None
+    # Fall back to the OrgMap store compiled from the national workbook
+    return load_orgmap_facilities(state, ARTS_COLUMNS)
 
 
-def load_hospital_data(state: str) -> Optional[gpd.GeoDataFrame]:
+def load_hospital_data(state: str) -> Optional[pd.DataFrame]:
     """
     Load hospital location data for the state
     """
-    fips = STATE_TO_FIPS.get(state)
-    if not fips:
-        return None
-
-    file_path = DATA_PATH / f"processed/HO_gdf_meters_clipped_{fips}.pkl"
-    if not file_path.exists():
-        return None
-
-    try:
-        gdf = pd.read_pickle(file_path)
-        if hasattr(gdf, 'to_crs'):
-            gdf = gdf.to_crs(epsg=4326)
-        return gdf
-    except Exception as e:
-        return None
+    return load_points('hospitals', state, HOSPITAL_COLUMNS)
 
 
 def create_choropleth_map(
@@ -262,7 +211,12 @@ def create_choropleth_map(
     activated_schools: List[str],
     view_type: str = "Distance (km)",
     show_facilities: bool = True,
-    show_schools: bool = True
+    show_schools: bool = True,
+    detail: str = DEFAULT_DETAIL,
+    encoding: str = 'geojson',
+    rate_sweep: bool = False,
+    viewport: bool = False,
+    raster: bool = False
 ) -> Optional[folium.Map]:
     """
     Create a choropleth map showing coverage improvements
@@ -272,9 +226,21 @@ def create_choropleth_map(
         service: Service type ("Arts Facilities" or "Hospitals")
         activation_rate: School activation rate percentage
         activated_schools: List of activated school IDs
-        view_type: One of "Distance (km)", "% Improvement", "Coverage Status"
+        view_type: Initially selected view, one of CHOROPLETH_VIEWS; the
+                   others are switched to inside the map
         show_facilities: Whether to show existing facilities
         show_schools: Whether to show activated schools
+        detail: CBG geometry detail level ('high', 'medium', 'low')
+        encoding: 'geojson', 'topojson' for shared, quantized arcs (smaller
+                  pages for large states), or 'tiles' for vector tiles from
+                  the tile server (falls back to GeoJSON if not built)
+        rate_sweep: Embed the distances at every activation rate and add an
+                    in-map rate slider, so rates can be compared without reruns
+        viewport: Build the map without CBG geometry, for st_folium; the CBGs
+                  are delivered per viewport by viewport_feature_batch
+        raster: Show pre-rendered raster tiles at low zooms, if built
+                (`python src/ingest.py raster`) for the state; they are
+                loaded from the tile server (src/tile_server.py)
     """
     # Get center coordinates
     center = STATE_CENTERS.get(state, (39.8, -98.5))
@@ -282,145 +248,33 @@ def create_choropleth_map(
     # Create base map
     m = folium.Map(
         location=center,
-        zoom_start=6,
+        zoom_start=INITIAL_ZOOM,
         tiles='cartodbpositron'
     )
 
     # Load coverage data
     coverage_df = load_coverage_data(state, service, activation_rate)
 
-    # Load CBG geometries
-    cbg_gdf = load_cbg_geometries(state)
+    # Load CBG geometries, simplified once per detail level
+    topology = None
+    tiles = cbg_tiles_maxzoom() if encoding == 'tiles' and not viewport else None
+    if tiles is not None or viewport:
+        cbg_gdf = None
+    elif encoding == 'topojson':
+        topology = load_cbg_topology(state, detail)
+        cbg_gdf = load_cbg_geometries(state)
+    else:
+        cbg_gdf = load_simplified_cbg_geometries(state, detail)
 
     # Add choropleth if we have both data and geometries
-    if coverage_df is not None and cbg_gdf is not None:
-        # Merge coverage data with geometries
-        cbg_gdf['GEOID'] = cbg_gdf['GEOID'].astype(str)
-        coverage_df['GEOID'] = coverage_df['GEOID'].astype(str)
-
-        merged = cbg_gdf.merge(coverage_df, on='GEOID', how='left')
-
-        # Determine which column to visualize
-        if view_type == "Distance (km)":
-            column = 'distance_reduction_km'
-            legend_name = 'Distance Reduction (km)'
-            # Create colormap: gray (0) to green (max improvement)
-            # Filter to positive values only for calculating max
-            positive_vals = merged[column][merged[column] > 0]
-            if len(positive_vals) > 0:
-                max_val = positive_vals.quantile(0.95)
-            else:
-                max_val = 1.0
-            # Ensure max_val is valid (not NaN, not negative, not zero)
-            if pd.isna(max_val) or max_val <= 0:
-                max_val = 1.0
-            colormap = cm.LinearColormap(
-                colors=['#f5f5f5', '#c7e9c0', '#74c476', '#238b45'],
-                vmin=0,
-                vmax=float(max_val)
-            )
-        elif view_type == "% Improvement":
-            column = 'pct_improvement'
-            legend_name = 'Distance Improvement (%)'
-            # Filter to positive values for calculating max
-            positive_vals = merged[column][merged[column] > 0]
-            if len(positive_vals) > 0:
-                max_val = min(positive_vals.quantile(0.95), 100)
-            else:
-                max_val = 100.0
-            if pd.isna(max_val) or max_val <= 0:
-                max_val = 100.0
-            colormap = cm.LinearColormap(
-                colors=['#f5f5f5', '#c6dbef', '#6baed6', '#2171b5'],
-                vmin=0,
-                vmax=float(max_val)
-            )
-        else:  # Coverage Status
-            column = 'newly_covered'
-            legend_name = 'Coverage Status'
-            # Custom handling for categorical
-
-        # Add choropleth layer
-        if view_type != "Coverage Status":
-            # Simplify geometries for performance
-            merged_simple = merged.copy()
-            merged_simple['geometry'] = merged_simple['geometry'].simplify(0.001)
-
-            # Create GeoJson layer
-            choropleth_layer = folium.FeatureGroup(name='Coverage')
-
-            for idx, row in merged_simple.iterrows():
-                value = row.get(column, 0)
-                if pd.isna(value):
-                    value = 0
-
-                # Show all CBGs - gray for no change, colored for improvement
-                if value > 0:
-                    color = colormap(value)
-                    opacity = 0.6
-                else:
-                    color = '#e0e0e0'  # Light gray for no change
-                    opacity = 0.3
-
-                folium.GeoJson(
-                    row['geometry'].__geo_interface__,
-                    style_function=lambda x, c=color, o=opacity: {
-                        'fillColor': c,
-                        'color': '#666',
-                        'weight': 0.3,
-                        'fillOpacity': o
-                    },
-                    tooltip=f"GEOID: {row['GEOID']}<br>"
-                            f"Distance reduction: {row.get('distance_reduction_km', 0):.1f} km<br>"
-                            f"Improvement: {row.get('pct_improvement', 0):.1f}%"
-                ).add_to(choropleth_layer)
-
-            choropleth_layer.add_to(m)
-            colormap.add_to(m)
-        else:
-            # Coverage status view: red (not covered) / yellow (was covered) / green (newly covered)
-            choropleth_layer = folium.FeatureGroup(name='Coverage Status')
-
-            merged_simple = merged.copy()
-            merged_simple['geometry'] = merged_simple['geometry'].simplify(0.001)
-
-            for idx, row in merged_simple.iterrows():
-                # Handle missing data
-                newly_covered = row.get('newly_covered', False)
-                covered_after = row.get('covered_after', False)
-
-                if pd.isna(newly_covered):
-                    newly_covered = False
-                if pd.isna(covered_after):
-                    covered_after = False
-
-                if newly_covered:
-                    color = '#27ae60'  # Green - newly covered
-                    status = 'Newly Covered'
-                    opacity = 0.6
-                elif covered_after:
-                    color = '#f1c40f'  # Yellow - already covered
-                    status = 'Already Covered'
-                    opacity = 0.5
-                else:
-                    color = '#e74c3c'  # Red - not covered
-                    status = 'Not Covered (>10km)'
-                    opacity = 0.4
-
-                folium.GeoJson(
-                    row['geometry'].__geo_interface__,
-                    style_function=lambda x, c=color, o=opacity: {
-                        'fillColor': c,
-                        'color': '#666',
-                        'weight': 0.3,
-                        'fillOpacity': o
-                    },
-                    tooltip=f"Status: {status}<br>"
-                            f"Distance before: {row.get('mindist_current', 0)/1000:.1f} km<br>"
-                            f"Distance after: {row.get('mindist_sol', 0)/1000:.1f} km"
-                ).add_to(choropleth_layer)
+    if coverage_df is not None and (cbg_gdf is not None or tiles is not None or viewport):
+        # Merge coverage data with geometries (left join keeps the CBG order)
+        merged = coverage_df if cbg_gdf is None else cbg_gdf.merge(coverage_df, on='GEOID', how='left')
 
-            choropleth_layer.add_to(m)
+        merged.attrs['activation_rate'] = coverage_df.attrs.get('activation_rate', activation_rate)
+        sweep = load_coverage_sweep(state, service) if rate_sweep else None
+        overview = raster_overview(service, state) if raster else None
+        add_choropleth_layer(m, merged, view_type, topology, sweep, tiles, viewport, overview)
 
     # Add facility markers
     if show_facilities:
@@ -434,7 +288,7 @@ def create_choropleth_map(
                 add_facility_markers(m, hospital_gdf, 'hospital')
 
     # Add activated school markers
-    if show_schools and activated_schools:
+    if show_schools and len(activated_schools) > 0:
         school_gdf = load_school_data(state)
         if school_gdf is not None:
             add_school_markers(m, school_gdf, activated_schools)
@@ -442,141 +296,1056 @@ def create_choropleth_map(
     # Add layer control
     folium.LayerControl().add_to(m)
 
-    return m
+    return use_local_assets(m)
+
+
+CHOROPLETH_VIEWS = ["Distance (km)", "% Improvement", "Coverage Status"]
+# URL-safe view names, used in raster tile paths
+VIEW_SLUGS = {"Distance (km)": 'distance', "% Improvement": 'improvement', "Coverage Status": 'status'}
+
+# Coverage status classes, in priority order: (label, fill colour, fill opacity)
+COVERAGE_STATUS_STYLES = [
+    ('Newly Covered', '#27ae60', 0.6),          # Green
+    ('Already Covered', '#f1c40f', 0.5),        # Yellow
+    ('Not Covered (>10km)', '#e74c3c', 0.4),    # Red
+]
+# Continuous views: view -> (value property, colour ramp, legend caption, default max, cap)
+LINEAR_VIEW_RAMPS = {
+    "Distance (km)": ('reduction_km', ['#f5f5f5', '#c7e9c0', '#74c476', '#238b45'],
+                      'Distance Reduction (km)', 1.0, None),
+    "% Improvement": ('improvement_pct', ['#f5f5f5', '#c6dbef', '#6baed6', '#2171b5'],
+                      'Distance Improvement (%)', 100.0, 100.0),
+}
+NO_CHANGE_COLOR = '#e0e0e0'  # Light gray for no change
+LUT_SIZE = 256
 
+# Tooltip fields shared by every view
+TOOLTIP_FIELDS = ['GEOID', 'status', 'before_km', 'after_km', 'reduction_km', 'improvement_pct']
+TOOLTIP_ALIASES = ['GEOID', 'Status', 'Distance before (km)', 'Distance after (km)',
+                   'Distance reduction (km)', 'Improvement (%)']
 
-def add_facility_markers(
+
+def _colormap_lut(colormap: cm.LinearColormap, n: int = LUT_SIZE) -> np.ndarray:
+    """Sample a colormap into n hex colours so it can be applied to a whole column"""
+    return np.array([colormap.rgb_hex_str(v) for v in np.linspace(colormap.vmin, colormap.vmax, n)])
+
+
+def _ramp_vmax(values: pd.Series, default: float, cap: Optional[float] = None) -> float:
+    """Colour scale maximum: 95th percentile of the positive values"""
+    positive_vals = values[values > 0]
+    max_val = positive_vals.quantile(0.95) if len(positive_vals) > 0 else default
+    if cap is not None:
+        max_val = min(max_val, cap)
+    # Ensure max_val is valid (not NaN, not negative, not zero)
+    if pd.isna(max_val) or max_val <= 0:
+        max_val = default
+    return float(max_val)
+
+
+def coverage_status(merged: pd.DataFrame) -> np.ndarray:
+    """Index into COVERAGE_STATUS_STYLES for every CBG"""
+    newly = merged['newly_covered'].fillna(False).astype(bool).to_numpy()
+    already = merged['covered_after'].fillna(False).astype(bool).to_numpy() & ~newly
+    return np.select([newly, already], [0, 1], 2)
+
+
+def choropleth_features(merged: gpd.GeoDataFrame) -> Tuple[gpd.GeoDataFrame, Dict]:
+    """
+    Compute the per-CBG attributes and colour ramps of every view, vectorized
+
+    Features carry the values rather than colours; the map colours them
+    client-side for whichever view is selected (see ChoroplethViewControl).
+
+    Args:
+        merged: CBG geometries left-joined with coverage data, or the
+                coverage data alone when the geometry comes from tiles
+
+    Returns:
+        (features, view_styles) where features holds the TOOLTIP_FIELDS and
+        geometry (if merged has any), and view_styles maps each of CHOROPLETH_VIEWS to its
+        JSON-serializable styling (value property and ramp, or classes)
+    """
+    features = pd.DataFrame({'GEOID': merged['GEOID']})
+    if isinstance(merged, gpd.GeoDataFrame):
+        features = gpd.GeoDataFrame(features, geometry=merged.geometry)
+    labels = np.array([label for label, _, _ in COVERAGE_STATUS_STYLES])
+    features['status'] = labels[coverage_status(merged)]
+    features['before_km'] = (merged['mindist_current'] / 1000).round(1)
+    features['after_km'] = (merged['mindist_sol'] / 1000).round(1)
+    features['reduction_km'] = merged['distance_reduction_km'].fillna(0).round(1)
+    features['improvement_pct'] = merged['pct_improvement'].fillna(0).round(1)
+
+    view_styles = {}
+    for view, (prop, colors, caption, default, cap) in LINEAR_VIEW_RAMPS.items():
+        source = 'distance_reduction_km' if prop == 'reduction_km' else 'pct_improvement'
+        vmax = _ramp_vmax(merged[source], default, cap)
+        colormap = cm.LinearColormap(colors=colors, vmin=0, vmax=vmax)
+        view_styles[view] = {
+            'property': prop,
+            'vmax': vmax,
+            'lut': _colormap_lut(colormap).tolist(),
+            'ramp': colors,
+            'no_change': NO_CHANGE_COLOR,
+            'caption': caption,
+        }
+    view_styles["Coverage Status"] = {
+        'property': 'status',
+        'classes': [list(style) for style in COVERAGE_STATUS_STYLES],
+        'caption': 'Coverage Status',
+    }
+    return features, view_styles
+
+
+def rgba(hex_color: str, opacity: float) -> List[int]:
+    """'#rrggbb' and an opacity as 0-255 RGBA"""
+    return [int(hex_color[i:i + 2], 16) for i in (1, 3, 5)] + [round(opacity * 255)]
+
+
+def view_colors(features: pd.DataFrame, view_style: dict) -> np.ndarray:
+    """
+    Fill colours of one view for every feature, as ChoroplethViewControl styles them
+
+    Args:
+        features: Features from choropleth_features
+        view_style: The view's entry in choropleth_features' view_styles
+
+    Returns:
+        uint8 array [n x 4] of RGBA colours
+    """
+    values = features[view_style['property']].to_numpy()
+    if 'classes' in view_style:
+        palette = np.array([rgba(color, opacity) for _, color, opacity in view_style['classes']], dtype=np.uint8)
+        labels = [label for label, _, _ in view_style['classes']]
+        return palette[pd.Index(labels).get_indexer(values)]
+
+    lut = np.array([rgba(color, 0.6) for color in view_style['lut']], dtype=np.uint8)
+    n = len(lut)
+    values = np.nan_to_num(values.astype(float), nan=0.0)
+    index = np.minimum(n - 1, np.round(values / view_style['vmax'] * (n - 1))).clip(0).astype(int)
+    colors = lut[index]
+    colors[~(values > 0)] = rgba(view_style['no_change'], 0.3)
+    return colors
+
+
+def choropleth_sweep(features: gpd.GeoDataFrame, sweep: CoverageSweep, rate: int) -> Dict:
+    """
+    Rate-sweep table for ChoroplethViewControl, aligned to the features
+
+    Args:
+        features: Features from choropleth_features, in layer order
+        sweep: Coverage distances at every rate (load_coverage_sweep)
+        rate: Initially selected activation rate
+
+    Returns:
+        JSON-serializable dict with the rates, the uint16 decametre baseline
+        [n] and distances [n x n_rates] as base64 (row i is feature i), and
+        the colour-scale maximum of each continuous view at every rate
+    """
+    rows = pd.Index(sweep.geoid).get_indexer(features['GEOID'])
+    found = rows >= 0
+    baseline = np.full(len(rows), DECAMETRES_MISSING, dtype='<u2')
+    mindist = np.full((len(rows), len(sweep.rates)), DECAMETRES_MISSING, dtype='<u2')
+    baseline[found] = sweep.baseline[rows[found]]
+    mindist[found] = sweep.mindist[rows[found]]
+
+    # Colour scales per rate, scaled as choropleth_features scales them
+    before = np.where(baseline == DECAMETRES_MISSING, np.nan, baseline.astype(float))[:, None]
+    after = np.where(mindist == DECAMETRES_MISSING, np.nan, mindist.astype(float))
+    reduction = (before - after) / 100
+    pct = np.where(before > 0, (before - after) / before * 100, 0)
+    vmax = {}
+    for view, (prop, _, _, default, cap) in LINEAR_VIEW_RAMPS.items():
+        values = reduction if prop == 'reduction_km' else pct
+        vmax[view] = [_ramp_vmax(pd.Series(values[:, k]), default, cap) for k in range(len(sweep.rates))]
+
+    return {
+        'rates': [int(r) for r in sweep.rates],
+        'index': int(np.searchsorted(sweep.rates, nearest_rate(sweep.rates, rate))),
+        'baseline': base64.b64encode(baseline.tobytes()).decode('ascii'),
+        'mindist': base64.b64encode(mindist.tobytes()).decode('ascii'),
+        'missing': int(DECAMETRES_MISSING),
+        'radius': COVERAGE_RADIUS_M / 10,
+        'vmax': vmax,
+    }
+
+
+class ChoroplethViewControl(MacroElement):
+    """
+    In-map view switcher for the coverage choropleth
+
+    Restyles the layer client-side from its feature properties and swaps
+    the legend, so changing view needs no rerun and no geometry resend.
+    Given a rate sweep (choropleth_sweep), it also adds an activation-rate
+    slider that recomputes every CBG's values from the embedded table.
+    """
+
+    _template = Template("""
+        {% macro header(this, kwargs) %}
+            <style>
+                .choropleth-views { background: white; padding: 6px 8px; border-radius: 4px;
+                                    box-shadow: 0 1px 4px rgba(0,0,0,0.3); font: 12px sans-serif; }
+                .choropleth-views label { display: block; margin: 1px 0; cursor: pointer; }
+                .choropleth-views .legend-ramp { width: 180px; height: 10px; margin-top: 6px; }
+                .choropleth-views .legend-ticks { display: flex; justify-content: space-between; }
+                .choropleth-views .legend-swatch { display: inline-block; width: 12px; height: 12px;
+                                                   margin-right: 4px; vertical-align: middle; }
+                .choropleth-views .rate-sweep { margin: 4px 0 2px; }
+                .choropleth-views .rate-sweep input { width: 140px; vertical-align: middle; }
+            </style>
+        {% endmacro %}
+
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function() {
+                var layer = {{ this.layer.get_name() }};
+                var views = {{ this.view_styles|tojson }};
+                var order = {{ this.view_styles.keys()|list|tojson }};  // tojson sorts keys
+                var sweep = {{ this.sweep|tojson }};
+                var current = {{ this.view|tojson }};
+                var legend;
+
+                function styler(style) {
+                    var line = {color: '#666', weight: 0.3};
+                    if (style.classes) {
+                        var classes = {};
+                        style.classes.forEach(function(c) { classes[c[0]] = c; });
+                        return function(feature) {
+                            var c = classes[feature.properties[style.property]];
+                            return L.extend({fillColor: c[1], fillOpacity: c[2]}, line);
+                        };
+                    }
+                    var n = style.lut.length;
+                    return function(feature) {
+                        var v = feature.properties[style.property];
+                        if (!(v > 0)) {
+                            return L.extend({fillColor: style.no_change, fillOpacity: 0.3}, line);
+                        }
+                        var i = Math.min(n - 1, Math.round(v / style.vmax * (n - 1)));
+                        return L.extend({fillColor: style.lut[i], fillOpacity: 0.6}, line);
+                    };
+                }
+
+                function legendHtml(style) {
+                    var html = '<b>' + style.caption + '</b>';
+                    if (style.classes) {
+                        style.classes.forEach(function(c) {
+                            html += '<div><span class="legend-swatch" style="background:' + c[1] + '"></span>'
+                                + c[0] + '</div>';
+                        });
+                        return html;
+                    }
+                    return html + '<div class="legend-ramp" style="background:linear-gradient(to right,'
+                        + style.ramp.join(',') + ')"></div><div class="legend-ticks"><span>0</span><span>'
+                        + style.vmax.toFixed(1) + '</span></div>';
+                }
+
+                function show(view) {
+                    current = view;
+                    layer.setStyle(styler(views[view]));
+                    legend.innerHTML = legendHtml(views[view]);
+                    if (layer.onView) {
+                        layer.onView(view);
+                    }
+                }
+
+                function decode(b64) {
+                    var bytes = Uint8Array.from(atob(b64), function(c) { return c.charCodeAt(0); });
+                    return new Uint16Array(bytes.buffer);
+                }
+
+                function round1(v) { return Math.round(v * 10) / 10; }
+
+                var setRate = null;
+                var rateIndex = sweep ? sweep.index : null;
+                if (sweep) {
+                    var baseline = decode(sweep.baseline);
+                    var mindist = decode(sweep.mindist);
+                    var nRates = sweep.rates.length;
+                    var labels = views['Coverage Status'].classes.map(function(c) { return c[0]; });
+                    var rateLabel;
+                    setRate = function(k) {
+                        rateIndex = k;
+                        layer.eachLayer(function(l) {
+                            var p = l.feature.properties;
+                            var before = baseline[p.row], after = mindist[p.row * nRates + k];
+                            var hasBefore = before !== sweep.missing, hasAfter = after !== sweep.missing;
+                            p.before_km = hasBefore ? round1(before / 100) : null;
+                            p.after_km = hasAfter ? round1(after / 100) : null;
+                            p.reduction_km = hasBefore && hasAfter ? round1((before - after) / 100) : 0;
+                            p.improvement_pct = hasBefore && hasAfter && before > 0
+                                ? round1((before - after) / before * 100) : 0;
+                            var coveredAfter = hasAfter && after <= sweep.radius;
+                            var coveredBefore = hasBefore && before <= sweep.radius;
+                            p.status = labels[coveredAfter && !coveredBefore ? 0 : coveredAfter ? 1 : 2];
+                        });
+                        Object.keys(sweep.vmax).forEach(function(view) {
+                            views[view].vmax = sweep.vmax[view][k];
+                        });
+                        rateLabel.innerHTML = sweep.rates[k] + '%';
+                        if (layer.onRate) {
+                            layer.onRate(sweep.rates[k]);
+                        }
+                        show(current);
+                    };
+                }
+
+                var control = L.control({position: {{ this.position|tojson }}});
+                control.onAdd = function() {
+                    var div = L.DomUtil.create('div', 'choropleth-views');
+                    order.forEach(function(view) {
+                        var label = L.DomUtil.create('label', '', div);
+                        var input = L.DomUtil.create('input', '', label);
+                        input.type = 'radio';
+                        input.name = {{ this.get_name()|tojson }};
+                        input.value = view;
+                        input.checked = view === current;
+                        label.appendChild(document.createTextNode(' ' + view));
+                        L.DomEvent.on(input, 'change', function() { show(this.value); });
+                    });
+                    if (sweep) {
+                        var row = L.DomUtil.create('div', 'rate-sweep', div);
+                        row.appendChild(document.createTextNode('Activation rate: '));
+                        rateLabel = L.DomUtil.create('b', '', row);
+                        var slider = L.DomUtil.create('input', '', L.DomUtil.create('div', '', row));
+                        slider.type = 'range';
+                        slider.min = 0;
+                        slider.max = sweep.rates.length - 1;
+                        slider.value = sweep.index;
+                        var play = L.DomUtil.create('button', '', slider.parentNode);
+                        play.type = 'button';
+                        play.innerHTML = '&#9654;';
+                        var timer = null;
+                        L.DomEvent.on(slider, 'input', function() { setRate(+this.value); });
+                        L.DomEvent.on(play, 'click', function() {
+                            if (timer) {
+                                clearInterval(timer);
+                                timer = null;
+                                play.innerHTML = '&#9654;';
+                                return;
+                            }
+                            play.innerHTML = '&#10074;&#10074;';
+                            timer = setInterval(function() {
+                                slider.value = (+slider.value + 1) % sweep.rates.length;
+                                setRate(+slider.value);
+                            }, 700);
+                        });
+                        L.DomEvent.disableScrollPropagation(div);
+                    }
+                    legend = L.DomUtil.create('div', '', div);
+                    L.DomEvent.disableClickPropagation(div);
+                    return div;
+                };
+                control.addTo({{ this._parent.get_name() }});
+
+                // Layers whose features arrive later (viewport batches) restyle through this
+                layer.refresh = function() {
+                    if (setRate) {
+                        setRate(rateIndex);
+                    } else {
+                        show(current);
+                    }
+                };
+                layer.refresh();
+                return {show: show, setRate: setRate};
+            })();
+        {% endmacro %}
+    """)
+
+    def __init__(
+        self,
+        layer,
+        view_styles: Dict,
+        view: str = CHOROPLETH_VIEWS[0],
+        sweep: Optional[Dict] = None,
+        position: str = 'topright'
+    ):
+        super().__init__()
+        self._name = 'ChoroplethViewControl'
+        self.layer = layer
+        self.view_styles = view_styles
+        self.view = view
+        self.sweep = sweep
+        self.position = position
+
+
+class ViewportChoroplethLayer(Layer):
+    """
+    Coverage layer that starts empty and is filled by viewport batches
+
+    For st_folium: the map is rendered once, and each rerun adds only the
+    CBGs newly exposed by the viewport (ChoroplethFeatureBatch, passed as
+    feature_group_to_add), so features already sent stay in the browser.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = L.geoJson(null).addTo({{ this._parent.get_name() }});
+            {{ this.get_name() }}.bindTooltip(function(layer) {
+                var fields = {{ this.fields|tojson }};
+                var aliases = {{ this.aliases|tojson }};
+                var props = layer.feature.properties;
+                return '<table>' + fields.map(function(field, i) {
+                    var value = props[field] === null || props[field] === undefined ? '' : props[field];
+                    return '<tr><th>' + aliases[i] + '</th><td>' + value + '</td></tr>';
+                }).join('') + '</table>';
+            }, {sticky: true, className: 'foliumtooltip'});
+            {{ this.get_name() }}.token = null;
+            window.dssChoropleth = {{ this.get_name() }};
+        {% endmacro %}
+    """)
+
+    def __init__(self, fields: List[str] = TOOLTIP_FIELDS, aliases: List[str] = TOOLTIP_ALIASES,
+                 name: Optional[str] = None):
+        super().__init__(name=name)
+        self._name = 'ViewportChoroplethLayer'
+        self.fields = fields
+        self.aliases = aliases
+
+
+class ChoroplethFeatureBatch(MacroElement):
+    """
+    CBG features appended to the map's ViewportChoroplethLayer
+
+    A batch with a different token (e.g. a new detail level) replaces the
+    features on the client instead of adding to them.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            (function() {
+                var layer = window.dssChoropleth;
+                if (!layer) {
+                    return;
+                }
+                if (layer.token !== {{ this.token|tojson }}) {
+                    layer.clearLayers();
+                    layer.token = {{ this.token|tojson }};
+                }
+                layer.addData({{ this.data|tojson }});
+                if (layer.refresh) {
+                    layer.refresh();
+                }
+            })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, data: Dict, token: str):
+        super().__init__()
+        self._name = 'ChoroplethFeatureBatch'
+        self.data = data
+        self.token = token
+
+
+class MarkerLayerSync(MacroElement):
+    """
+    Marker layers kept on an st_folium map across reruns
+
+    st_folium removes its feature groups whenever they change, so marker
+    layers are not left in the group: when the group is added, its new
+    layers (this element's children) are put on the map and registered by
+    key on the map object, and registered layers not in `keep` are removed.
+    A layer already in the browser is kept without being sent again.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            {{ this._parent.get_name() }}.once('add', function() {
+                var map = this._map;
+                var layers = map.dssMarkerLayers = map.dssMarkerLayers || {};
+                var keep = {{ this.keep|tojson }};
+                Object.keys(layers).forEach(function(key) {
+                    if (keep.indexOf(key) < 0) {
+                        layers[key].remove();
+                        delete layers[key];
+                    }
+                });
+                {%- for key, layer in this.layers.items() %}
+                if (layers[{{ key|tojson }}]) {
+                    layers[{{ key|tojson }}].remove();
+                }
+                layers[{{ key|tojson }}] = {{ layer.get_name() }}.addTo(map);
+                {%- endfor %}
+            });
+        {% endmacro %}
+    """)
+
+    def __init__(self, keep: List[str]):
+        super().__init__()
+        self._name = 'MarkerLayerSync'
+        self.keep = keep
+        self.layers = {}
+
+    def add_layer(self, key: str, layer: Layer) -> None:
+        """Add a marker layer to send (drawn by this element, not its feature group)"""
+        layer.show = False
+        self.layers[key] = layer
+        self.add_child(layer)
+
+
+def _viewport_box(bounds: Optional[Dict], padding: float = VIEWPORT_PADDING):
+    """st_folium bounds as a shapely box, padded on every side; None if unknown"""
+    try:
+        south, west = bounds['_southWest']['lat'], bounds['_southWest']['lng']
+        north, east = bounds['_northEast']['lat'], bounds['_northEast']['lng']
+    except (KeyError, TypeError):
+        return None
+    if None in (south, west, north, east):
+        return None
+    dx, dy = (east - west) * padding, (north - south) * padding
+    return shapely.box(west - dx, south - dy, east + dx, north + dy)
+
+
+def _initial_bounds(state: str, zoom: float = INITIAL_ZOOM, size: Tuple[int, int] = MAP_VIEWPORT_PX) -> Dict:
+    """Bounds (as st_folium reports them) of a map of the given pixel size at the state's initial centre"""
+    lat, lon = STATE_CENTERS.get(state, (39.8, -98.5))
+    world_px = 256 * 2 ** zoom
+    half_w, half_h = size[0] / 2 / world_px, size[1] / 2 / world_px  # Web Mercator unit-square units
+    y = 0.5 - np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) / (2 * np.pi)
+    north, south = (float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * v))))) for v in (y - half_h, y + half_h))
+    return {'_southWest': {'lat': south, 'lng': lon - half_w * 360},
+            '_northEast': {'lat': north, 'lng': lon + half_w * 360}}
+
+
+def viewport_feature_batch(
+    state: str,
+    service: str,
+    activation_rate: int,
+    bounds: Optional[Dict],
+    zoom: Optional[int],
+    sent: Dict[str, Set[str]],
+    token: str = '',
+    raster: bool = False
+) -> folium.FeatureGroup:
+    """
+    CBGs in the viewport that the browser does not have yet
+
+    Queries the spatial index of the cached, simplified state geometry for
+    the (padded) viewport at the zoom's detail level and drops the GEOIDs
+    already sent. Batches are identified by `token` plus the detail level;
+    when that changes the browser replaces its features, so `sent` (updated
+    in place) only keeps the GEOIDs of the current batch token.
+
+    Args:
+        state: State name
+        service: Service type
+        activation_rate: School activation rate percentage
+        bounds: Map bounds returned by st_folium (None: the initial view
+                around the state's centre, until st_folium reports them)
+        zoom: Map zoom returned by st_folium (None: the initial zoom)
+        sent: GEOIDs sent so far, by batch token (kept across reruns)
+        token: Identity of the rendered map (state, service, rate, ...) and
+               of its mount in the browser (a nonce renewed whenever the
+               map is built or shown again), so a new map gets everything
+        raster: As passed to create_choropleth_map; while raster tiles stand
+                in for the CBGs (low zooms) no features are sent
+
+    Returns:
+        Feature group for st_folium's feature_group_to_add
+    """
+    zoom = INITIAL_ZOOM if zoom is None else zoom
+    detail = detail_for_zoom(zoom)
+    batch_token = f"{token}|{detail}"
+    for stale in [key for key in sent if key != batch_token]:
+        del sent[stale]
+    sent_geoids = sent.setdefault(batch_token, set())
+    group = folium.FeatureGroup(name='Coverage (viewport)', control=False)
+    overview = raster_overview(service, state) if raster else None
+    if overview is not None and zoom <= overview['maxzoom']:
+        return group
+
+    coverage_df = load_coverage_data(state, service, activation_rate)
+    cbg_gdf = load_simplified_cbg_geometries(state, detail)
+    if coverage_df is None or cbg_gdf is None:
+        return group
+
+    viewport = _viewport_box(bounds)
+    if viewport is None:
+        viewport = _viewport_box(_initial_bounds(state, zoom))
+    rows = cbg_gdf.sindex.query(viewport, predicate='intersects')
+    visible = cbg_gdf.iloc[np.sort(rows)]
+    visible = visible[~visible['GEOID'].isin(sent_geoids)]
+
+    # Values as create_choropleth_map(viewport=True) computed them; row indexes its rate sweep
+    features, _ = choropleth_features(coverage_df)
+    features['row'] = np.arange(len(features))
+    batch = visible.merge(features, on='GEOID', how='inner')
+    sent_geoids.update(batch['GEOID'])
+    ChoroplethFeatureBatch(batch.__geo_interface__, batch_token).add_to(group)
+    return group
+
+
+def marker_layer_update(
+    state: str,
+    service: str,
+    activated_schools: List[str],
+    show_facilities: bool,
+    show_schools: bool,
+    sent: Dict[str, Set[str]],
+    token: str = ''
+) -> folium.FeatureGroup:
+    """
+    Marker layers to add to or remove from an st_folium map
+
+    The map is built without markers (create_choropleth_map with
+    show_facilities and show_schools off), so the checkboxes do not change
+    it and st_folium keeps the base map and choropleth in the browser. Only
+    the marker layers the browser does not hold yet are sent; a layer
+    switched off is removed there, and panning sends none.
+
+    Args:
+        state: State name
+        service: Service type
+        activated_schools: List of activated school IDs
+        show_facilities: Whether to show existing facilities
+        show_schools: Whether to show activated schools
+        sent: Marker layer keys the browser holds, by token (kept across reruns)
+        token: Identity of the rendered map and of its mount in the browser
+               (see viewport_feature_batch); layers are resent when it changes
+
+    Returns:
+        Feature group for st_folium's feature_group_to_add
+    """
+    for stale in [key for key in sent if key != token]:
+        del sent[stale]
+    held = sent.setdefault(token, set())
+
+    wanted = []
+    if show_facilities:
+        wanted.append('facilities')
+    if show_schools and len(activated_schools) > 0:
+        wanted.append('schools')
+
+    sync = MarkerLayerSync(keep=wanted)
+    if 'facilities' in wanted and 'facilities' not in held:
+        if 'arts' in service.lower():
+            facilities, facility_type = load_arts_facilities(state), 'arts'
+        else:
+            facilities, facility_type = load_hospital_data(state), 'hospital'
+        if facilities is not None:
+            spec = facility_markers(facilities, facility_type)
+            sync.add_layer('facilities', marker_layer(max_markers=FACILITY_MAX_MARKERS, **spec))
+    if 'schools' in wanted and 'schools' not in held:
+        school_gdf = load_school_data(state)
+        if school_gdf is not None:
+            sync.add_layer('schools', marker_layer(**school_markers(school_gdf, activated_schools)))
+
+    held.intersection_update(wanted)
+    held.update(sync.layers)
+    group = folium.FeatureGroup(name='Markers', control=False)
+    sync.add_to(group)
+    return group
+
+
+class TopoJsonLayer(folium.TopoJson):
+    """
+    TopoJSON layer styled client-side
+
+    folium.TopoJson copies a full style dict into every feature; this layer
+    embeds none and leaves styling to ChoroplethViewControl, so the payload
+    carries only the topology and the feature values.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }}_data = {{ this.data|tojson }};
+            var {{ this.get_name() }} = L.geoJson(
+                topojson.feature(
+                    {{ this.get_name() }}_data,
+                    {{ this.get_name() }}_data{{ this._safe_object_path }}
+                )
+            ).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def style_data(self) -> None:
+        """Styles are applied client-side; nothing to embed"""
+
+
+class VectorTileLayer(JSCSSMixin, Layer):
+    """
+    CBG vector tiles joined client-side to per-CBG values by GEOID
+
+    Tiles come from the tile server (src/tile_server.py) and carry only
+    GEOID; the values are embedded once and looked up while drawing. Exposes
+    setStyle/eachLayer like an L.GeoJSON layer, so ChoroplethViewControl
+    restyles it (and updates the values for a rate sweep) the same way.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function() {
+                var records = {{ this.records|tojson }};
+                var fields = {{ this.fields|tojson }};
+                var aliases = {{ this.aliases|tojson }};
+                var style = function() { return {}; };
+                var hidden = {fill: false, stroke: false};
+                var layer = L.vectorGrid.protobuf({{ this.url|tojson }}, {
+                    vectorTileLayerStyles: {
+                        {{ this.layer_name|tojson }}: function(properties) {
+                            var record = records[properties.GEOID];
+                            return record ? L.extend({fill: true}, style({properties: record})) : hidden;
+                        }
+                    },
+                    interactive: true,
+                    maxNativeZoom: {{ this.max_native_zoom }},
+                    rendererFactory: L.canvas.tile,
+                    getFeatureId: function(feature) { return feature.properties.GEOID; }
+                });
+
+                layer.setStyle = function(fn) {
+                    style = fn;
+                    layer.redraw();
+                };
+                layer.eachLayer = function(fn) {
+                    Object.keys(records).forEach(function(geoid) {
+                        fn({feature: {properties: records[geoid]}});
+                    });
+                };
+
+                var tooltip = L.tooltip({sticky: true, className: 'foliumtooltip'});
+                layer.on('mouseover', function(e) {
+                    var record = records[e.layer.properties.GEOID];
+                    if (!record) {
+                        return;
+                    }
+                    var rows = fields.map(function(field, i) {
+                        var value = record[field] === null ? '' : record[field];
+                        return '<tr><th>' + aliases[i] + '</th><td>' + value + '</td></tr>';
+                    });
+                    tooltip.setLatLng(e.latlng).setContent('<table>' + rows.join('') + '</table>');
+                    {{ this._parent.get_name() }}.openTooltip(tooltip);
+                });
+                layer.on('mouseout', function() {
+                    {{ this._parent.get_name() }}.closeTooltip(tooltip);
+                });
+                return layer;
+            })();
+            {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    default_js = [
+        ('leaflet.vectorgrid', 'https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.min.js'),
+    ]
+
+    def __init__(
+        self,
+        features: pd.DataFrame,
+        url: str,
+        fields: List[str] = TOOLTIP_FIELDS,
+        aliases: List[str] = TOOLTIP_ALIASES,
+        max_native_zoom: int = DEFAULT_MAXZOOM,
+        layer_name: str = CBG_TILE_LAYER,
+        name: Optional[str] = None
+    ):
+        super().__init__(name=name)
+        self._name = 'VectorTileLayer'
+        values = pd.DataFrame(features).drop(columns='geometry', errors='ignore')
+        values = values.astype(object).where(values.notna(), None)
+        self.records = values.set_index(values['GEOID'].to_numpy()).to_dict('index')
+        self.url = url
+        self.fields = fields
+        self.aliases = aliases
+        self.max_native_zoom = max_native_zoom
+        self.layer_name = layer_name
+
+
+def cbg_tiles_maxzoom() -> Optional[int]:
+    """Highest zoom level of the CBG tile pyramid, or None if it is not built"""
+    path = get_manifest().path(None, None, 'cbg_tiles')
+    if path is None:
+        return None
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+        return int(read_metadata(conn).get('maxzoom', DEFAULT_MAXZOOM))
+
+
+def raster_overview(service: str, state: str) -> Optional[Dict]:
+    """
+    Metadata of the service's raster choropleth tiles for a state's map
+
+    Adds 'url', the tile URL template with {rate} and {view} placeholders.
+    The tile server lets browsers cache tiles for a day, so the URL carries
+    a fingerprint of the pyramid and of the coverage it was drawn from.
+
+    Returns:
+        The metadata, or None if the tiles are not built, do not cover the
+        state, or predate its coverage data
+    """
+    manifest = get_manifest()
+    service = canonical_service(service)
+    entry = manifest.get(None, service, 'raster_tiles')
+    if entry is None:
+        return None
+    try:
+        metadata = json.loads(Path(entry.path).read_text())
+    except (OSError, ValueError):
+        return None
+    code, _ = cache_key(state)
+    if code not in metadata.get('states', {}) or not metadata.get('rates'):
+        return None
+    if any(version[2] > entry.mtime for version in coverage_fingerprint(code, service)):
+        return None
+    coverage = [coverage_fingerprint(state_code, service) for state_code in sorted(metadata['states'])]
+    version = hashlib.sha256(repr((entry.fingerprint, coverage)).encode()).hexdigest()[:RASTER_VERSION_DIGITS]
+    metadata['url'] = (f"{TILE_SERVER_URL}/raster/{metadata['service']}/{{rate}}/{{view}}/{{z}}/{{x}}/{{y}}.png"
+                       f"?v={version}")
+    return metadata
+
+
+class RasterOverview(MacroElement):
+    """
+    Pre-rendered choropleth tiles in place of the vector layer at low zooms
+
+    Up to the pyramid's maxzoom the raster tiles are shown and the vector
+    CBGs are taken off the map (GeoJSON children detached, vector tiles not
+    loaded); above it the vector layer takes over. The vector layer keeps
+    its entry in the layer control, and the raster follows it. View and
+    rate changes from ChoroplethViewControl switch the raster tiles too.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function() {
+                var map = {{ this._parent.get_name() }};
+                var vector = {{ this.layer.get_name() }};
+                var slugs = {{ this.views|tojson }};
+                var rates = {{ this.rates|tojson }};
+                var maxZoom = {{ this.maxzoom }};
+
+                function nearest(rate) {
+                    return rates.reduce(function(best, r) {
+                        return Math.abs(r - rate) < Math.abs(best - rate) ? r : best;
+                    }, rates[0]);
+                }
+
+                var raster = L.tileLayer({{ this.url|tojson }}, {
+                    view: slugs[{{ this.view|tojson }}],
+                    rate: nearest({{ this.rate }}),
+                    minZoom: {{ this.minzoom }},
+                    maxNativeZoom: maxZoom,
+                    zIndex: 5
+                });
+                vector.onView = function(view) {
+                    raster.options.view = slugs[view];
+                    raster.redraw();
+                };
+                vector.onRate = function(rate) {
+                    raster.options.rate = nearest(rate);
+                };
+
+                // Vector tiles are simply not requested below their minZoom
+                var grid = vector instanceof L.GridLayer;
+                if (grid) {
+                    vector.options.minZoom = maxZoom + 1;
+                }
+                var detached = false;
+                function update() {
+                    var low = map.getZoom() <= maxZoom;
+                    var on = map.hasLayer(vector);
+                    if (on && low) {
+                        raster.addTo(map);
+                    } else {
+                        map.removeLayer(raster);
+                    }
+                    if (!grid && on && low !== detached) {
+                        vector.eachLayer(function(l) { low ? map.removeLayer(l) : map.addLayer(l); });
+                        detached = low;
+                    }
+                }
+                vector.on('add', function() { detached = false; update(); });
+                vector.on('remove', function() { detached = false; update(); });
+                map.on('zoomend', update);
+                update();
+                return raster;
+            })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer: Layer, metadata: Dict, view: str, rate: int):
+        super().__init__()
+        self._name = 'RasterOverview'
+        self.layer = layer
+        self.url = metadata['url']
+        self.views = metadata['views']
+        self.rates = metadata['rates']
+        self.minzoom = metadata['minzoom']
+        self.maxzoom = metadata['maxzoom']
+        self.view = view
+        self.rate = int(rate)
+
+
+def add_choropleth_layer(
     m: folium.Map,
-    facilities: pd.DataFrame,
-    facility_type: str = 'arts',
-    max_markers: int = 500
+    merged: gpd.GeoDataFrame,
+    view_type: str = CHOROPLETH_VIEWS[0],
+    topology: Optional[Dict] = None,
+    sweep: Optional[CoverageSweep] = None,
+    tiles: Optional[int] = None,
+    viewport: bool = False,
+    raster: Optional[Dict] = None
 ) -> None:
     """
-    Add facility markers to the map
+    Add the coverage choropleth to the map as a single switchable layer
+
+    All CBGs go into one FeatureCollection carrying the values of every
+    view, with one GeoJsonTooltip; an in-map control switches between the
+    views by restyling the layer in the browser.
+
+    Args:
+        m: Map to add the layer to
+        merged: CBG geometries left-joined with coverage data. For GeoJSON
+                the geometries are used as given; pass them simplified
+                (load_simplified_cbg_geometries)
+        view_type: Initially selected view, one of CHOROPLETH_VIEWS
+        topology: CBG topology from load_cbg_topology, in merged's row
+                  order; when given the layer is emitted as TopoJSON
+        sweep: Coverage distances at every rate (load_coverage_sweep); when
+               given, the map embeds them and adds an activation-rate slider
+               starting at merged's rate
+        tiles: Max zoom of the CBG tile pyramid (cbg_tiles_maxzoom); when
+               given, geometry is loaded as vector tiles from TILE_SERVER_URL
+               and merged only needs the coverage columns
+        viewport: Add an empty layer for viewport_feature_batch to fill;
+                  merged only needs the coverage columns
+        raster: Raster tile metadata (raster_overview); when given, the
+                pre-rendered tiles replace the layer at low zooms
+    """
+    features, view_styles = choropleth_features(merged)
+    sweep_table = None
+    if sweep is not None:
+        sweep_table = choropleth_sweep(features, sweep, merged.attrs.get('activation_rate', sweep.rates[0]))
+        features['row'] = np.arange(len(features))
+    tooltip = folium.GeoJsonTooltip(fields=TOOLTIP_FIELDS, aliases=TOOLTIP_ALIASES)
+
+    if viewport:
+        layer = ViewportChoroplethLayer(name='Coverage')
+    elif tiles is not None:
+        url = f"{TILE_SERVER_URL}/{CBG_TILE_LAYER}/{{z}}/{{x}}/{{y}}.pbf"
+        layer = VectorTileLayer(features, url, max_native_zoom=tiles, name='Coverage')
+    elif topology is not None:
+        records = pd.DataFrame(features.drop(columns=features.geometry.name)).to_dict('records')
+        layer = TopoJsonLayer(
+            with_properties(topology, records, CBG_TOPOLOGY_OBJECT),
+            f'objects.{CBG_TOPOLOGY_OBJECT}',
+            name='Coverage',
+            tooltip=tooltip
+        )
+    else:
+        # Convert to a GeoJSON dict once; folium would otherwise convert the frame twice
+        layer = folium.GeoJson(features.__geo_interface__, name='Coverage', tooltip=tooltip)
+    layer.add_to(m)
+    ChoroplethViewControl(layer, view_styles, view_type, sweep_table).add_to(m)
+    if raster is not None:
+        RasterOverview(layer, raster, view_type, merged.attrs.get('activation_rate', raster['rates'][0])).add_to(m)
+
+
+def facility_markers(facilities: pd.DataFrame, facility_type: str = 'arts') -> Dict:
     """
-    # Create feature group
-    group_name = 'Arts Facilities' if facility_type == 'arts' else 'Hospitals'
-    fg = folium.FeatureGroup(name=group_name)
+    Marker layer arguments of facility points (see marker_layer)
+
+    Args:
+        facilities: Facility points
+        facility_type: 'arts' or 'hospital'
+
+    Returns:
+        coords, properties, style, popup, tooltip, name and cluster_label
+    """
+    coords = point_coordinates(facilities)
+    rows = facilities.loc[coords.index]
 
-    # Determine marker style
     if facility_type == 'arts':
         color = '#9b59b6'  # Purple
-        icon_name = 'fa-theater-masks'
+        spec = {
+            'properties': {
+                'name': first_column(rows, ['name', 'OrgName'], 'Arts Facility'),
+                'type': first_column(rows, ['org_type', 'NTEECC']),
+                'city': first_column(rows, ['city', 'City']),
+            },
+            'popup': ['<b>{name}</b>', 'Type: {type}', 'City: {city}'],
+            'name': 'Arts Facilities',
+            'cluster_label': 'arts facilities',
+        }
     else:
         color = '#3498db'  # Blue
-        icon_name = 'fa-hospital'
-
-    count = 0
-    for idx, row in facilities.iterrows():
-        # Get coordinates
-        if hasattr(row, 'geometry') and row.geometry is not None:
-            lat, lon = row.geometry.y, row.geometry.x
-        elif 'lat' in row.index and 'lon' in row.index:
-            lat, lon = row['lat'], row['lon']
-        elif 'Latitude' in row.index and 'Longitude' in row.index:
-            lat, lon = row['Latitude'], row['Longitude']
-        elif 'LATITUDE' in row.index and 'LONGITUDE' in row.index:
-            lat, lon = row['LATITUDE'], row['LONGITUDE']
-        else:
-            continue
-
-        if pd.isna(lat) or pd.isna(lon):
-            continue
-
-        # Create popup content
-        if facility_type == 'arts':
-            name = row.get('name', row.get('OrgName', 'Arts Facility'))
-            city = row.get('city', row.get('City', ''))
-            org_type = row.get('org_type', row.get('NTEECC', ''))
-            popup_html = f"""
-                <b>{name}</b><br>
-                Type: {org_type}<br>
-                City: {city}
-            """
-        else:
-            name = row.get('NAME', 'Hospital')
-            beds = row.get('BEDS', 'N/A')
-            trauma = row.get('TRAUMA', 'N/A')
-            hosp_type = row.get('TYPE', '')
-            popup_html = f"""
-                <b>{name}</b><br>
-                Type: {hosp_type}<br>
-                Beds: {beds}<br>
-                Trauma Level: {trauma}
-            """
-
-        folium.CircleMarker(
-            location=[lat, lon],
-            radius=4,
-            color=color,
-            fill=True,
-            fillColor=color,
-            fillOpacity=0.7,
-            weight=1,
-            popup=folium.Popup(popup_html, max_width=300),
-            tooltip=name
-        ).add_to(fg)
-
-        count += 1
-        if count >= max_markers:
-            break
-
-    fg.add_to(m)
+        spec = {
+            'properties': {
+                'name': first_column(rows, ['NAME'], 'Hospital'),
+                'type': first_column(rows, ['TYPE']),
+                'beds': first_column(rows, ['BEDS'], 'N/A'),
+                'trauma': first_column(rows, ['TRAUMA'], 'N/A'),
+            },
+            'popup': ['<b>{name}</b>', 'Type: {type}', 'Beds: {beds}', 'Trauma Level: {trauma}'],
+            'name': 'Hospitals',
+            'cluster_label': 'hospitals',
+        }
+    return dict(
+        spec,
+        coords=coords,
+        style={'radius': 4, 'color': color, 'fillColor': color, 'fillOpacity': 0.7, 'weight': 1},
+        tooltip='{name}'
+    )
 
 
-def add_school_markers(
-    m: folium.Map,
-    school_gdf: gpd.GeoDataFrame,
-    activated_schools: List[str],
-    max_markers: int = None
-) -> None:
+def school_markers(school_gdf: pd.DataFrame, activated_schools: List[str]) -> Dict:
     """
-    Add activated school markers to the map
-    """
-    fg = folium.FeatureGroup(name='Activated Schools')
-
-    activated_set = set(str(s) for s in activated_schools)
-    count = 0
+    Marker layer arguments of the activated schools (see marker_layer)
 
-    for idx, school in school_gdf.iterrows():
-        if str(idx) not in activated_set:
-            continue
+    Args:
+        school_gdf: School points, indexed by school ID
+        activated_schools: List of activated school IDs
 
-        if not hasattr(school, 'geometry') or school.geometry is None:
-            continue
+    Returns:
+        coords, properties, style, popup, tooltip, name and cluster_label
+    """
+    activated_set = set(str(s) for s in activated_schools)
+    activated = school_gdf[school_gdf.index.astype(str).isin(activated_set)]
+    coords = point_coordinates(activated)
+    rows = activated.loc[coords.index]
+
+    name = first_column(rows, ['School Name', 'NAME'])
+    return {
+        'coords': coords,
+        'properties': {
+            'name': name.where(name != '', 'School ' + rows.index.astype(str)),
+            'district': first_column(rows, ['District']),
+            'city': first_column(rows, ['CITY', 'City']),
+            'students': first_column(rows, ['Students*'], 'N/A'),
+        },
+        'style': {'radius': 5, 'color': '#27ae60', 'fillColor': '#2ecc71', 'fillOpacity': 0.8, 'weight': 2},
+        'popup': ['<b>{name}</b>', 'District: {district}', 'City: {city}', 'Students: {students}'],
+        'tooltip': 'School: {name}',
+        'name': 'Activated Schools',
+        'cluster_label': 'schools',
+    }
 
-        lat, lon = school.geometry.y, school.geometry.x
 
-        # Get school info
-        name = school.get('School Name', school.get('NAME', f'School {idx}'))
-        city = school.get('CITY', school.get('City', ''))
-        students = school.get('Students*', 'N/A')
-        district = school.get('District', '')
+def add_facility_markers(
+    m: folium.Map,
+    facilities: pd.DataFrame,
+    facility_type: str = 'arts',
+    max_markers: int = FACILITY_MAX_MARKERS
+) -> None:
+    """
+    Add facility markers to the map, as one canvas-drawn marker layer
 
-        popup_html = f"""
-            <b>{name}</b><br>
-            District: {district}<br>
-            City: {city}<br>
-            Students: {students}
-        """
+    Every facility is represented: beyond max_markers, facilities are drawn
+    as the levels of their cluster hierarchy (at most max_markers markers
+    per zoom level) instead of one marker each.
+    """
+    marker_layer(max_markers=max_markers, **facility_markers(facilities, facility_type)).add_to(m)
 
-        folium.CircleMarker(
-            location=[lat, lon],
-            radius=5,
-            color='#27ae60',  # Green
-            fill=True,
-            fillColor='#2ecc71',
-            fillOpacity=0.8,
-            weight=2,
-            popup=folium.Popup(popup_html, max_width=300),
-            tooltip=f"School: {name}"
-        ).add_to(fg)
 
-        count += 1
-        if max_markers and count >= max_markers:
-            break
+def add_school_markers(
+    m: folium.Map,
+    school_gdf: pd.DataFrame,
+    activated_schools: List[str],
+    max_markers: int = None
+) -> None:
+    """
+    Add activated school markers to the map, as one canvas-drawn marker layer
 
-    fg.add_to(m)
+    With max_markers, schools beyond it are clustered as in add_facility_markers.
+    """
+    marker_layer(max_markers=max_markers, **school_markers(school_gdf, activated_schools)).add_to(m)
 
 
 def create_simple_markers_map(
@@ -592,12 +1361,12 @@ def create_simple_markers_map(
 
     m = folium.Map(
         location=center,
-        zoom_start=6,
+        zoom_start=INITIAL_ZOOM,
         tiles='cartodbpositron'
     )
 
     # Add activated schools
-    if activated_schools:
+    if len(activated_schools) > 0:
         school_gdf = load_school_data(state)
         if school_gdf is not None:
             add_school_markers(m, school_gdf, activated_schools)
@@ -615,4 +1384,4 @@ def create_simple_markers_map(
 
     folium.LayerControl().add_to(m)
 
-    return m
+    return use_local_assets(m)
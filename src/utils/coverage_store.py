@@ -0,0 +1,319 @@
+"""
+CBG coverage store for SchoolShare DSS
+Single cached source of per-rate CBG coverage, shared by the map and the tabs
+
+`python src/ingest.py coverage` packs each state's per-rate coverage CSVs into
+a coverage matrix under STORE_PATH/coverage/service=<service>/state=<code>/:
+
+    geoid.npy     - GEOID keys, 12-character strings        [n_cbg]
+    baseline.npy  - mindist_current in metres, float32      [n_cbg]
+    rates.npy     - activation rates, int16, ascending      [n_rates]
+    mindist.npy   - mindist_sol in metres, float32          [n_cbg x n_rates]
+
+mindist.npy is stored column-major and opened with np.memmap, so reading one
+activation rate is a single contiguous slice with no parsing, and the pages
+are shared by every session through the OS page cache. States without a
+compiled matrix fall back to the per-rate CSVs.
+
+load_coverage_sweep returns all rates at once as uint16 decametres, compact
+enough to embed in a map for client-side rate scrubbing.
+"""
+
+import shutil
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import STORE_PATH
+from .manifest import DataManifest, cache_key, get_manifest, nearest_rate
+
+COVERAGE_STORE_PATH = STORE_PATH / "coverage"
+
+# A CBG counts as covered when its nearest facility is within this distance
+COVERAGE_RADIUS_M = 10000
+
+# Rate-sweep tables hold distances as uint16 decametres (up to 655 km)
+DECAMETRES_MISSING = np.iinfo(np.uint16).max
+
+
+class CoverageMatrix(NamedTuple):
+    """Memory-mapped coverage distances of one (state, service)"""
+    geoid: np.ndarray
+    baseline: np.ndarray
+    rates: np.ndarray
+    mindist: np.ndarray
+
+    def column(self, rate: int) -> np.ndarray:
+        """Distances after optimization at one activation rate"""
+        return self.mindist[:, int(np.searchsorted(self.rates, rate))]
+
+
+class CoverageSweep(NamedTuple):
+    """Compact distances of one (state, service) at every activation rate"""
+    geoid: np.ndarray
+    rates: np.ndarray
+    baseline: np.ndarray
+    mindist: np.ndarray
+
+
+def to_decametres(metres) -> np.ndarray:
+    """Distances in metres as uint16 decametres; NaN becomes DECAMETRES_MISSING"""
+    metres = np.asarray(metres, dtype=np.float64)
+    decametres = np.clip(np.rint(metres / 10), 0, DECAMETRES_MISSING - 1)
+    return np.where(np.isnan(metres), DECAMETRES_MISSING, decametres).astype(np.uint16)
+
+
+def load_coverage_data(state: str, service: str, activation_rate: int) -> Optional[pd.DataFrame]:
+    """
+    Load CBG-level coverage data with derived columns
+
+    When the requested activation rate has no coverage data, the nearest
+    available rate is used and recorded in df.attrs['activation_rate'].
+
+    Args:
+        state: State name or abbreviation (e.g., "Texas" or "TX")
+        service: Service type ("Arts Facilities"/"arts" or "Hospitals"/"hospitals")
+        activation_rate: School activation percentage
+
+    Returns:
+        DataFrame with GEOID, mindist_current, mindist_sol and the derived
+        distance, improvement and coverage columns, or None if the state has
+        no coverage data
+    """
+    manifest = get_manifest()
+    state_code, service = cache_key(state, service)
+
+    matrix_version = manifest.fingerprint(state_code, service, 'coverage_matrix')
+    if matrix_version is not None:
+        matrix = open_coverage_matrix(state_code, service, matrix_version)
+        rate = nearest_rate(matrix.rates, activation_rate)
+        version = matrix_version
+    else:
+        rate = manifest.nearest_rate(state_code, service, activation_rate)
+        version = manifest.fingerprint(state_code, service, 'coverage', rate)
+    if rate is None:
+        return None
+    return _load_coverage_data(state_code, service, rate, version)
+
+
+@st.cache_data(max_entries=500)
+def _load_coverage_data(state_code: str, service: str, rate: int, source_version: Tuple) -> Optional[pd.DataFrame]:
+    """Cached loader keyed by canonical (state code, service, rate) and source fingerprint"""
+    manifest = get_manifest()
+    matrix_version = manifest.fingerprint(state_code, service, 'coverage_matrix')
+    if matrix_version is not None:
+        matrix = open_coverage_matrix(state_code, service, matrix_version)
+        df = pd.DataFrame({
+            'GEOID': matrix.geoid,
+            'mindist_current': matrix.baseline,
+            'mindist_sol': matrix.column(rate),
+        })
+        # CBGs missing from this rate's CSV were stored as NaN
+        return add_coverage_columns(df.dropna(subset=['mindist_sol']).reset_index(drop=True), rate)
+
+    file_path = manifest.path(state_code, service, 'coverage', rate)
+    if file_path is None:
+        return None
+
+    df = pd.read_csv(file_path, dtype={'GEOID': str})
+    return add_coverage_columns(df, rate)
+
+
+def coverage_fingerprint(state: str, service: str) -> Tuple:
+    """
+    Fingerprints of the files a state's coverage is read from: its coverage
+    matrix when compiled, else every rate's CSV (empty without coverage data)
+    """
+    manifest = get_manifest()
+    state_code, service = cache_key(state, service)
+    version = manifest.fingerprint(state_code, service, 'coverage_matrix')
+    if version is not None:
+        return (version,)
+    return tuple(manifest.fingerprint(state_code, service, 'coverage', rate)
+                 for rate in manifest.rates(state_code, service))
+
+
+def load_coverage_sweep(state: str, service: str) -> Optional[CoverageSweep]:
+    """
+    Load a state's coverage distances for every activation rate, quantized
+
+    Read from the coverage matrix when compiled, else from the per-rate CSVs.
+
+    Args:
+        state: State name or abbreviation
+        service: Service type
+
+    Returns:
+        CoverageSweep with ascending rates, baseline [n_cbg] and mindist
+        [n_cbg x n_rates] in uint16 decametres, or None without coverage data
+    """
+    state_code, service = cache_key(state, service)
+    version = coverage_fingerprint(state_code, service)
+    if not version:
+        return None
+    return _load_coverage_sweep(state_code, service, version)
+
+
+@st.cache_data(max_entries=100)
+def _load_coverage_sweep(state_code: str, service: str, source_version: Tuple) -> Optional[CoverageSweep]:
+    """Cached sweep keyed by canonical (state code, service) and source fingerprint"""
+    manifest = get_manifest()
+    matrix_version = manifest.fingerprint(state_code, service, 'coverage_matrix')
+    if matrix_version is not None:
+        matrix = open_coverage_matrix(state_code, service, matrix_version)
+        return CoverageSweep(
+            geoid=np.asarray(matrix.geoid),
+            rates=np.asarray(matrix.rates, dtype=int),
+            baseline=to_decametres(matrix.baseline),
+            mindist=to_decametres(matrix.mindist),
+        )
+
+    frames = []
+    for rate in manifest.rates(state_code, service):
+        df = _load_coverage_data(state_code, service, rate,
+                                 manifest.fingerprint(state_code, service, 'coverage', rate))
+        if df is not None:
+            frames.append((rate, df.drop_duplicates('GEOID').set_index('GEOID')))
+    if not frames:
+        return None
+    baseline = frames[0][1]['mindist_current']
+    for _, df in frames[1:]:
+        baseline = baseline.combine_first(df['mindist_current'])
+    baseline = baseline.sort_index()
+    return CoverageSweep(
+        geoid=baseline.index.to_numpy(dtype='U12'),
+        rates=np.array([rate for rate, _ in frames]),
+        baseline=to_decametres(baseline),
+        mindist=np.column_stack([to_decametres(df['mindist_sol'].reindex(baseline.index)) for _, df in frames]),
+    )
+
+
+@st.cache_resource(max_entries=100)
+def open_coverage_matrix(state_code: str, service: str, source_version: Tuple) -> CoverageMatrix:
+    """
+    Open a compiled coverage matrix read-only; the memmaps are shared across sessions
+
+    Args:
+        state_code: Two-letter state code
+        service: Canonical service ('arts' or 'hospitals')
+        source_version: Manifest fingerprint of the matrix partition (cache key)
+    """
+    path = Path(get_manifest().path(state_code, service, 'coverage_matrix'))
+    return CoverageMatrix(
+        geoid=np.load(path / "geoid.npy"),
+        baseline=np.load(path / "baseline.npy", mmap_mode='r'),
+        rates=np.load(path / "rates.npy"),
+        mindist=np.load(path / "mindist.npy", mmap_mode='r'),
+    )
+
+
+def build_coverage_matrix(rate_files: Dict[int, Path], path: Path) -> int:
+    """
+    Pack one state's per-rate coverage CSVs into a coverage matrix
+
+    CBGs are aligned on GEOID across rates; a CBG absent from one rate's
+    file gets NaN in that column.
+
+    Args:
+        rate_files: Coverage CSV per activation rate
+        path: Partition directory to write (replaced if it exists)
+
+    Returns:
+        Number of CBGs in the matrix
+    """
+    rates = sorted(rate_files)
+    columns = {}
+    baseline = None
+    for rate in rates:
+        df = pd.read_csv(rate_files[rate], usecols=['GEOID', 'mindist_current', 'mindist_sol'],
+                         dtype={'GEOID': str})
+        df['GEOID'] = df['GEOID'].str.zfill(12)
+        df = df.drop_duplicates('GEOID').set_index('GEOID')
+        columns[rate] = df['mindist_sol']
+        current = df['mindist_current']
+        baseline = current if baseline is None else baseline.combine_first(current)
+
+    baseline = baseline.sort_index()
+    geoid = baseline.index
+
+    # Write to a sibling directory and swap it in, so readers never see a partial matrix
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    np.save(tmp_path / "geoid.npy", geoid.to_numpy(dtype='U12'))
+    np.save(tmp_path / "baseline.npy", baseline.to_numpy(dtype=np.float32))
+    np.save(tmp_path / "rates.npy", np.asarray(rates, dtype=np.int16))
+    mindist = np.lib.format.open_memmap(
+        tmp_path / "mindist.npy", mode='w+', dtype=np.float32,
+        shape=(len(geoid), len(rates)), fortran_order=True
+    )
+    for i, rate in enumerate(rates):
+        mindist[:, i] = columns[rate].reindex(geoid).to_numpy(dtype=np.float32)
+    mindist.flush()
+    del mindist
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp_path.rename(path)
+    return len(geoid)
+
+
+def build_coverage_store(
+    manifest: Optional[DataManifest] = None,
+    store_path: Path = COVERAGE_STORE_PATH
+) -> Dict[str, int]:
+    """
+    Compile every state's coverage CSVs into coverage matrices
+
+    Args:
+        manifest: Manifest to read coverage files from (default: fresh scan)
+        store_path: Root directory of the coverage store
+
+    Returns:
+        Number of states compiled per service
+    """
+    manifest = manifest or DataManifest.scan()
+    by_state: Dict[Tuple[str, str], Dict[int, Path]] = {}
+    for (code, service, rate, kind), entry in manifest.entries.items():
+        if kind == 'coverage':
+            by_state.setdefault((code, service), {})[rate] = Path(entry.path)
+
+    counts: Dict[str, int] = {}
+    for (code, service), rate_files in sorted(by_state.items()):
+        build_coverage_matrix(rate_files, store_path / f"service={service}" / f"state={code}")
+        counts[service] = counts.get(service, 0) + 1
+    return counts
+
+
+def add_coverage_columns(df: pd.DataFrame, rate: int) -> pd.DataFrame:
+    """
+    Add the derived coverage columns to a frame of CBG distances
+
+    Args:
+        df: Frame with GEOID, mindist_current and mindist_sol (metres)
+        rate: Activation rate the distances belong to
+
+    Returns:
+        The same frame with derived columns and attrs['activation_rate'] set
+    """
+    # Zero-pad GEOID to 12 characters (fixes leading zero issue)
+    df['GEOID'] = df['GEOID'].str.zfill(12)
+
+    df['mindist_current_km'] = df['mindist_current'] / 1000
+    df['mindist_sol_km'] = df['mindist_sol'] / 1000
+    df['distance_reduction_m'] = df['mindist_current'] - df['mindist_sol']
+    df['distance_reduction_km'] = df['distance_reduction_m'] / 1000
+    df['pct_improvement'] = np.where(
+        df['mindist_current'] > 0,
+        (df['distance_reduction_m'] / df['mindist_current']) * 100,
+        0
+    )
+
+    df['covered_before'] = df['mindist_current'] <= COVERAGE_RADIUS_M
+    df['covered_after'] = df['mindist_sol'] <= COVERAGE_RADIUS_M
+    df['newly_covered'] = (~df['covered_before']) & df['covered_after']
+    df.attrs['activation_rate'] = rate
+
+    return df
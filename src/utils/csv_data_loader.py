@@ -6,73 +6,62 @@ Handles the optimization result CSV files
 import streamlit as st
 import pandas as pd
 import numpy as np
-from pathlib import Path
-from typing import Dict, Optional, List, Tuple
-import ast
+from typing import Dict, List, Tuple
+
+from .cell_parser import EMPTY_PAIRS, parse_pairing_array
+from .coverage_store import load_coverage_data
+from .manifest import cache_key, get_manifest, resolve_state
+from .result_store import (
+    load_results_from_store,
+    metadata_from_metrics,
+    metrics_from_csv,
+    read_store_metrics,
+    results_from_csv
+)
 
-@st.cache_data(ttl=3600)
 def load_optimization_results(state: str, service: str) -> Dict:
     """
-    Load optimization results from CSV files
+    Load optimization results from the Parquet result store,
+    falling back to the raw CSV files
+
+    Metadata, baseline and per-rate scalar metrics are read immediately. Each
+    rate's activated school list and pairings are parsed on first access; the
+    returned object is shared across sessions, so that work happens once.
     
     Args:
-        state: State abbreviation (e.g., "TX")
-        service: Service type ("arts" or "hospitals")
+        state: State name or abbreviation (e.g., "Texas" or "TX")
+        service: Service type ("Arts Facilities"/"arts" or "Hospitals"/"hospitals")
     
     Returns:
         Dictionary containing optimization results
     """
-    
-    # Map state names to codes and FIPS
-    state_mapping = {
-        "Alabama": ("AL", "01"), "Arkansas": ("AR", "05"), "Arizona": ("AZ", "04"),
-        "California": ("CA", "06"), "Colorado": ("CO", "08"), "Connecticut": ("CT", "09"),
-        "District of Columbia": ("DC", "11"), "Delaware": ("DE", "10"), "Florida": ("FL", "12"),
-        "Georgia": ("GA", "13"), "Iowa": ("IA", "19"), "Idaho": ("ID", "16"),
-        "Illinois": ("IL", "17"), "Indiana": ("IN", "18"), "Kansas": ("KS", "20"),
-        "Kentucky": ("KY", "21"), "Louisiana": ("LA", "22"), "Massachusetts": ("MA", "25"),
-        "Maryland": ("MD", "24"), "Maine": ("ME", "23"), "Michigan": ("MI", "26"),
-        "Minnesota": ("MN", "27"), "Missouri": ("MO", "29"), "Mississippi": ("MS", "28"),
-        "Montana": ("MT", "30"), "North Carolina": ("NC", "37"), "North Dakota": ("ND", "38"),
-        "Nebraska": ("NE", "31"), "New Hampshire": ("NH", "33"), "New Jersey": ("NJ", "34"),
-        "New Mexico": ("NM", "35"), "Nevada": ("NV", "32"), "New York": ("NY", "36"),
-        "Ohio": ("OH", "39"), "Oklahoma": ("OK", "40"), "Oregon": ("OR", "41"),
-        "Pennsylvania": ("PA", "42"), "Rhode Island": ("RI", "44"), "South Carolina": ("SC", "45"),
-        "South Dakota": ("SD", "46"), "Tennessee": ("TN", "47"), "Texas": ("TX", "48"),
-        "Utah": ("UT", "49"), "Virginia": ("VA", "51"), "Vermont": ("VT", "50"),
-        "Washington": ("WA", "53"), "Wisconsin": ("WI", "55"), "West Virginia": ("WV", "54"),
-        "Wyoming": ("WY", "56")
-    }
-    
-    # Get state code and FIPS
-    if state in state_mapping:
-        state_code, state_fips = state_mapping[state]
-    else:
-        # Try using state as code directly
-        state_code = state
-        # Find FIPS by searching mapping
-        state_fips = None
-        for name, (code, fips) in state_mapping.items():
-            if code == state:
-                state_fips = fips
-                break
-    
-    # Determine file path based on service
-    if service.lower() == "arts" or service.lower() == "arts facilities":
-        data_dir = Path("data/raw/result_arts_250425")
-        # Find the file for this state
-        pattern = f"{state_code}_{state_fips}_result_dist_*_reduced.csv"
-    else:  # hospitals
-        data_dir = Path("data/raw/result_hospital_250507")
-        pattern = f"{state_code}_{state_fips}_result_dist_16093_32187_reduced.csv"
-    
-    # Find matching file
-    files = list(data_dir.glob(pattern))
-    if not files:
+    state_code, service = cache_key(state, service)
+    return _load_optimization_results(state_code, service, _results_version(state_code, service))
+
+
+def _results_version(state_code: str, service: str) -> Tuple:
+    """Fingerprints of the compiled store partition and the raw CSV"""
+    manifest = get_manifest()
+    return (manifest.fingerprint(state_code, service, 'result_store'),
+            manifest.fingerprint(state_code, service, 'result'))
+
+
+@st.cache_resource(max_entries=100)
+def _load_optimization_results(state_code: str, service: str, source_version: Tuple) -> Dict:
+    """Cached loader keyed by canonical (state code, service) and source fingerprint"""
+    resolved = resolve_state(state_code)
+    state = resolved.name if resolved else state_code
+
+    # Read the compiled Parquet store when it holds this state
+    results = load_results_from_store(state, state_code, service)
+    if results is not None:
+        return results
+
+    file_path = get_manifest().path(state_code, service, 'result')
+    if file_path is None:
         return generate_demo_data_from_csv(state, service)
     
     # Load the CSV file
-    file_path = files[0]
     df = pd.read_csv(file_path, index_col=0)
     
     # Extract data
@@ -80,69 +69,47 @@ def load_optimization_results(state: str, service: str) -> Dict:
     
     return results
 
+
+def load_results_metadata(state: str, service: str) -> Dict:
+    """
+    Load only the metadata and baseline metrics of a state's results
+
+    Used by the sidebar, which needs the school and facility counts but none of
+    the per-rate school lists or pairings.
+
+    Returns:
+        Dictionary with 'metadata' and 'baseline' entries
+    """
+    state_code, service = cache_key(state, service)
+    return _load_results_metadata(state_code, service, _results_version(state_code, service))
+
+
+@st.cache_data(max_entries=200)
+def _load_results_metadata(state_code: str, service: str, source_version: Tuple) -> Dict:
+    """Cached loader keyed by canonical (state code, service) and source fingerprint"""
+    metrics = read_store_metrics(state_code, service)
+    if metrics is None:
+        file_path = get_manifest().path(state_code, service, 'result')
+        if file_path is None:
+            demo = generate_demo_data_from_csv(state_code, service)
+            return {'metadata': demo['metadata'], 'baseline': demo['baseline']}
+        # Read just the baseline and first activation columns
+        header = pd.read_csv(file_path, index_col=0, nrows=0).columns
+        first_rate = [col for col in header if col.startswith('p=')][:1]
+        usecols = [0] + [header.get_loc(col) + 1 for col in ['existing'] + first_rate if col in header]
+        df = pd.read_csv(file_path, index_col=0, usecols=usecols)
+        metrics = metrics_from_csv(df)
+
+    return metadata_from_metrics(metrics)
+
+
 def parse_optimization_csv(df: pd.DataFrame, state: str, service: str) -> Dict:
     """
     Parse the transposed CSV format into structured data
+
+    List-valued cells are parsed lazily, per rate, on first access.
     """
-    # Get activation percentages available
-    activation_cols = [col for col in df.columns if col.startswith('p=')]
-    percentages = [int(col.replace('p=', '').replace('%', '')) for col in activation_cols]
-    
-    # Extract key metrics
-    results = {
-        'state': state,
-        'service': service,
-        'metadata': {
-            'n_cbgs': int(df.loc['|I|', activation_cols[0]] if activation_cols else 0),
-            'n_schools': int(df.loc['|J|', activation_cols[0]] if activation_cols else 0),
-            'n_facilities': int(df.loc['|Q|', activation_cols[0]] if activation_cols else 0),
-            'primary_dist_m': float(df.loc['delta1 threshold', activation_cols[0]] if activation_cols else 0),
-            'secondary_dist_m': float(df.loc['delta2 threshold', activation_cols[0]] if activation_cols else 0),
-        },
-        'baseline': {
-            'primary_coverage': float(df.loc['Primary coverage', 'existing']),
-            'secondary_coverage': float(df.loc['Secondary coverage', 'existing']),
-            'avg_distance_m': float(df.loc['Customer Avg dist to fac', 'existing']),
-            'max_distance_m': float(df.loc['Customer Max dist to fac', 'existing']),
-        },
-        'optimized': {}
-    }
-    
-    # Extract data for each activation percentage
-    for pct, col in zip(percentages, activation_cols):
-        try:
-            results['optimized'][pct] = {
-                'n_schools_activated': int(df.loc['num facility to open', col]),
-                'primary_coverage': float(df.loc['Primary coverage', col]),
-                'secondary_coverage': float(df.loc['Secondary coverage', col]),
-                'avg_distance_m': float(df.loc['Customer Avg dist to fac', col]),
-                'max_distance_m': float(df.loc['Customer Max dist to fac', col]),
-                'min_distance_m': float(df.loc['Customer Min dist to fac', col]),
-                'nonwhite_pct': float(df.loc['Nonwhite % (secondary cover)', col]),
-                'nonbach_pct': float(df.loc['NonBach % (secondary cover)', col]),
-                'computation_time': float(df.loc['Total Time (sec)', col]),
-            }
-            
-            # Extract school list if available
-            if 'open facility NCESSCH' in df.index:
-                school_list_str = df.loc['open facility NCESSCH', col]
-                if pd.notna(school_list_str) and school_list_str != '0.0':
-                    try:
-                        results['optimized'][pct]['activated_schools'] = ast.literal_eval(school_list_str)
-                    except:
-                        results['optimized'][pct]['activated_schools'] = []
-            
-            # Extract facility-school pairings if available
-            if 'assignment(NCARID,NCESSCH)' in df.index:
-                pairing_str = df.loc['assignment(NCARID,NCESSCH)', col]
-                pairings = parse_pairings(pairing_str)
-                results['optimized'][pct]['facility_school_pairings'] = pairings
-                        
-        except Exception as e:
-            print(f"Error parsing {col}: {e}")
-            continue
-    
-    return results
+    return results_from_csv(df, state, service)
 
 
 def parse_pairings(pairing_string) -> List[Tuple]:
@@ -155,15 +122,10 @@ def parse_pairings(pairing_string) -> List[Tuple]:
     Returns:
         List of (facility_id, school_id) tuples
     """
-    if pd.isna(pairing_string) or pairing_string == '0.0' or pairing_string == 0.0:
-        return []
-    try:
-        return ast.literal_eval(str(pairing_string))
-    except:
-        return []
+    return [tuple(pair) for pair in parse_pairing_array(pairing_string).tolist()]
 
 
-def load_facility_school_pairings(state: str, service: str, activation_rate: int) -> List[Tuple]:
+def load_facility_school_pairings(state: str, service: str, activation_rate: int) -> np.ndarray:
     """
     Extract facility-school pairings from optimization results
     
@@ -173,21 +135,21 @@ def load_facility_school_pairings(state: str, service: str, activation_rate: int
         activation_rate: Activation percentage
         
     Returns:
-        List of (facility_id, school_id) tuples
+        (n, 2) array of (facility_id, school_id) rows
     """
     results = load_optimization_results(state, service)
     
     if not results or 'optimized' not in results:
-        return []
+        return EMPTY_PAIRS
     
     if activation_rate not in results['optimized']:
         # Find closest available rate
         available_rates = list(results['optimized'].keys())
         if not available_rates:
-            return []
+            return EMPTY_PAIRS
         activation_rate = min(available_rates, key=lambda x: abs(x - activation_rate))
     
-    return results['optimized'][activation_rate].get('facility_school_pairings', [])
+    return results['optimized'][activation_rate].get('facility_school_pairings', EMPTY_PAIRS)
 
 
 def calculate_metrics_from_csv(results: Dict, activation_rate: int) -> Dict:
@@ -260,42 +222,10 @@ def get_available_states(service: str) -> List[str]:
     """
     Get list of states with available data for the service
     """
-    if service.lower() == "arts" or service.lower() == "arts facilities":
-        data_dir = Path("data/raw/result_arts_250425")
-    else:
-        data_dir = Path("data/raw/result_hospital_250507")
-    
-    if not data_dir.exists():
+    states = get_manifest().states(service)
+    if not states:
         return ["Texas", "California", "New York"]  # Demo states
-    
-    # Parse state codes from filenames
-    files = list(data_dir.glob("*_result_dist_*_reduced.csv"))
-    
-    # State code to name mapping
-    code_to_name = {
-        "AL": "Alabama", "AR": "Arkansas", "AZ": "Arizona", "CA": "California",
-        "CO": "Colorado", "CT": "Connecticut", "DC": "District of Columbia",
-        "DE": "Delaware", "FL": "Florida", "GA": "Georgia", "IA": "Iowa",
-        "ID": "Idaho", "IL": "Illinois", "IN": "Indiana", "KS": "Kansas",
-        "KY": "Kentucky", "LA": "Louisiana", "MA": "Massachusetts", "MD": "Maryland",
-        "ME": "Maine", "MI": "Michigan", "MN": "Minnesota", "MO": "Missouri",
-        "MS": "Mississippi", "MT": "Montana", "NC": "North Carolina", "ND": "North Dakota",
-        "NE": "Nebraska", "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico",
-        "NV": "Nevada", "NY": "New York", "OH": "Ohio", "OK": "Oklahoma",
-        "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina",
-        "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas", "UT": "Utah",
-        "VA": "Virginia", "VT": "Vermont", "WA": "Washington", "WI": "Wisconsin",
-        "WV": "West Virginia", "WY": "Wyoming"
-    }
-    
-    states = []
-    for f in files:
-        state_code = f.stem.split('_')[0]
-        state_name = code_to_name.get(state_code, state_code)
-        if state_name not in states:
-            states.append(state_name)
-    
-    return sorted(states)
+    return states
 
 def generate_demo_data_from_csv(state: str, service: str) -> Dict:
     """
@@ -334,37 +264,3 @@ def generate_demo_data_from_csv(state: str, service: str) -> Dict:
             }
         }
     }
-
-def load_coverage_data(state: str, service: str, activation_rate: int) -> Optional[pd.DataFrame]:
-    """
-    Load CBG-level coverage data for mapping
-    """
-    # Map state to codes
-    state_mapping = {"Texas": ("TX", "48"), "California": ("CA", "06"), "New York": ("NY", "36")}
-    
-    if state not in state_mapping:
-        return None
-        
-    state_code, state_fips = state_mapping[state]
-    
-    if service.lower() == "arts" or service.lower() == "arts facilities":
-        data_dir = Path("data/raw/result_arts_250425/coverages")
-    else:
-        data_dir = Path("data/raw/result_hospital_250507/coverages")
-    
-    # Find coverage file
-    pattern = f"{state_code}_{state_fips}_coverage_mindist_numfacility_{activation_rate}perc.csv"
-    files = list(data_dir.glob(pattern))
-    
-    if not files:
-        return None
-    
-    # Load coverage data
-    df = pd.read_csv(files[0])
-    
-    # Convert distances from meters to kilometers
-    df['mindist_current_km'] = df['mindist_current'] / 1000
-    df['mindist_sol_km'] = df['mindist_sol'] / 1000
-    df['distance_reduction_km'] = df['mindist_current_km'] - df['mindist_sol_km']
-    
-    return df
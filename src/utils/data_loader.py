@@ -9,7 +9,18 @@ import json
 from pathlib import Path
 from typing import Dict, Optional, Tuple
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
+from .manifest import file_version, resolve_state
+
+@st.cache_resource(max_entries=20)
+def _load_processed_file(pickle_file: Path, source_version: Tuple) -> Dict:
+    """
+    Unpickle a processed results file once and share it across sessions,
+    so each activation rate reads from memory instead of the whole file.
+    Keyed on the file's fingerprint, so a rewritten file is reloaded.
+    """
+    with open(pickle_file, 'rb') as f:
+        return pickle.load(f)
+
 def load_state_data(state: str, service: str, activation_rate: int) -> Dict:
     """
     Load pre-computed optimization results for a given state and service
@@ -24,19 +35,14 @@ def load_state_data(state: str, service: str, activation_rate: int) -> Dict:
     """
     
     # Map readable names to file conventions
-    state_map = {
-        "Texas": "TX",
-        "California": "CA", 
-        "New York": "NY"
-    }
-    
     service_map = {
         "Arts Facilities": "PA",
         "Hospitals": "HO",
         "Both": "combined"
     }
     
-    state_abbr = state_map.get(state, state)
+    resolved = resolve_state(state)
+    state_abbr = resolved.code if resolved else state
     service_code = service_map.get(service, service)
     
     # Try to load processed pickle file first
@@ -44,9 +50,8 @@ def load_state_data(state: str, service: str, activation_rate: int) -> Dict:
     pickle_file = data_dir / f"{state_abbr}_{service_code}_processed.pkl"
     
     if pickle_file.exists():
-        with open(pickle_file, 'rb') as f:
-            data = pickle.load(f)
-            
+        data = _load_processed_file(pickle_file, file_version(pickle_file))
+
         # Extract specific activation rate data
         if activation_rate == 0:
             return {
@@ -196,16 +201,10 @@ def load_available_states() -> list:
         pkl_files = list(data_dir.glob("*_processed.pkl"))
         states = set()
         
-        state_name_map = {
-            "TX": "Texas",
-            "CA": "California",
-            "NY": "New York"
-        }
-        
         for f in pkl_files:
             state_abbr = f.stem.split('_')[0]
-            state_name = state_name_map.get(state_abbr, state_abbr)
-            states.add(state_name)
+            resolved = resolve_state(state_abbr)
+            states.add(resolved.name if resolved else state_abbr)
         
         return sorted(list(states))
     
@@ -0,0 +1,261 @@
+"""
+WebGL map engine for DSS App v2
+Renders the coverage choropleth and markers with pydeck (deck.gl), which
+draws tens of thousands of polygons in the browser without stalling the way
+Leaflet's SVG renderer does. Takes the same inputs as the folium maps in
+choropleth_map.
+"""
+
+import json
+from typing import List
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+import shapely
+from pydeck.bindings.json_tools import default_serialize
+
+from .cbg_store import DEFAULT_DETAIL
+from .choropleth_map import (
+    CHOROPLETH_VIEWS,
+    STATE_CENTERS,
+    TOOLTIP_FIELDS,
+    choropleth_features,
+    load_arts_facilities,
+    load_hospital_data,
+    load_school_data,
+    load_simplified_cbg_geometries,
+    view_colors
+)
+from .coverage_store import load_coverage_data
+from .marker_layer import COORDINATE_DECIMALS, first_column, point_coordinates
+
+# Every layer carries 'title' and 'detail' columns, since a deck has one tooltip template
+TOOLTIP_HTML = '<b>{title}</b><br/>{detail}'
+LINE_COLOR = [102, 102, 102, 160]
+# Marker styles: (fill RGBA, radius in pixels), matching the folium markers
+SCHOOL_STYLE = ([46, 204, 113, 204], 5)
+FACILITY_STYLES = {
+    'arts': ([155, 89, 182, 178], 4),      # Purple
+    'hospital': ([52, 152, 219, 178], 4),  # Blue
+}
+
+
+def polygon_rings(geometry: gpd.GeoSeries, decimals: int = COORDINATE_DECIMALS):
+    """
+    Polygon parts as nested coordinate lists for a PolygonLayer
+
+    Multipolygons are split into their parts, each a list of rings
+    (exterior first), so every row of the layer is a single polygon.
+
+    Returns:
+        (polygons, owner) where owner[i] is the geometry row of polygon i
+    """
+    parts, owner = shapely.get_parts(geometry.to_numpy(), return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+    coords = np.round(coords, decimals)
+
+    ring_coords = [chunk.tolist() for chunk in np.split(coords, np.flatnonzero(np.diff(coord_ring)) + 1)]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(ring_part, minlength=len(parts)))])
+    polygons = [ring_coords[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    return polygons, owner
+
+
+def _cbg_tooltips(features: pd.DataFrame) -> pd.Series:
+    """Compact tooltip body of every CBG, built column-wise"""
+    text = {field: features[field].astype(str).replace('nan', 'n/a') for field in TOOLTIP_FIELDS}
+    return (text['status'] + '<br/>Distance: ' + text['before_km'] + ' → ' + text['after_km']
+            + ' km<br/>Reduction: ' + text['reduction_km'] + ' km (' + text['improvement_pct'] + '%)')
+
+
+def choropleth_polygon_layer(merged: gpd.GeoDataFrame, view_type: str = CHOROPLETH_VIEWS[0]) -> pdk.Layer:
+    """
+    Coverage choropleth as a deck.gl PolygonLayer, coloured for one view
+
+    Args:
+        merged: CBG geometries (simplified) left-joined with coverage data
+        view_type: View to colour the CBGs by, one of CHOROPLETH_VIEWS
+
+    Returns:
+        PolygonLayer with one row per polygon part
+    """
+    features, view_styles = choropleth_features(merged)
+    polygons, owner = polygon_rings(features.geometry)
+
+    data = pd.DataFrame({
+        'polygon': polygons,
+        'fill': view_colors(features, view_styles[view_type])[owner].tolist(),
+        'title': features['GEOID'].to_numpy()[owner],
+        'detail': _cbg_tooltips(features).to_numpy()[owner],
+    })
+    return pdk.Layer(
+        'PolygonLayer',
+        data,
+        id='coverage',
+        get_polygon='polygon',
+        get_fill_color='fill',
+        get_line_color=LINE_COLOR,
+        line_width_min_pixels=0.3,
+        stroked=True,
+        filled=True,
+        pickable=True,
+        auto_highlight=True,
+    )
+
+
+def scatter_layer(layer_id: str, coords: pd.DataFrame, titles: pd.Series, details: pd.Series,
+                  style) -> pdk.Layer:
+    """ScatterplotLayer from lon/lat columns with a fixed colour and pixel radius"""
+    color, radius = style
+    data = pd.DataFrame({
+        'lon': coords['lon'].round(COORDINATE_DECIMALS).to_numpy(),
+        'lat': coords['lat'].round(COORDINATE_DECIMALS).to_numpy(),
+        'title': titles.reindex(coords.index).to_numpy(),
+        'detail': details.reindex(coords.index).to_numpy(),
+    })
+    return pdk.Layer(
+        'ScatterplotLayer',
+        data,
+        id=layer_id,
+        get_position=['lon', 'lat'],
+        get_fill_color=color,
+        get_line_color=[255, 255, 255, 200],
+        radius_units='pixels',
+        get_radius=radius,
+        line_width_min_pixels=1,
+        stroked=True,
+        pickable=True,
+    )
+
+
+def facility_layer(facilities: pd.DataFrame, facility_type: str = 'arts') -> pdk.Layer:
+    """
+    Facility markers as a ScatterplotLayer
+
+    Every facility is drawn individually; WebGL needs no clustering.
+    """
+    coords = point_coordinates(facilities)
+    rows = facilities.loc[coords.index]
+    if facility_type == 'arts':
+        name = first_column(rows, ['name', 'OrgName'], 'Arts Facility')
+        detail = ('Type: ' + first_column(rows, ['org_type', 'NTEECC'])
+                  + '<br/>City: ' + first_column(rows, ['city', 'City']))
+    else:
+        name = first_column(rows, ['NAME'], 'Hospital')
+        detail = ('Type: ' + first_column(rows, ['TYPE'])
+                  + '<br/>Beds: ' + first_column(rows, ['BEDS'], 'N/A')
+                  + '<br/>Trauma Level: ' + first_column(rows, ['TRAUMA'], 'N/A'))
+    return scatter_layer(facility_type, coords, name, detail, FACILITY_STYLES[facility_type])
+
+
+def school_layer(school_gdf: pd.DataFrame, activated_schools: List[str]) -> pdk.Layer:
+    """Activated school markers as a ScatterplotLayer"""
+    activated = school_gdf[school_gdf.index.astype(str).isin(set(str(s) for s in activated_schools))]
+    coords = point_coordinates(activated)
+    rows = activated.loc[coords.index]
+    name = first_column(rows, ['School Name', 'NAME'])
+    name = name.where(name != '', 'School ' + rows.index.astype(str))
+    detail = ('District: ' + first_column(rows, ['District'])
+              + '<br/>City: ' + first_column(rows, ['CITY', 'City'])
+              + '<br/>Students: ' + first_column(rows, ['Students*'], 'N/A'))
+    return scatter_layer('schools', coords, 'School: ' + name, detail, SCHOOL_STYLE)
+
+
+def _marker_layers(
+    state: str,
+    service: str,
+    activated_schools: List[str],
+    show_facilities: bool,
+    show_schools: bool
+) -> List[pdk.Layer]:
+    layers = []
+    if show_facilities:
+        if 'arts' in service.lower():
+            arts_df = load_arts_facilities(state)
+            if arts_df is not None:
+                layers.append(facility_layer(arts_df, 'arts'))
+        else:
+            hospital_gdf = load_hospital_data(state)
+            if hospital_gdf is not None:
+                layers.append(facility_layer(hospital_gdf, 'hospital'))
+
+    if show_schools and len(activated_schools) > 0:
+        school_gdf = load_school_data(state)
+        if school_gdf is not None:
+            layers.append(school_layer(school_gdf, activated_schools))
+    return layers
+
+
+class CompactDeck(pdk.Deck):
+    """
+    Deck serialized without whitespace
+
+    pydeck indents its JSON, which for polygon data roughly doubles what
+    st.pydeck_chart (which calls to_json) sends to the browser.
+    """
+
+    def to_json(self) -> str:
+        return json.dumps(self, sort_keys=True, default=default_serialize, separators=(',', ':'))
+
+
+def _deck(state: str, layers: List[pdk.Layer]) -> pdk.Deck:
+    lat, lon = STATE_CENTERS.get(state, (39.8, -98.5))
+    return CompactDeck(
+        layers=layers,
+        initial_view_state=pdk.ViewState(latitude=lat, longitude=lon, zoom=6),
+        map_provider='carto',
+        map_style='light',
+        tooltip={'html': TOOLTIP_HTML},
+        height=700,
+    )
+
+
+def create_choropleth_deck(
+    state: str,
+    service: str,
+    activation_rate: int,
+    activated_schools: List[str],
+    view_type: str = "Distance (km)",
+    show_facilities: bool = True,
+    show_schools: bool = True,
+    detail: str = DEFAULT_DETAIL
+) -> pdk.Deck:
+    """
+    Create the coverage choropleth as a pydeck (WebGL) map
+
+    Same inputs as create_choropleth_map; the view is fixed per render
+    (switching view reruns), since deck.gl colours are computed here.
+
+    Args:
+        state: State name
+        service: Service type ("Arts Facilities" or "Hospitals")
+        activation_rate: School activation rate percentage
+        activated_schools: List of activated school IDs
+        view_type: View to colour the CBGs by, one of CHOROPLETH_VIEWS
+        show_facilities: Whether to show existing facilities
+        show_schools: Whether to show activated schools
+        detail: CBG geometry detail level ('high', 'medium', 'low')
+    """
+    layers = []
+    coverage_df = load_coverage_data(state, service, activation_rate)
+    cbg_gdf = load_simplified_cbg_geometries(state, detail)
+    if coverage_df is not None and cbg_gdf is not None:
+        merged = cbg_gdf.merge(coverage_df, on='GEOID', how='left')
+        layers.append(choropleth_polygon_layer(merged, view_type))
+
+    layers.extend(_marker_layers(state, service, activated_schools, show_facilities, show_schools))
+    return _deck(state, layers)
+
+
+def create_simple_markers_deck(
+    state: str,
+    service: str,
+    activated_schools: List[str],
+    show_facilities: bool = True
+) -> pdk.Deck:
+    """
+    Create a pydeck map with just markers (no choropleth), as create_simple_markers_map
+    """
+    return _deck(state, _marker_layers(state, service, activated_schools, show_facilities, True))
@@ -0,0 +1,436 @@
+"""
+Lightweight Leaflet page emitter for DSS App v2
+Writes the coverage map page directly from columnar inputs, without building
+a folium element tree: base map, one GeoJSON choropleth, the point layers and
+the in-map view control/legend. Feature JSON is assembled column-wise
+(geometry via shapely.to_geojson, properties as vectorized JSON literals) and
+streamed into the output in chunks, so no per-feature dict is ever built.
+Takes the same arguments as create_choropleth_map and
+create_simple_markers_map, and draws the same layers; the view control and
+raster overview scripts are rendered from the folium elements' own templates.
+"""
+
+import io
+import json
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+
+import folium
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from branca.element import MacroElement
+
+from .cbg_store import DEFAULT_DETAIL
+from .choropleth_map import (
+    CHOROPLETH_VIEWS,
+    FACILITY_MAX_MARKERS,
+    STATE_CENTERS,
+    TOOLTIP_ALIASES,
+    TOOLTIP_FIELDS,
+    ChoroplethViewControl,
+    RasterOverview,
+    choropleth_features,
+    choropleth_sweep,
+    facility_markers,
+    load_arts_facilities,
+    load_hospital_data,
+    load_school_data,
+    load_simplified_cbg_geometries,
+    raster_overview,
+    school_markers
+)
+from .coverage_store import CoverageSweep, load_coverage_data, load_coverage_sweep
+from .map_assets import local_links
+from .marker_layer import COORDINATE_DECIMALS, align_to, cluster_levels
+from .point_clusters import ClusterLevel, cluster_points
+
+MAP_VAR = 'map'
+COVERAGE_VAR = 'coverage'
+FEATURE_CHUNK = 5000  # Features joined per write
+BASE_TILES = 'https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png'
+BASE_ATTRIBUTION = ('&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors '
+                    '&copy; <a href="https://carto.com/attributions">CARTO</a>')
+
+# JSON string escapes; <, > and & are escaped too, since the JSON is inlined in a <script>
+_JSON_ESCAPES = {ord('"'): '\\"', ord('\\'): '\\\\', ord('<'): '\\u003c', ord('>'): '\\u003e',
+                 ord('&'): '\\u0026', **{i: f'\\u{i:04x}' for i in range(32)}}
+
+# Helpers shared by every layer of the page
+PAGE_SCRIPT = """
+function dssText(text, properties) {
+    return text.replace(/\\{(\\w+)\\}/g, function(match, key) {
+        var value = properties[key];
+        return value == null ? '' : String(value).replace(/[&<>"']/g, function(c) {
+            return '&#' + c.charCodeAt(0) + ';';
+        });
+    });
+}
+function dssTable(fields, aliases) {
+    return function(layer) {
+        var html = '<table>';
+        fields.forEach(function(field, i) {
+            html += '<tr><th style="text-align:left;padding-right:6px">' + aliases[i] + '</th><td>'
+                + dssText('{' + field + '}', layer.feature.properties) + '</td></tr>';
+        });
+        return html + '</table>';
+    };
+}
+function dssPoints(data, options) {
+    var renderer = L.canvas({padding: 0.5});
+    var layer = L.geoJson(null, {
+        pointToLayer: function(feature, latlng) {
+            var count = feature.properties.count, style = options.style;
+            if (count) {
+                style = L.extend({}, style, {radius: style.radius + 2 * Math.log2(count), fillOpacity: 0.5, weight: 2});
+            }
+            return L.circleMarker(latlng, L.extend({renderer: renderer}, style));
+        }
+    });
+    layer.bindTooltip(function(marker) {
+        var properties = marker.feature.properties;
+        return dssText(properties.count ? options.clusterTooltip : options.tooltip || '', properties);
+    });
+    layer.on('click', function(e) {
+        var map = this._map, properties = e.layer.feature.properties;
+        if (properties.points) {
+            layer.removeLayer(e.layer).addData(properties.points);
+            map.fitBounds(L.latLngBounds(properties.points.map(function(feature) {
+                return L.GeoJSON.coordsToLatLng(feature.geometry.coordinates);
+            })), {padding: [40, 40]});
+        } else if (properties.count) {
+            map.setView(e.latlng, map.getZoom() + 2);
+        } else if (options.popup) {
+            L.popup({maxWidth: 300}).setLatLng(e.latlng).setContent(dssText(options.popup, properties)).openOn(map);
+        }
+    });
+    function showLevel() {
+        var k = 0;
+        while (k + 1 < data.zooms.length && data.zooms[k + 1] <= layer._map.getZoom()) k++;
+        if (layer._level !== k) {
+            layer._level = k;
+            layer.clearLayers().addData(data.levels[k]);
+        }
+    }
+    layer.on('add', function() { showLevel(); layer._map.on('zoomend', showLevel); });
+    layer.on('remove', function() { layer._map.off('zoomend', showLevel); });
+    return layer;
+}
+"""
+
+
+def json_values(values: pd.Series) -> np.ndarray:
+    """
+    JSON literal of every value of a column, built column-wise
+
+    Returns:
+        Object array of strings: numbers, true/false, escaped strings, or
+        null for missing values
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_bool_dtype(values):
+        return np.where(values.to_numpy(dtype=bool), 'true', 'false').astype(object)
+    if pd.api.types.is_numeric_dtype(values):
+        numbers = values.to_numpy(dtype=np.float64)
+        return np.where(np.isfinite(numbers), numbers.astype(str), 'null').astype(object)
+    text = ('"' + values.astype(str).str.translate(_JSON_ESCAPES) + '"').to_numpy(dtype=object)
+    return np.where(values.isna().to_numpy(), 'null', text).astype(object)
+
+
+def point_geometries(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """GeoJSON Point geometries as strings"""
+    lon = np.round(np.asarray(lon, dtype=np.float64), COORDINATE_DECIMALS).astype(str).astype(object)
+    lat = np.round(np.asarray(lat, dtype=np.float64), COORDINATE_DECIMALS).astype(str).astype(object)
+    return '{"type":"Point","coordinates":[' + lon + ',' + lat + ']}'
+
+
+def polygon_geometries(geometry: gpd.GeoSeries) -> np.ndarray:
+    """GeoJSON geometries as strings, with coordinates rounded to COORDINATE_DECIMALS"""
+    rounded = shapely.transform(geometry.to_numpy(), lambda coords: np.round(coords, COORDINATE_DECIMALS))
+    text = shapely.to_geojson(rounded)
+    return np.where(pd.isna(text), 'null', text).astype(object)
+
+
+def write_features(out: TextIO, geometries: np.ndarray, properties: Dict[str, np.ndarray]) -> None:
+    """
+    Stream a FeatureCollection from geometry and property JSON columns
+
+    Args:
+        out: Text buffer or file to write to
+        geometries: GeoJSON geometry of every feature, as strings
+        properties: JSON literal columns (json_values) by property name
+    """
+    out.write('{"type":"FeatureCollection","features":[')
+    for start in range(0, len(geometries), FEATURE_CHUNK):
+        stop = start + FEATURE_CHUNK
+        rows = '{"type":"Feature","geometry":' + geometries[start:stop] + ',"properties":{'
+        for k, (key, values) in enumerate(properties.items()):
+            rows = rows + (',' if k else '') + json.dumps(key) + ':' + values[start:stop]
+        if start:
+            out.write(',')
+        out.write(','.join(rows + '}}'))
+    out.write(']}')
+
+
+def _point_features(lon: np.ndarray, lat: np.ndarray, properties: Dict[str, np.ndarray], rows: np.ndarray) -> np.ndarray:
+    """GeoJSON Point features of the given rows, as strings"""
+    features = '{"type":"Feature","geometry":' + point_geometries(lon, lat) + ',"properties":{'
+    for k, (key, values) in enumerate(properties.items()):
+        features = features + (',' if k else '') + json.dumps(key) + ':' + values[rows]
+    return features + '}}'
+
+
+def _write_level(
+    out: TextIO,
+    level: ClusterLevel,
+    properties: Dict[str, np.ndarray],
+    members: Optional[np.ndarray] = None,
+    coords: Optional[Tuple[np.ndarray, np.ndarray]] = None
+) -> None:
+    """
+    One cluster level: single points with their properties, clusters with
+    their count, and with members (and the points' lon/lat) their points
+    """
+    single = level.point >= 0
+    rows = level.point[single]
+    out.write('{"type":"FeatureCollection","features":[')
+    clusters = point_geometries(level.lon[~single], level.lat[~single])
+    counts = level.count[~single].astype(str).astype(object)
+    if members is not None:
+        features = _point_features(*coords, properties, np.arange(members.size))
+        order = np.argsort(members, kind='stable')
+        bounds = np.searchsorted(members[order], np.arange(level.size + 1))
+        points = np.array([',"points":[' + ','.join(features[order[bounds[cluster]:bounds[cluster + 1]]]) + ']'
+                           for cluster in np.flatnonzero(~single)], dtype=object)
+        counts = counts + points if points.size else counts
+    parts = list('{"type":"Feature","geometry":' + clusters + ',"properties":{"count":' + counts + '}}')
+    if rows.size:
+        parts.extend(_point_features(level.lon[single], level.lat[single], properties, rows))
+    out.write(','.join(parts))
+    out.write(']}')
+
+
+def write_point_layer(out: TextIO, var: str, spec: Dict) -> None:
+    """
+    Stream one point layer as a dssPoints call
+
+    Args:
+        out: Text buffer or file to write to
+        var: JavaScript variable to assign the layer to
+        spec: marker_layer arguments (facility_markers/school_markers),
+              with max_markers
+    """
+    coords = spec['coords']
+    lon = coords['lon'].to_numpy(dtype=np.float64)
+    lat = coords['lat'].to_numpy(dtype=np.float64)
+    max_markers = spec.get('max_markers')
+    members = None
+    if not max_markers or len(coords) <= max_markers:
+        levels = {0: ClusterLevel(lon, lat, np.ones(lon.size, dtype=np.int64), np.arange(lon.size))}
+    else:
+        levels = cluster_levels(coords, max_markers)
+        members = cluster_points(coords).members(max(levels))
+    properties = {key: json_values(align_to(values, coords.index)) for key, values in spec['properties'].items()}
+    options = {
+        'style': dict(spec['style'], fill=True),
+        'popup': '<br>'.join(spec['popup']) if spec.get('popup') else None,
+        'tooltip': spec.get('tooltip'),
+        'clusterTooltip': '{count} ' + spec.get('cluster_label', 'points'),
+    }
+
+    out.write(f'var {var} = dssPoints({{"zooms":{json.dumps(sorted(levels))},"levels":[')
+    for k, zoom in enumerate(sorted(levels)):
+        if k:
+            out.write(',')
+        _write_level(out, levels[zoom], properties, members if zoom == max(levels) else None, (lon, lat))
+    out.write(f']}}, {_script_json(options)}).addTo({MAP_VAR});\n')
+
+
+def _script_json(value) -> str:
+    """Small JSON value, safe to inline in a <script>"""
+    return json.dumps(value).translate({ord('<'): '\\u003c', ord('>'): '\\u003e', ord('&'): '\\u0026'})
+
+
+class _PageElement:
+    """Named stand-in for the folium element a reused template refers to"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def get_name(self) -> str:
+        return self.name
+
+
+def _macro(element: MacroElement, macro: str) -> str:
+    """One macro of a folium element's template, rendered outside a folium tree"""
+    element._parent = _PageElement(MAP_VAR)
+    return str(getattr(element._template.module, macro)(element, {}))
+
+
+def write_leaflet_page(
+    out: TextIO,
+    center: Tuple[float, float],
+    merged: Optional[gpd.GeoDataFrame] = None,
+    view_type: str = CHOROPLETH_VIEWS[0],
+    sweep: Optional[CoverageSweep] = None,
+    raster: Optional[Dict] = None,
+    markers: Sequence[Dict] = ()
+) -> None:
+    """
+    Stream a complete Leaflet map page
+
+    Args:
+        out: Text buffer or file to write to
+        center: Initial map centre (lat, lon)
+        merged: CBG geometries (simplified) left-joined with coverage data;
+                None for a page with markers only
+        view_type: Initially selected view, one of CHOROPLETH_VIEWS
+        sweep: Coverage distances at every rate, for the in-map rate slider
+        raster: Raster tile metadata (raster_overview) for low zooms
+        markers: Point layers, as marker_layer arguments with max_markers
+    """
+    control = overview = None
+    if merged is not None:
+        features, view_styles = choropleth_features(merged)
+        rate = merged.attrs.get('activation_rate')
+        sweep_table = None
+        if sweep is not None:
+            sweep_table = choropleth_sweep(features, sweep, rate if rate is not None else sweep.rates[0])
+            features['row'] = np.arange(len(features))
+        layer = _PageElement(COVERAGE_VAR)
+        control = ChoroplethViewControl(layer, view_styles, view_type, sweep_table)
+        if raster is not None:
+            overview = RasterOverview(layer, raster, view_type, rate if rate is not None else raster['rates'][0])
+
+    scripts = dict(local_links(folium.Map.default_js))
+    styles = dict(local_links(folium.Map.default_css))
+    out.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8"/>\n'
+              '<meta name="viewport" content="width=device-width, initial-scale=1.0"/>\n'
+              f'<link rel="stylesheet" href="{styles["leaflet_css"]}"/>\n'
+              f'<script src="{scripts["leaflet"]}"></script>\n'
+              '<style>html, body, #map { width: 100%; height: 100%; margin: 0; padding: 0; }</style>\n')
+    if control is not None:
+        out.write(_macro(control, 'header'))
+    out.write('\n</head>\n<body>\n<div id="map"></div>\n<script>\n')
+    out.write(PAGE_SCRIPT)
+    out.write(f'var {MAP_VAR} = L.map("map", {{center: {_script_json(list(center))}, zoom: 6}});\n'
+              f'L.tileLayer({_script_json(BASE_TILES)}, {{attribution: {_script_json(BASE_ATTRIBUTION)}, '
+              'subdomains: "abcd", maxZoom: 20}).addTo(map);\n')
+
+    overlays: List[Tuple[str, str]] = []
+    if control is not None:
+        out.write(f'var {COVERAGE_VAR} = L.geoJson(')
+        columns = [column for column in features.columns if column != features.geometry.name]
+        write_features(out, polygon_geometries(features.geometry),
+                       {column: json_values(features[column]) for column in columns})
+        out.write(f').bindTooltip(dssTable({_script_json(TOOLTIP_FIELDS)}, {_script_json(TOOLTIP_ALIASES)}), '
+                  f'{{sticky: true}}).addTo({MAP_VAR});\n')
+        overlays.append(('Coverage', COVERAGE_VAR))
+        out.write(_macro(control, 'script'))
+        if overview is not None:
+            out.write(_macro(overview, 'script'))
+
+    for k, spec in enumerate(markers):
+        var = f'markers_{k}'
+        write_point_layer(out, var, spec)
+        overlays.append((spec['name'], var))
+
+    entries = ', '.join(f'{_script_json(name)}: {var}' for name, var in overlays)
+    out.write(f'\nL.control.layers(null, {{{entries}}}).addTo({MAP_VAR});\n</script>\n</body>\n</html>\n')
+
+
+def _marker_specs(
+    state: str,
+    service: str,
+    activated_schools: List[str],
+    show_facilities: bool,
+    show_schools: bool
+) -> List[Dict]:
+    specs = []
+    if show_facilities:
+        if 'arts' in service.lower():
+            facilities, facility_type = load_arts_facilities(state), 'arts'
+        else:
+            facilities, facility_type = load_hospital_data(state), 'hospital'
+        if facilities is not None:
+            specs.append(dict(facility_markers(facilities, facility_type), max_markers=FACILITY_MAX_MARKERS))
+
+    if show_schools and len(activated_schools) > 0:
+        school_gdf = load_school_data(state)
+        if school_gdf is not None:
+            specs.append(school_markers(school_gdf, activated_schools))
+    return specs
+
+
+def create_choropleth_page(
+    state: str,
+    service: str,
+    activation_rate: int,
+    activated_schools: List[str],
+    view_type: str = "Distance (km)",
+    show_facilities: bool = True,
+    show_schools: bool = True,
+    detail: str = DEFAULT_DETAIL,
+    rate_sweep: bool = False,
+    raster: bool = False
+) -> str:
+    """
+    Create the coverage choropleth page, as create_choropleth_map does
+
+    Always GeoJSON: the TopoJSON, vector-tile and viewport variants of the
+    folium map are not emitted.
+
+    Args:
+        state: State name
+        service: Service type ("Arts Facilities" or "Hospitals")
+        activation_rate: School activation rate percentage
+        activated_schools: List of activated school IDs
+        view_type: Initially selected view, one of CHOROPLETH_VIEWS
+        show_facilities: Whether to show existing facilities
+        show_schools: Whether to show activated schools
+        detail: CBG geometry detail level ('high', 'medium', 'low')
+        rate_sweep: Embed the distances at every rate and add the rate slider
+        raster: Show pre-rendered raster tiles at low zooms, if built for
+                the state and served by the tile server
+
+    Returns:
+        The page's HTML
+    """
+    merged = sweep = overview = None
+    coverage_df = load_coverage_data(state, service, activation_rate)
+    cbg_gdf = load_simplified_cbg_geometries(state, detail)
+    if coverage_df is not None and cbg_gdf is not None:
+        merged = cbg_gdf.merge(coverage_df, on='GEOID', how='left')
+        merged.attrs['activation_rate'] = coverage_df.attrs.get('activation_rate', activation_rate)
+        sweep = load_coverage_sweep(state, service) if rate_sweep else None
+        overview = raster_overview(service, state) if raster else None
+
+    buffer = io.StringIO()
+    write_leaflet_page(
+        buffer,
+        STATE_CENTERS.get(state, (39.8, -98.5)),
+        merged,
+        view_type,
+        sweep,
+        overview,
+        _marker_specs(state, service, activated_schools, show_facilities, show_schools)
+    )
+    return buffer.getvalue()
+
+
+def create_simple_markers_page(
+    state: str,
+    service: str,
+    activated_schools: List[str],
+    show_facilities: bool = True
+) -> str:
+    """
+    Create a page with just markers (no choropleth), as create_simple_markers_map
+    """
+    buffer = io.StringIO()
+    write_leaflet_page(
+        buffer,
+        STATE_CENTERS.get(state, (39.8, -98.5)),
+        markers=_marker_specs(state, service, activated_schools, show_facilities, True)
+    )
+    return buffer.getvalue()
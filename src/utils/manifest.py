@@ -0,0 +1,413 @@
+"""
+Data-directory manifest for SchoolShare DSS
+
+Scans DATA_PATH once into an in-memory index of every data file the app reads,
+keyed by (state code, service, activation rate, kind), so loaders look files up
+in O(1) instead of globbing on every call. The manifest also owns the single
+state name / code / FIPS table and the canonical (state, service) cache keys.
+
+Kinds:
+    result           - optimization result CSV              (service, no rate)
+    result_store     - compiled Parquet result partition    (service, no rate)
+    coverage         - per-rate CBG coverage CSV            (service, rate)
+    coverage_matrix  - compiled CBG x rate distance matrix  (service, no rate)
+    points           - WGS84 GeoParquet of schools/facilities (service or None for schools)
+    orgmap_store     - compiled OrgMap partition            (arts, no rate)
+    cbg_partition    - per-state WGS84 CBG GeoParquet       (no service, no rate)
+    cbg_tiles        - national CBG vector tiles (MBTiles)  (no state)
+    raster_tiles     - choropleth PNG tile pyramid metadata (service, no state)
+    schools          - processed high school GeoDataFrame   (no service, no rate)
+    facilities       - processed arts/hospital GeoDataFrame (service, no rate)
+    cbg_shapes       - national CBG geopackage              (no state)
+    orgmap           - national OrgMap workbook             (no state, arts)
+
+National files (cbg_shapes, cbg_tiles, raster_tiles, orgmap and the unclipped
+HS/OM/HO pickles) are keyed with state None.
+
+Every entry carries the file's size and mtime. Cached loaders take that
+fingerprint as an argument, so a changed file gets a new cache key and only
+the (state, service) entries built from it are reloaded; refresh_manifest()
+re-scans on a rerun at most every MANIFEST_POLL_SECONDS.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+import streamlit as st
+
+from config import CENSUS_PATH, DATA_PATH, PROCESSED_PATH, STORE_PATH
+
+
+class State(NamedTuple):
+    name: str
+    code: str
+    fips: str
+
+
+STATES = [
+    State('Alabama', 'AL', '01'), State('Arizona', 'AZ', '04'), State('Arkansas', 'AR', '05'),
+    State('California', 'CA', '06'), State('Colorado', 'CO', '08'), State('Connecticut', 'CT', '09'),
+    State('Delaware', 'DE', '10'), State('District of Columbia', 'DC', '11'), State('Florida', 'FL', '12'),
+    State('Georgia', 'GA', '13'), State('Idaho', 'ID', '16'), State('Illinois', 'IL', '17'),
+    State('Indiana', 'IN', '18'), State('Iowa', 'IA', '19'), State('Kansas', 'KS', '20'),
+    State('Kentucky', 'KY', '21'), State('Louisiana', 'LA', '22'), State('Maine', 'ME', '23'),
+    State('Maryland', 'MD', '24'), State('Massachusetts', 'MA', '25'), State('Michigan', 'MI', '26'),
+    State('Minnesota', 'MN', '27'), State('Mississippi', 'MS', '28'), State('Missouri', 'MO', '29'),
+    State('Montana', 'MT', '30'), State('Nebraska', 'NE', '31'), State('Nevada', 'NV', '32'),
+    State('New Hampshire', 'NH', '33'), State('New Jersey', 'NJ', '34'), State('New Mexico', 'NM', '35'),
+    State('New York', 'NY', '36'), State('North Carolina', 'NC', '37'), State('North Dakota', 'ND', '38'),
+    State('Ohio', 'OH', '39'), State('Oklahoma', 'OK', '40'), State('Oregon', 'OR', '41'),
+    State('Pennsylvania', 'PA', '42'), State('Rhode Island', 'RI', '44'), State('South Carolina', 'SC', '45'),
+    State('South Dakota', 'SD', '46'), State('Tennessee', 'TN', '47'), State('Texas', 'TX', '48'),
+    State('Utah', 'UT', '49'), State('Vermont', 'VT', '50'), State('Virginia', 'VA', '51'),
+    State('Washington', 'WA', '53'), State('West Virginia', 'WV', '54'), State('Wisconsin', 'WI', '55'),
+    State('Wyoming', 'WY', '56'),
+]
+
+_STATE_LOOKUP = {}
+for _state in STATES:
+    _STATE_LOOKUP[_state.name.lower()] = _state
+    _STATE_LOOKUP[_state.code.lower()] = _state
+    _STATE_LOOKUP[_state.fips] = _state
+
+SERVICES = ('arts', 'hospitals')
+
+RESULT_SUBDIRS = {
+    'arts': "raw/result_arts_250425",
+    'hospitals': "raw/result_hospital_250507",
+}
+RESULT_DIRS = {service: DATA_PATH / subdir for service, subdir in RESULT_SUBDIRS.items()}
+
+# When a state has result files for several distance thresholds, prefer these
+PREFERRED_THRESHOLDS = {
+    'hospitals': '16093_32187',
+}
+
+MANIFEST_FILE = STORE_PATH / "manifest.json"
+MANIFEST_POLL_SECONDS = float(os.environ.get('DSS_MANIFEST_POLL', 10))
+
+CBG_SHAPES_FILE = "cbg_shapes_2020.gpkg"
+ORGMAP_FILE = "raw/OrgMap/OrgMap_05_15_2023.xlsx"
+CBG_TILES_FILE = "tiles/cbg.mbtiles"
+RASTER_TILES_DIR = "tiles/raster"  # <service>/metadata.json and <service>/<rate>/<view>/{z}/{x}/{y}.png
+
+_RESULT_RE = re.compile(r'^([A-Z]{2})_(\d{2})_result_dist_(.+)_reduced\.csv$')
+_COVERAGE_RE = re.compile(r'^([A-Z]{2})_(\d{2})_coverage_mindist_numfacility_(\d+)perc\.csv$')
+_PROCESSED_RE = re.compile(r'^(HS|OM|HO)_gdf_meters(?:_clipped_(\d{2}))?\.pkl$')
+_PROCESSED_KINDS = {
+    'HS': ('schools', None),
+    'OM': ('facilities', 'arts'),
+    'HO': ('facilities', 'hospitals'),
+}
+
+Key = Tuple[str, Optional[str], Optional[int], str]
+
+
+def resolve_state(state: str) -> Optional[State]:
+    """Look up a state by name, postal code or FIPS code (case-insensitive)"""
+    if state is None:
+        return None
+    return _STATE_LOOKUP.get(str(state).strip().lower())
+
+
+def canonical_service(service: str) -> str:
+    """Normalize a service label ("Arts Facilities", "arts", "Hospitals") to 'arts' or 'hospitals'"""
+    return 'arts' if 'arts' in service.lower() else 'hospitals'
+
+
+def cache_key(state: str, service: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """
+    Canonical (state code, service) key, so "Texas"/"TX" and
+    "Arts Facilities"/"arts" share one cache entry
+    """
+    if state is None:
+        code = None
+    else:
+        resolved = resolve_state(state)
+        code = resolved.code if resolved else str(state)
+    return code, canonical_service(service) if service is not None else None
+
+
+class ManifestEntry(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+
+    @property
+    def fingerprint(self) -> Tuple[str, int, float]:
+        """Identity of the file contents for cache keys"""
+        return (self.path, self.size, self.mtime)
+
+    @classmethod
+    def from_stat(cls, path: str, stat: os.stat_result) -> 'ManifestEntry':
+        return cls(path, stat.st_size, stat.st_mtime)
+
+
+class DataManifest:
+    """In-memory index of data files keyed by (state code, service, rate, kind)"""
+
+    def __init__(self, entries: Dict[Key, ManifestEntry]):
+        self._lock = threading.Lock()
+        self._index(entries)
+
+    def _index(self, entries: Dict[Key, ManifestEntry]) -> None:
+        rates: Dict[Tuple[str, Optional[str], str], List[int]] = {}
+        for (code, service, rate, kind) in entries:
+            if rate is not None:
+                rates.setdefault((code, service, kind), []).append(rate)
+        for values in rates.values():
+            values.sort()
+        self.entries = entries
+        self._rates = rates
+        self.scanned_at = time.monotonic()
+
+    @classmethod
+    def scan(
+        cls,
+        data_path: Path = DATA_PATH,
+        processed_path: Path = PROCESSED_PATH,
+        census_path: Path = CENSUS_PATH,
+        store_path: Path = STORE_PATH
+    ) -> 'DataManifest':
+        """Build a manifest by scanning the data directories"""
+        entries = {}
+
+        def add(key: Key, entry: os.DirEntry):
+            entries[key] = ManifestEntry.from_stat(entry.path, entry.stat())
+
+        for service, subdir in RESULT_SUBDIRS.items():
+            result_dir = data_path / subdir
+            for entry in _scandir(result_dir):
+                match = _RESULT_RE.match(entry.name)
+                if not match:
+                    continue
+                key = (match.group(1), service, None, 'result')
+                preferred = PREFERRED_THRESHOLDS.get(service)
+                if key in entries and (match.group(3) != preferred or preferred is None):
+                    continue
+                add(key, entry)
+
+            for entry in _scandir(result_dir / "coverages"):
+                match = _COVERAGE_RE.match(entry.name)
+                if match:
+                    add((match.group(1), service, int(match.group(3)), 'coverage'), entry)
+
+        for entry in _scandir(processed_path):
+            match = _PROCESSED_RE.match(entry.name)
+            if not match:
+                continue
+            kind, service = _PROCESSED_KINDS[match.group(1)]
+            if match.group(2) is None:
+                add((None, service, None, kind), entry)
+                continue
+            state = resolve_state(match.group(2))
+            if state:
+                add((state.code, service, None, kind), entry)
+
+        for key, file_path in (((None, None, None, 'cbg_shapes'), census_path / CBG_SHAPES_FILE),
+                               ((None, 'arts', None, 'orgmap'), data_path / ORGMAP_FILE),
+                               ((None, None, None, 'cbg_tiles'), store_path / CBG_TILES_FILE)):
+            if file_path.is_file():
+                entries[key] = ManifestEntry.from_stat(str(file_path), file_path.stat())
+
+        for service in SERVICES:
+            file_path = store_path / RASTER_TILES_DIR / service / "metadata.json"
+            if file_path.is_file():
+                entries[(None, service, None, 'raster_tiles')] = ManifestEntry.from_stat(str(file_path), file_path.stat())
+
+        # Compiled stores: one fingerprint over all files of a (service, state) partition
+        result_store = store_path / "results"
+        for service, code, partition in _partitions(result_store / "metrics"):
+            entry = _partition_entry(partition, [result_store / table / partition.parent.name / partition.name
+                                                 for table in ('metrics', 'schools', 'pairings')])
+            if entry:
+                entries[(code, service, None, 'result_store')] = entry
+
+        for service, code, partition in _partitions(store_path / "coverage"):
+            entry = _partition_entry(partition, [partition])
+            if entry:
+                entries[(code, service, None, 'coverage_matrix')] = entry
+
+        for service, code, partition in _partitions(store_path / "orgmap"):
+            entry = _partition_entry(partition, [partition])
+            if entry:
+                entries[(code, service, None, 'orgmap_store')] = entry
+
+        for entry in _scandir(store_path / "cbg"):
+            if entry.name.startswith('state=') and entry.name.endswith('.parquet'):
+                add((entry.name[len('state='):-len('.parquet')], None, None, 'cbg_partition'), entry)
+
+        # Point files: points/<schools|arts|hospitals>/state=<code>.parquet
+        for kind_dir in _scandir(store_path / "points", dirs=True):
+            service = None if kind_dir.name == 'schools' else kind_dir.name
+            for entry in _scandir(Path(kind_dir.path)):
+                if entry.name.startswith('state=') and entry.name.endswith('.parquet'):
+                    add((entry.name[len('state='):-len('.parquet')], service, None, 'points'), entry)
+
+        return cls(entries)
+
+    def get(self, state: str, service: Optional[str], kind: str, rate: Optional[int] = None) -> Optional[ManifestEntry]:
+        """Exact lookup of one file"""
+        code, service = cache_key(state, service)
+        return self.entries.get((code, service, rate, kind))
+
+    def path(self, state: str, service: Optional[str], kind: str, rate: Optional[int] = None) -> Optional[Path]:
+        entry = self.get(state, service, kind, rate)
+        return Path(entry.path) if entry else None
+
+    def fingerprint(self, state: str, service: Optional[str], kind: str, rate: Optional[int] = None) -> Optional[Tuple]:
+        """Cache-key fingerprint of one file, None when it does not exist"""
+        entry = self.get(state, service, kind, rate)
+        return entry.fingerprint if entry else None
+
+    def changed_keys(self, other: 'DataManifest') -> Set[Tuple[Optional[str], Optional[str]]]:
+        """(state code, service) pairs whose files differ between two manifests"""
+        keys = set(self.entries) | set(other.entries)
+        return {
+            (code, service) for (code, service, rate, kind) in keys
+            if self.entries.get((code, service, rate, kind)) != other.entries.get((code, service, rate, kind))
+        }
+
+    def refresh(self, other: 'DataManifest') -> Set[Tuple[Optional[str], Optional[str]]]:
+        """Adopt the entries of a newer scan; returns the changed (state code, service) pairs"""
+        with self._lock:
+            changed = self.changed_keys(other)
+            self._index(other.entries)
+        return changed
+
+    def rates(self, state: str, service: str, kind: str = 'coverage') -> List[int]:
+        """Activation rates available for a per-rate kind"""
+        code, service = cache_key(state, service)
+        return self._rates.get((code, service, kind), [])
+
+    def nearest_rate(self, state: str, service: str, rate: int, kind: str = 'coverage') -> Optional[int]:
+        """
+        Resolve a requested activation rate to the closest available one
+        (ties go to the lower rate); None when the kind has no rates at all
+        """
+        return nearest_rate(self.rates(state, service, kind), rate)
+
+    def states(self, service: str, kind: str = 'result') -> List[str]:
+        """Sorted names of states that have a file of this kind"""
+        service = canonical_service(service)
+        codes = {code for (code, svc, _, k) in self.entries if svc == service and k == kind}
+        return sorted(state.name for state in STATES if state.code in codes)
+
+    def save(self, path: Path = MANIFEST_FILE, data_path: Path = DATA_PATH) -> None:
+        """
+        Persist the manifest as JSON
+
+        Paths under data_path are stored relative to it, so a manifest built
+        on the host stays valid when the data directory is mounted elsewhere.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rows = []
+        for (code, service, rate, kind), entry in sorted(self.entries.items(), key=lambda item: str(item[0])):
+            file_path = Path(entry.path)
+            if file_path.is_relative_to(data_path):
+                file_path = file_path.relative_to(data_path)
+            rows.append({
+                'state': code, 'service': service, 'rate': rate, 'kind': kind,
+                'path': str(file_path), 'size': entry.size, 'mtime': entry.mtime,
+            })
+        path.write_text(json.dumps(rows, indent=1))
+
+    @classmethod
+    def load(cls, path: Path = MANIFEST_FILE, data_path: Path = DATA_PATH) -> 'DataManifest':
+        """Load a manifest persisted with save()"""
+        rows = json.loads(path.read_text())
+        return cls({
+            (row['state'], row['service'], row['rate'], row['kind']):
+                ManifestEntry(str(data_path / row['path']), row['size'], row['mtime'])
+            for row in rows
+        })
+
+
+def nearest_rate(rates, rate: int) -> Optional[int]:
+    """Closest of the available rates to the requested one (ties go to the lower rate)"""
+    if len(rates) == 0:
+        return None
+    return int(min(rates, key=lambda r: (abs(r - rate), r)))
+
+
+def _partitions(root: Path):
+    """(service, state code, path) of each service=*/state=* directory under root"""
+    for service_dir in _scandir(root, dirs=True):
+        for state_dir in _scandir(Path(service_dir.path), dirs=True):
+            yield (service_dir.name.partition('=')[2], state_dir.name.partition('=')[2],
+                   Path(state_dir.path))
+
+
+def _partition_entry(path: Path, dirs: List[Path]) -> Optional[ManifestEntry]:
+    """One entry for a store partition: total size and latest mtime of its files"""
+    stats = [entry.stat() for directory in dirs for entry in _scandir(directory)]
+    if not stats:
+        return None
+    return ManifestEntry(str(path), sum(st.st_size for st in stats), max(st.st_mtime for st in stats))
+
+
+def file_version(*paths: Path) -> Tuple:
+    """
+    Fingerprint of files outside the manifest, for use as a cache-key argument
+
+    Missing files fingerprint as None, so a file appearing later also
+    changes the key.
+    """
+    versions = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            versions.append(None)
+        else:
+            versions.append((str(path), stat.st_size, stat.st_mtime))
+    return tuple(versions)
+
+
+def _scandir(path: Path, dirs: bool = False) -> List[os.DirEntry]:
+    """Sorted files (or subdirectories) of a directory; empty if it does not exist"""
+    try:
+        with os.scandir(path) as it:
+            return sorted((entry for entry in it if (entry.is_dir() if dirs else entry.is_file())),
+                          key=lambda entry: entry.name)
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+@st.cache_resource
+def get_manifest() -> DataManifest:
+    """
+    The process-wide manifest, built once at startup
+
+    Uses the JSON manifest written by `python src/ingest.py manifest`
+    when present, otherwise scans the data directories.
+    """
+    if MANIFEST_FILE.exists():
+        try:
+            return DataManifest.load(MANIFEST_FILE)
+        except (ValueError, KeyError):
+            pass
+    return DataManifest.scan()
+
+
+def refresh_manifest(force: bool = False) -> Set[Tuple[Optional[str], Optional[str]]]:
+    """
+    Poll the data directories for changes; call at the top of each rerun
+
+    Re-scans at most every MANIFEST_POLL_SECONDS (unless forced). Loaders key
+    their caches on file fingerprints, so updating the manifest is all it
+    takes to invalidate exactly the (state, service) entries whose files
+    changed; everything else keeps hitting the cache.
+
+    Returns:
+        Set of (state code, service) pairs whose files changed
+    """
+    manifest = get_manifest()
+    if not force and time.monotonic() - manifest.scanned_at < MANIFEST_POLL_SECONDS:
+        return set()
+    return manifest.refresh(DataManifest.scan())
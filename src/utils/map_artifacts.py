@@ -0,0 +1,113 @@
+"""
+Static map artifacts for DSS App v2
+Rendered map pages are written once to a content-addressed file under the
+Streamlit static directory and embedded by URL, instead of being pushed
+through the websocket as an inline iframe on every rerun:
+
+    STATIC_PATH/maps/<sha256 prefix>.html
+    STATIC_PATH/maps/<sha256 prefix>.html.gz
+
+Streamlit serves the directory at app/static/ (server.enableStaticServing)
+with ETag revalidation, so a repeat view of the same map is a 304 for the
+browser. The .gz variant is compressed once at maximum level for a reverse
+proxy serving precompressed files (nginx gzip_static); Streamlit itself
+compresses the .html on the fly. The least recently used artifacts beyond
+MAX_MAP_ARTIFACTS are removed.
+"""
+
+import gzip
+import hashlib
+import importlib.util
+import os
+import time
+from pathlib import Path
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from config import STATIC_PATH
+
+MAP_ARTIFACTS_DIR = "maps"
+MAP_ARTIFACTS_PATH = STATIC_PATH / MAP_ARTIFACTS_DIR
+MAP_ARTIFACTS_URL = f"app/static/{MAP_ARTIFACTS_DIR}"  # Relative to the app's page
+MAX_MAP_ARTIFACTS = 200
+NAME_DIGITS = 20  # sha256 hex digits in artifact names
+
+
+def static_serving_enabled() -> bool:
+    """Whether Streamlit serves the static directory (server.enableStaticServing)"""
+    return bool(st.get_option('server.enableStaticServing'))
+
+
+def static_content_types() -> bool:
+    """
+    Whether the static directory is served with each file's own content type
+
+    Tornado-based Streamlit releases (those shipping app_static_file_handler)
+    serve anything but a few image, font and data types as text/plain with
+    nosniff, so browsers show HTML as source and refuse scripts and styles;
+    the Starlette-based server guesses the type from the extension.
+    """
+    return importlib.util.find_spec('streamlit.web.server.app_static_file_handler') is None
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+
+
+def prune_map_artifacts(root: Path = MAP_ARTIFACTS_PATH, keep: int = MAX_MAP_ARTIFACTS) -> int:
+    """
+    Remove all but the keep most recently used (accessed) map artifacts
+
+    Returns:
+        Number of artifacts removed
+    """
+    pages = sorted(root.glob("*.html"), key=lambda path: path.stat().st_atime, reverse=True)
+    for path in pages[keep:]:
+        path.unlink(missing_ok=True)
+        path.with_name(path.name + ".gz").unlink(missing_ok=True)
+    return max(len(pages) - keep, 0)
+
+
+def publish_map(html: str, root: Path = MAP_ARTIFACTS_PATH) -> str:
+    """
+    Write a rendered map page as a static artifact
+
+    An identical page is written only once; publishing it again marks it
+    as recently used.
+
+    Args:
+        html: Complete HTML document of the map
+        root: Artifact directory (served at MAP_ARTIFACTS_URL)
+
+    Returns:
+        URL of the page, relative to the app's page
+    """
+    data = html.encode('utf-8')
+    name = hashlib.sha256(data).hexdigest()[:NAME_DIGITS] + ".html"
+    path = root / name
+    if path.exists():
+        # Access time only: the mtime is part of the ETag the browser revalidates
+        os.utime(path, (time.time(), path.stat().st_mtime))
+    else:
+        root.mkdir(parents=True, exist_ok=True)
+        _write_atomic(path.with_name(name + ".gz"), gzip.compress(data, compresslevel=9, mtime=0))
+        # The page goes last: its presence marks a complete artifact
+        _write_atomic(path, data)
+        prune_map_artifacts(root)
+    return f"{MAP_ARTIFACTS_URL}/{name}"
+
+
+def embed_map(html: str, height: int = 700) -> None:
+    """
+    Show a rendered map page in an iframe loading its static artifact
+
+    Falls back to an inline iframe when static serving is disabled, or
+    would serve the page as text (static_content_types).
+    """
+    if static_serving_enabled() and static_content_types():
+        components.iframe(publish_map(html), height=height, scrolling=True)
+    else:
+        components.html(html, height=height, scrolling=True)
@@ -0,0 +1,186 @@
+"""
+Self-hosted map assets for DSS App v2
+`python src/ingest.py assets` downloads the Leaflet, plugin, jQuery,
+Bootstrap and Font Awesome files the maps load from public CDNs into the
+Streamlit static directory, mirroring each URL's host and path so that the
+versioned paths, and the fonts and images their stylesheets reference,
+resolve unchanged:
+
+    STATIC_PATH/vendor/<host>/<path>
+    STATIC_PATH/vendor/assets.json   - CDN URL -> local path
+
+Map builders pass their maps through use_local_assets, which points the
+default_js/default_css links of every element at the local copies (links
+without one stay on the CDN, so maps work before the assets are fetched, and
+on Streamlit releases that serve static scripts and styles as text).
+Streamlit serves them at app/static/vendor with ETag revalidation; the paths
+are versioned, so a reverse proxy can cache them as immutable.
+"""
+
+import json
+import os
+import re
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import folium
+import folium.plugins
+import streamlit as st
+from branca.element import Element
+
+from config import STATIC_PATH
+from .map_artifacts import static_content_types
+
+ASSETS_DIR = "vendor"
+ASSETS_PATH = STATIC_PATH / ASSETS_DIR
+ASSET_MANIFEST = "assets.json"
+FETCH_TIMEOUT = 30  # Seconds per download
+# Elements whose default_js/default_css the maps load (VectorTileLayer is added in asset_urls)
+ASSET_SOURCES = [
+    folium.Map,
+    folium.TopoJson,
+    folium.plugins.Fullscreen,
+    folium.plugins.MeasureControl,
+    folium.plugins.MiniMap,
+    folium.plugins.Search,
+]
+_CSS_URL_RE = re.compile(r'url\(\s*["\']?([^"\')]+?)["\']?\s*\)')
+
+Links = List[Tuple[str, str]]
+
+
+def asset_urls() -> List[str]:
+    """CDN URLs of the scripts and stylesheets the map builders use"""
+    from .choropleth_map import VectorTileLayer  # choropleth_map imports this module
+
+    urls = []
+    for source in ASSET_SOURCES + [VectorTileLayer]:
+        urls.extend(url for _, url in getattr(source, 'default_js', []) + getattr(source, 'default_css', []))
+    return list(dict.fromkeys(urls))
+
+
+def asset_path(url: str) -> str:
+    """Local path of a CDN URL, relative to the asset directory"""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+def _stylesheet_urls(css: str, base_url: str) -> List[str]:
+    """Absolute URLs of the relative url(...) references of a stylesheet"""
+    urls = []
+    for ref in _CSS_URL_RE.findall(css):
+        if ref.startswith(('data:', '#')) or urlsplit(ref).scheme:
+            continue
+        target = urljoin(base_url, ref)
+        urls.append(target.split('#')[0].split('?')[0])
+    return urls
+
+
+def _fetch(url: str, out: Path, fetched: Set[str]) -> None:
+    """Download one asset and, for stylesheets, the files it references"""
+    if url in fetched:
+        return
+    fetched.add(url)
+    path = out / asset_path(url)
+    if not path.exists():
+        with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as response:
+            data = response.read()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+    if path.suffix == '.css':
+        for ref in _stylesheet_urls(path.read_text(encoding='utf-8', errors='replace'), url):
+            _fetch(ref, out, fetched)
+
+
+def build_map_assets(out: Path = ASSETS_PATH, urls: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Download the map assets and write their manifest
+
+    Files already present are not downloaded again. An asset that fails to
+    download is left out of the manifest, so maps keep its CDN link.
+
+    Args:
+        out: Asset directory (served at app/static/vendor)
+        urls: Asset URLs (default: asset_urls())
+
+    Returns:
+        Local path by CDN URL, as written to the manifest
+    """
+    manifest = {}
+    fetched: Set[str] = set()
+    for url in urls or asset_urls():
+        try:
+            _fetch(url, out, fetched)
+        except OSError as e:
+            print(f"Could not fetch {url}: {e}")
+            continue
+        manifest[url] = asset_path(url)
+    out.mkdir(parents=True, exist_ok=True)
+    with open(out / ASSET_MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+@st.cache_data(max_entries=4)
+def _read_manifest(path: str, mtime: float) -> Dict[str, str]:
+    """Parsed asset manifest, keyed by its modification time"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def asset_manifest(root: Path = ASSETS_PATH) -> Dict[str, str]:
+    """
+    Local path by CDN URL of the fetched assets (empty if not fetched, or if
+    Streamlit would serve them as text, see static_content_types)
+    """
+    if not static_content_types():
+        return {}
+    path = root / ASSET_MANIFEST
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return {}
+    return _read_manifest(str(path), mtime)
+
+
+def asset_base_url() -> str:
+    """Absolute path the browser loads local assets from, for any page or component frame"""
+    base = (st.get_option('server.baseUrlPath') or '').strip('/')
+    return '/'.join(['', base, 'app/static', ASSETS_DIR] if base else ['', 'app/static', ASSETS_DIR])
+
+
+def local_links(links: Links, manifest: Optional[Dict[str, str]] = None) -> Links:
+    """(name, URL) links with the fetched ones pointed at their local copies"""
+    manifest = asset_manifest() if manifest is None else manifest
+    if not manifest:
+        return links
+    base = asset_base_url()
+    return [(name, f"{base}/{manifest[url]}" if url in manifest else url) for name, url in links]
+
+
+def use_local_assets(element: Element) -> Element:
+    """
+    Point the JS/CSS links of a map and its elements at the local assets
+
+    Sets each element's default_js/default_css (read when it is rendered,
+    and by st_folium); call it once the map is complete.
+
+    Returns:
+        The element, for chaining
+    """
+    manifest = asset_manifest()
+    if not manifest:
+        return element
+    pending = [element]
+    while pending:
+        item = pending.pop()
+        for attr in ('default_js', 'default_css'):
+            links = getattr(item, attr, None)
+            if links:
+                setattr(item, attr, local_links(links, manifest))
+        pending.extend(getattr(item, '_children', {}).values())
+    return element
@@ -0,0 +1,325 @@
+"""
+Canvas marker layers for DSS App v2
+Point sources (schools, facilities) are emitted as one GeoJSON collection per
+layer and drawn as circle markers on a Leaflet canvas. Features carry only
+their popup fields; popup and tooltip HTML is built in the browser when a
+marker is clicked or hovered, instead of shipping one HTML string per point.
+Point sets larger than a marker budget are drawn from their cluster
+hierarchy (see point_clusters), one level per zoom; the clusters of the
+deepest level carry their points and open into them when clicked.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import folium
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from branca.element import Template
+
+from .point_clusters import ClusterLevel, PointClusters, cluster_points
+
+COORDINATE_DECIMALS = 5  # ~1 m; marker data is sent as JSON
+# Coordinate column pairs used by the point sources, in lookup order
+COORDINATE_COLUMNS = [('lat', 'lon'), ('Latitude', 'Longitude'), ('LATITUDE', 'LONGITUDE'), ('LAT', 'LON')]
+
+
+def point_coordinates(points: pd.DataFrame) -> pd.DataFrame:
+    """
+    lon/lat columns of a point source, whichever columns it stores them in
+
+    Rows without coordinates are dropped.
+    """
+    if isinstance(points, gpd.GeoDataFrame) and points.geometry.name in points:
+        lon, lat = points.geometry.x, points.geometry.y
+    else:
+        for lat_col, lon_col in COORDINATE_COLUMNS:
+            if lat_col in points and lon_col in points:
+                lat, lon = points[lat_col], points[lon_col]
+                break
+        else:
+            return pd.DataFrame({'lon': [], 'lat': []})
+    coords = pd.DataFrame({'lon': pd.to_numeric(lon, errors='coerce'),
+                           'lat': pd.to_numeric(lat, errors='coerce')}, index=points.index)
+    return coords.dropna()
+
+
+def first_column(frame: pd.DataFrame, columns: Sequence[str], default: str = '') -> pd.Series:
+    """First of the columns present in the frame, as strings"""
+    for column in columns:
+        if column in frame:
+            return frame[column].fillna(default).astype(str)
+    return pd.Series(default, index=frame.index)
+
+
+def align_to(values: pd.Series, index: pd.Index) -> pd.Series:
+    """Values in index order (as they are already when built from the same rows)"""
+    return values if values.index.equals(index) else values.reindex(index)
+
+
+def point_collection(coords: pd.DataFrame, properties: Optional[Dict[str, pd.Series]] = None) -> Dict:
+    """
+    GeoJSON FeatureCollection of points
+
+    Args:
+        coords: lon/lat columns, as returned by point_coordinates
+        properties: Per-point property columns, aligned on the coords index
+
+    Returns:
+        FeatureCollection with one Point feature per coords row
+    """
+    properties = properties or {}
+    keys = list(properties)
+    columns = [align_to(values, coords.index).tolist() for values in properties.values()]
+    lon = coords['lon'].round(COORDINATE_DECIMALS).tolist()
+    lat = coords['lat'].round(COORDINATE_DECIMALS).tolist()
+    features = [
+        {'type': 'Feature',
+         'geometry': {'type': 'Point', 'coordinates': [x, y]},
+         'properties': dict(zip(keys, values))}
+        for x, y, *values in zip(lon, lat, *columns)
+    ]
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+class MarkerLayer(folium.GeoJson):
+    """
+    Point collection drawn as circle markers on a shared canvas
+
+    Popup and tooltip are text templates with {property} placeholders,
+    filled (HTML-escaped) from the feature's properties on demand. It is a
+    GeoJson layer, so plugins.Search can index it by a property name.
+
+    Args:
+        data: GeoJSON FeatureCollection of points (see point_collection)
+        style: Leaflet circleMarker options (radius, color, fillColor, ...)
+        popup: Popup lines, joined with <br>
+        tooltip: Tooltip text
+        name: Layer name in the layer control
+        show: Whether the layer is shown initially
+        control: Whether the layer is listed in the layer control
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }}_text = function(text, properties) {
+                return text.replace(/\\{(\\w+)\\}/g, function(match, key) {
+                    var value = properties[key];
+                    return value == null ? '' : String(value).replace(/[&<>"']/g, function(c) {
+                        return '&#' + c.charCodeAt(0) + ';';
+                    });
+                });
+            };
+            var {{ this.get_name() }}_renderer = L.canvas({padding: 0.5});
+            var {{ this.get_name() }} = L.geoJson({{ this.data|tojson }}, {
+                pointToLayer: function(feature, latlng) {
+                    return L.circleMarker(latlng, L.extend(
+                        {renderer: {{ this.get_name() }}_renderer}, {{ this.marker_style|tojson }}));
+                }
+            });
+            {%- if this.popup_text %}
+            {{ this.get_name() }}.bindPopup(function(marker) {
+                return {{ this.get_name() }}_text({{ this.popup_text|tojson }}, marker.feature.properties);
+            }, {maxWidth: 300});
+            {%- endif %}
+            {%- if this.tooltip_text %}
+            {{ this.get_name() }}.bindTooltip(function(marker) {
+                return {{ this.get_name() }}_text({{ this.tooltip_text|tojson }}, marker.feature.properties);
+            });
+            {%- endif %}
+        {% endmacro %}
+    """)
+
+    def __init__(
+        self,
+        data: Dict,
+        style: Dict,
+        popup: Optional[List[str]] = None,
+        tooltip: Optional[str] = None,
+        name: Optional[str] = None,
+        show: bool = True,
+        control: bool = True
+    ):
+        super().__init__(data, name=name, show=show, control=control)
+        self._name = 'MarkerLayer'
+        self.marker_style = dict(style, fill=True)
+        self.popup_text = '<br>'.join(popup) if popup else None
+        self.tooltip_text = tooltip
+
+
+def cluster_levels(coords: pd.DataFrame, max_markers: int) -> Dict[int, ClusterLevel]:
+    """
+    Levels of a point set's cluster hierarchy to embed in a page
+
+    Returns:
+        Levels by zoom, from the coarsest up to the last one with at most
+        max_markers markers (the coarsest is always included)
+    """
+    clusters: PointClusters = cluster_points(coords)
+    levels = {}
+    for zoom, level in zip(clusters.zooms, clusters.levels):
+        if levels and level.size > max_markers:
+            break
+        levels[int(zoom)] = level
+    return levels
+
+
+def level_collection(
+    coords: pd.DataFrame,
+    properties: Dict[str, pd.Series],
+    level: ClusterLevel,
+    members: Optional[np.ndarray] = None
+) -> Dict:
+    """
+    GeoJSON FeatureCollection of one cluster level
+
+    Single points carry their properties; clusters carry their 'count',
+    and with members also their point features as 'points'.
+
+    Args:
+        members: Cluster of every point in this level (PointClusters.members)
+    """
+    single = level.point >= 0
+    rows = level.point[single]
+    points = point_collection(
+        pd.DataFrame({'lon': level.lon[single], 'lat': level.lat[single]}),
+        {key: align_to(values, coords.index).iloc[rows].reset_index(drop=True) for key, values in properties.items()}
+    )
+    clusters = point_collection(
+        pd.DataFrame({'lon': level.lon[~single], 'lat': level.lat[~single]}),
+        {'count': pd.Series(level.count[~single])}
+    )
+    if members is not None:
+        features = point_collection(coords, properties)['features']
+        order = np.argsort(members, kind='stable')
+        bounds = np.searchsorted(members[order], np.arange(level.size + 1))
+        for feature, cluster in zip(clusters['features'], np.flatnonzero(~single)):
+            feature['properties']['points'] = [features[row] for row in order[bounds[cluster]:bounds[cluster + 1]]]
+    return {'type': 'FeatureCollection', 'features': clusters['features'] + points['features']}
+
+
+class ClusteredMarkerLayer(MarkerLayer):
+    """
+    Cluster levels of a point set, switched client-side on zoom
+
+    Clusters are drawn larger with cluster_tooltip ('{count}' is the number
+    of points) and zoom the map in when clicked; single points behave as in
+    MarkerLayer. Above the deepest level the map keeps showing it, and its
+    clusters, which carry their points, are replaced by them when clicked.
+
+    Args:
+        levels: Level GeoJSON (see level_collection) by zoom, ascending
+        cluster_tooltip: Tooltip text of clusters
+        (other arguments as MarkerLayer)
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }}_text = function(text, properties) {
+                return text.replace(/\\{(\\w+)\\}/g, function(match, key) {
+                    var value = properties[key];
+                    return value == null ? '' : String(value).replace(/[&<>"']/g, function(c) {
+                        return '&#' + c.charCodeAt(0) + ';';
+                    });
+                });
+            };
+            var {{ this.get_name() }}_levels = {{ this.levels|tojson }};
+            var {{ this.get_name() }}_renderer = L.canvas({padding: 0.5});
+            var {{ this.get_name() }}_style = {{ this.marker_style|tojson }};
+            var {{ this.get_name() }} = L.geoJson(null, {
+                pointToLayer: function(feature, latlng) {
+                    var count = feature.properties.count, style = {{ this.get_name() }}_style;
+                    if (count) {
+                        style = L.extend({}, style, {
+                            radius: style.radius + 2 * Math.log2(count), fillOpacity: 0.5, weight: 2
+                        });
+                    }
+                    return L.circleMarker(latlng, L.extend({renderer: {{ this.get_name() }}_renderer}, style));
+                }
+            });
+            {{ this.get_name() }}.bindTooltip(function(marker) {
+                var properties = marker.feature.properties;
+                return {{ this.get_name() }}_text(properties.count
+                    ? {{ this.cluster_tooltip|tojson }} : {{ (this.tooltip_text or '')|tojson }}, properties);
+            });
+            {{ this.get_name() }}.on('click', function(e) {
+                var map = this._map, properties = e.layer.feature.properties;
+                if (properties.points) {
+                    this.removeLayer(e.layer).addData(properties.points);
+                    map.fitBounds(L.latLngBounds(properties.points.map(function(feature) {
+                        return L.GeoJSON.coordsToLatLng(feature.geometry.coordinates);
+                    })), {padding: [40, 40]});
+                }
+                else if (properties.count) {
+                    map.setView(e.latlng, map.getZoom() + 2);
+                }
+                {%- if this.popup_text %}
+                else {
+                    L.popup({maxWidth: 300}).setLatLng(e.latlng)
+                        .setContent({{ this.get_name() }}_text({{ this.popup_text|tojson }}, properties))
+                        .openOn(map);
+                }
+                {%- endif %}
+            });
+            {{ this.get_name() }}.showLevel = function() {
+                var zooms = {{ this.get_name() }}_levels.zooms, k = 0;
+                while (k + 1 < zooms.length && zooms[k + 1] <= this._map.getZoom()) k++;
+                if (this._level !== k) {
+                    this._level = k;
+                    this.clearLayers().addData({{ this.get_name() }}_levels.levels[k]);
+                }
+            };
+            {{ this.get_name() }}.on('add', function() {
+                this.showLevel();
+                this._map.on('zoomend', this.showLevel, this);
+            });
+            {{ this.get_name() }}.on('remove', function() {
+                this._map.off('zoomend', this.showLevel, this);
+            });
+        {% endmacro %}
+    """)
+
+    def __init__(self, levels: Dict[int, Dict], style: Dict, cluster_tooltip: str = '{count} points', **kwargs):
+        zooms = sorted(levels)
+        super().__init__(levels[zooms[-1]], style, **kwargs)
+        self._name = 'ClusteredMarkerLayer'
+        self.levels = {'zooms': zooms, 'levels': [levels[zoom] for zoom in zooms]}
+        self.cluster_tooltip = cluster_tooltip
+
+
+def marker_layer(
+    coords: pd.DataFrame,
+    properties: Dict[str, pd.Series],
+    style: Dict,
+    max_markers: Optional[int] = None,
+    cluster_label: str = 'points',
+    **kwargs
+) -> MarkerLayer:
+    """
+    Marker layer of a point set, clustered when it exceeds the marker budget
+
+    Every point is represented: up to max_markers points are drawn as they
+    are, larger sets as the levels of their cluster hierarchy holding at
+    most max_markers markers each (the coarsest level always). Every point
+    is also reachable: the clusters of the deepest level embed their points.
+
+    Args:
+        coords: lon/lat columns, as returned by point_coordinates
+        properties: Per-point property columns, aligned on the coords index
+        style: Leaflet circleMarker options
+        max_markers: Markers drawn per zoom level; None draws every point
+        cluster_label: Plural noun for the cluster tooltip ("12 schools")
+        **kwargs: popup, tooltip, name, show, control (see MarkerLayer)
+
+    Returns:
+        MarkerLayer, or ClusteredMarkerLayer for sets over max_markers
+    """
+    if not max_markers or len(coords) <= max_markers:
+        return MarkerLayer(point_collection(coords, properties), style, **kwargs)
+
+    levels = cluster_levels(coords, max_markers)
+    deepest = max(levels)
+    members = cluster_points(coords).members(deepest)
+    levels = {zoom: level_collection(coords, properties, level, members if zoom == deepest else None)
+              for zoom, level in levels.items()}
+    return ClusteredMarkerLayer(levels, style, cluster_tooltip='{count} ' + cluster_label, **kwargs)
@@ -0,0 +1,128 @@
+"""
+Hierarchical point clustering for DSS App v2
+Aggregates a state's schools or facilities into one level of cluster points
+per zoom, so a map can represent every point with a bounded number of
+markers. Clusters are built bottom-up on a Web Mercator pixel grid: each
+zoom merges the clusters of the zoom below it that fall in the same
+CLUSTER_CELL_PX cell, keeping their counts and count-weighted centroids
+(the same hierarchy supercluster builds, with grid cells instead of a
+radius search). Each level records the cluster one zoom out holding each of
+its clusters, so the points of any cluster can be looked up.
+"""
+
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+CLUSTER_CELL_PX = 60  # Grid cell size, in screen pixels at each zoom
+CLUSTER_MINZOOM = 3
+CLUSTER_MAXZOOM = 16  # Above it every point is its own marker
+TILE_SIZE = 256
+
+
+class ClusterLevel(NamedTuple):
+    """Cluster points of one zoom level"""
+    lon: np.ndarray
+    lat: np.ndarray
+    count: np.ndarray  # Points in each cluster
+    point: np.ndarray  # Row of the point for single-point clusters, -1 otherwise
+    parent: Optional[np.ndarray] = None  # Cluster of the level one zoom out holding each (None for the coarsest)
+
+    @property
+    def size(self) -> int:
+        return int(self.count.size)
+
+
+class PointClusters(NamedTuple):
+    """Cluster hierarchy of one point set, one level per zoom"""
+    zooms: np.ndarray
+    levels: List[ClusterLevel]
+
+    def at(self, zoom: float) -> ClusterLevel:
+        """Clusters to draw at a map zoom (clamped to the hierarchy's zooms)"""
+        k = int(np.clip(np.searchsorted(self.zooms, np.floor(zoom), side='right') - 1, 0, len(self.zooms) - 1))
+        return self.levels[k]
+
+    def members(self, zoom: int) -> np.ndarray:
+        """Cluster of every point (by row) in the level of a zoom of the hierarchy"""
+        cluster = np.arange(self.levels[-1].size)
+        for level in reversed(self.levels[int(np.searchsorted(self.zooms, zoom)) + 1:]):
+            cluster = level.parent[cluster]
+        return cluster
+
+
+def _mercator(lon: np.ndarray, lat: np.ndarray):
+    """WGS84 degrees to Web Mercator unit-square coordinates (y down)"""
+    x = (lon + 180.0) / 360.0
+    sin = np.sin(np.radians(np.clip(lat, -85.0511, 85.0511)))
+    y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * np.pi)
+    return x, y
+
+
+def _wgs84(x: np.ndarray, y: np.ndarray):
+    """Web Mercator unit-square coordinates back to WGS84 degrees"""
+    lon = x * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y))))
+    return lon, lat
+
+
+def build_point_clusters(
+    lon: np.ndarray,
+    lat: np.ndarray,
+    cell_px: int = CLUSTER_CELL_PX,
+    minzoom: int = CLUSTER_MINZOOM,
+    maxzoom: int = CLUSTER_MAXZOOM
+) -> PointClusters:
+    """
+    Build the cluster hierarchy of a point set
+
+    Args:
+        lon, lat: WGS84 point coordinates
+        cell_px: Grid cell size in pixels
+        minzoom, maxzoom: Zoom range of the hierarchy; the level above
+                          maxzoom holds the points themselves
+
+    Returns:
+        PointClusters with levels for minzoom..maxzoom + 1
+    """
+    x, y = _mercator(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+    count = np.ones(x.size, dtype=np.int64)
+    point = np.arange(x.size, dtype=np.int64)
+
+    levels = [[x, y, count, point, None]]
+    for zoom in range(maxzoom, minzoom - 1, -1):
+        cells = TILE_SIZE * 2 ** zoom / cell_px
+        key = np.floor(x * cells).astype(np.int64) * (int(cells) + 1) + np.floor(y * cells).astype(np.int64)
+        _, group = np.unique(key, return_inverse=True)
+        levels[-1][4] = group
+        merged = np.bincount(group, weights=count).astype(np.int64)
+        x = np.bincount(group, weights=x * count) / merged
+        y = np.bincount(group, weights=y * count) / merged
+        single = np.full(merged.size, -1, dtype=np.int64)
+        single[group[merged[group] == 1]] = point[merged[group] == 1]
+        count, point = merged, single
+        levels.append([x, y, count, point, None])
+
+    levels = [ClusterLevel(*_wgs84(lx, ly), lc, lp, lg) for lx, ly, lc, lp, lg in reversed(levels)]
+    return PointClusters(np.arange(minzoom, maxzoom + 2), levels)
+
+
+def cluster_points(coords: pd.DataFrame) -> PointClusters:
+    """
+    Cluster hierarchy of a point set's lon/lat columns
+
+    Built once per distinct point set and shared across sessions; point
+    rows refer to positions in coords.
+
+    Args:
+        coords: lon/lat columns, as returned by marker_layer.point_coordinates
+    """
+    return _cluster_points(coords['lon'].to_numpy(dtype=np.float64), coords['lat'].to_numpy(dtype=np.float64))
+
+
+@st.cache_resource(max_entries=100)
+def _cluster_points(lon: np.ndarray, lat: np.ndarray) -> PointClusters:
+    """Cached hierarchy keyed by the coordinate arrays"""
+    return build_point_clusters(lon, lat)
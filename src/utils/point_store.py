@@ -0,0 +1,267 @@
+"""
+Point store for SchoolShare DSS
+Per-state GeoParquet of schools, arts facilities and hospitals in WGS84
+
+`python src/ingest.py points` converts the meter-projected HS_/OM_/HO_ pickles
+into STORE_PATH/points/<kind>/state=<code>.parquet with:
+
+    <key>     - typed ID index column: NCESSCH (schools), NCARID (arts), ID (hospitals)
+    lat, lon  - WGS84 coordinates, precomputed
+    geometry  - WGS84 point geometry (GeoParquet)
+    ...       - the attribute columns of the source file
+
+Loaders read only the key, lat/lon and the attribute columns they name, so no
+geometry is decoded or reprojected at request time. States without a point
+file fall back to their processed pickle, converted to the same shape.
+
+`python src/ingest.py orgmap` converts the national OrgMap workbook, the arts
+fallback for states without an OM_ pickle, into STORE_PATH/orgmap partitioned
+by service and state, with the columns renamed as the maps expect. The
+workbook itself is never read at request time.
+"""
+
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+
+from config import STORE_PATH
+from .manifest import STATES, DataManifest, cache_key, get_manifest
+
+POINT_STORE_PATH = STORE_PATH / "points"
+ORGMAP_STORE_PATH = STORE_PATH / "orgmap"
+
+# kind -> (manifest service, processed pickle kind, key column)
+POINT_KINDS = {
+    'schools': (None, 'schools', 'NCESSCH'),
+    'arts': ('arts', 'facilities', 'NCARID'),
+    'hospitals': ('hospitals', 'facilities', 'ID'),
+}
+
+# Column holding the state in the national (unclipped) pickles
+_NATIONAL_STATE_COLUMNS = {
+    'schools': ('State_FIPS_code', 'fips'),
+    'arts': ('State', 'code'),
+    'hospitals': ('ST_FIPS', 'fips'),
+}
+
+# Attribute columns read by the maps and tabs
+SCHOOL_COLUMNS = ['School Name', 'NAME', 'District', 'CITY', 'City', 'State', 'Students*', 'Students', 'Locale']
+ARTS_COLUMNS = ['name', 'OrgName', 'city', 'City', 'State', 'org_type', 'NTEECC', 'macro_sector', 'address', 'Address']
+HOSPITAL_COLUMNS = ['NAME', 'TYPE', 'BEDS', 'TRAUMA', 'CITY', 'STATE']
+
+# OrgMap workbook columns renamed for consistency with the other sources
+ORGMAP_COLUMNS = {
+    'OrgName': 'name',
+    'Latitude': 'lat',
+    'Longitude': 'lon',
+    'Address': 'address',
+    'City': 'city',
+    'NTEECC': 'org_type',
+}
+
+
+def typed_keys(values) -> pd.Index:
+    """IDs as int64 when they are all integral, else as strings"""
+    numeric = pd.to_numeric(pd.Series(values), errors='coerce')
+    if numeric.notna().all() and (numeric % 1 == 0).all():
+        return pd.Index(numeric.astype(np.int64))
+    return pd.Index(pd.Series(values).astype(str))
+
+
+def points_from_gdf(gdf: gpd.GeoDataFrame, kind: str) -> gpd.GeoDataFrame:
+    """
+    Convert a processed (meter-projected) GeoDataFrame to the point-store shape
+
+    Args:
+        gdf: Processed schools/facilities GeoDataFrame
+        kind: 'schools', 'arts' or 'hospitals'
+
+    Returns:
+        WGS84 GeoDataFrame indexed by the typed key, with lat/lon columns
+    """
+    key = POINT_KINDS[kind][2]
+    geometry = gdf.geometry
+    if not (geometry.geom_type == 'Point').all():
+        geometry = geometry.representative_point()
+    geometry = geometry.to_crs(epsg=4326) if gdf.crs is not None else geometry
+
+    df = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+    keys = df.pop(key) if key in df.columns else gdf.index
+    df.index = typed_keys(keys)
+    df.index.name = key
+
+    # Mixed-type object columns cannot be written to Parquet as-is
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].astype('string')
+    df['lat'] = geometry.y.to_numpy()
+    df['lon'] = geometry.x.to_numpy()
+    return gpd.GeoDataFrame(df, geometry=gpd.GeoSeries(geometry.to_numpy(), index=df.index, crs=geometry.crs))
+
+
+def load_points(kind: str, state: str, columns: Optional[Sequence[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Load a state's schools or facilities with WGS84 coordinates
+
+    Args:
+        kind: 'schools', 'arts' or 'hospitals'
+        state: State name or abbreviation
+        columns: Attribute columns to read (those absent from the file are
+                 skipped); None reads all of them
+
+    Returns:
+        DataFrame indexed by the typed key with lat, lon and the requested
+        columns, or None if the state has no data of this kind
+    """
+    service, pickle_kind, _ = POINT_KINDS[kind]
+    state_code, _ = cache_key(state)
+    manifest = get_manifest()
+    version = (manifest.fingerprint(state_code, service, 'points')
+               or manifest.fingerprint(state_code, service, pickle_kind))
+    if version is None:
+        return None
+    return _load_points(kind, state_code, tuple(columns) if columns is not None else None, version)
+
+
+@st.cache_data(max_entries=300)
+def _load_points(kind: str, state_code: str, columns: Optional[Tuple[str, ...]],
+                 source_version: Tuple) -> Optional[pd.DataFrame]:
+    """Cached loader keyed by kind, state code, columns and source fingerprint"""
+    service, pickle_kind, key = POINT_KINDS[kind]
+    manifest = get_manifest()
+
+    path = manifest.path(state_code, service, 'points')
+    if path is not None:
+        available = pq.read_schema(path).names
+        wanted = [key, 'lat', 'lon'] + [c for c in (columns or available)
+                                        if c in available and c not in (key, 'lat', 'lon', 'geometry')]
+        return pd.read_parquet(path, columns=wanted).set_index(key)
+
+    path = manifest.path(state_code, service, pickle_kind)
+    if path is None:
+        return None
+    try:
+        df = pd.DataFrame(points_from_gdf(pd.read_pickle(path), kind).drop(columns='geometry'))
+    except Exception:
+        return None
+    if columns is not None:
+        df = df[['lat', 'lon'] + [c for c in columns if c in df.columns and c not in ('lat', 'lon')]]
+    return df
+
+
+def load_orgmap_facilities(state: str, columns: Optional[Sequence[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Load a state's arts organizations from the compiled OrgMap store
+
+    Args:
+        state: State name or abbreviation
+        columns: Attribute columns to read; None reads all of them
+
+    Returns:
+        DataFrame indexed by NCARID (when present) with lat, lon and the
+        requested columns, or None if the store has no partition for the state
+    """
+    state_code, _ = cache_key(state)
+    version = get_manifest().fingerprint(state_code, 'arts', 'orgmap_store')
+    if version is None:
+        return None
+    return _load_orgmap_facilities(state_code, tuple(columns) if columns is not None else None, version)
+
+
+@st.cache_data(max_entries=100)
+def _load_orgmap_facilities(state_code: str, columns: Optional[Tuple[str, ...]],
+                            source_version: Tuple) -> Optional[pd.DataFrame]:
+    """Cached loader keyed by state code, columns and partition fingerprint"""
+    path = get_manifest().path(state_code, 'arts', 'orgmap_store')
+    if path is None:
+        return None
+    available = pq.ParquetDataset(path).schema.names
+    key = [POINT_KINDS['arts'][2]] if POINT_KINDS['arts'][2] in available else []
+    wanted = key + ['lat', 'lon'] + [c for c in (columns or available)
+                                     if c in available and c not in key + ['lat', 'lon']]
+    df = pd.read_parquet(path, columns=wanted)
+    return df.set_index(key[0]) if key else df
+
+
+def build_orgmap_store(orgmap_path: Path, store_path: Path = ORGMAP_STORE_PATH) -> int:
+    """
+    Convert the national OrgMap workbook into state-partitioned Parquet
+
+    Args:
+        orgmap_path: OrgMap .xlsx file
+        store_path: Root directory of the OrgMap store (replaced)
+
+    Returns:
+        Number of organizations written
+    """
+    df = pd.read_excel(orgmap_path).rename(columns=ORGMAP_COLUMNS)
+    df = df[df['State'].notna()].copy()
+
+    key = POINT_KINDS['arts'][2]
+    if key in df.columns:
+        df[key] = typed_keys(df[key]).to_numpy()
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].astype('string')
+    df['service'] = 'arts'
+    df['state'] = df['State'].astype(str)
+
+    if store_path.exists():
+        shutil.rmtree(store_path)
+    df.to_parquet(store_path, index=False, partition_cols=['service', 'state'])
+    return len(df)
+
+
+def _write_points(gdf: gpd.GeoDataFrame, kind: str, state_code: str, store_path: Path) -> None:
+    path = store_path / kind / f"state={state_code}.parquet"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    gdf.reset_index().to_parquet(path, index=False)
+
+
+def build_point_store(
+    manifest: Optional[DataManifest] = None,
+    store_path: Path = POINT_STORE_PATH
+) -> Dict[str, int]:
+    """
+    Convert the processed pickles into per-state point files
+
+    Per-state (clipped) pickles are converted directly. States that only
+    appear in a national pickle are split out of it, so no request ever has
+    to unpickle the national file.
+
+    Args:
+        manifest: Manifest to read processed files from (default: fresh scan)
+        store_path: Root directory of the point store
+
+    Returns:
+        Number of states written per kind
+    """
+    manifest = manifest or DataManifest.scan()
+    counts: Dict[str, int] = {}
+    for kind, (service, pickle_kind, _) in POINT_KINDS.items():
+        written: List[str] = []
+        for (code, svc, _, k), entry in sorted(manifest.entries.items(), key=lambda item: str(item[0])):
+            if k != pickle_kind or svc != service or code is None:
+                continue
+            _write_points(points_from_gdf(pd.read_pickle(entry.path), kind), kind, code, store_path)
+            written.append(code)
+
+        national = manifest.path(None, service, pickle_kind)
+        if national is not None:
+            column, attr = _NATIONAL_STATE_COLUMNS[kind]
+            gdf = pd.read_pickle(national)
+            if column in gdf.columns:
+                values = gdf[column].astype(str).str.zfill(2) if attr == 'fips' else gdf[column].astype(str)
+                for state in STATES:
+                    if state.code in written:
+                        continue
+                    subset = gdf[(values == getattr(state, attr)).to_numpy()]
+                    if len(subset):
+                        _write_points(points_from_gdf(subset, kind), kind, state.code, store_path)
+                        written.append(state.code)
+        counts[kind] = len(written)
+    return counts
@@ -0,0 +1,396 @@
+"""
+Pre-rendered raster choropleth tiles for SchoolShare DSS
+
+`python src/ingest.py raster` draws the coverage choropleth of every state,
+activation rate and view into XYZ PNG tiles for the low zoom levels, where
+individual CBGs are a few pixels across and vector rendering buys nothing:
+
+    STORE_PATH/tiles/raster/<service>/metadata.json
+    STORE_PATH/tiles/raster/<service>/<rate>/<view>/{z}/{x}/{y}.png
+
+States are rendered in parallel (one process per state) into a staging
+directory; tiles that straddle a state border are then alpha-composited.
+Each zoom is drawn with matplotlib's Agg renderer in blocks of up to
+BLOCK_TILES x BLOCK_TILES tiles, reusing the block's paths for every rate
+and view, and sliced into 256-pixel tiles. Fully transparent tiles are not
+written.
+
+With --lazy only the metadata is written; the tile server then renders
+missing tiles on request (render_tile) and caches them on disk. The map
+shows the raster tiles up to metadata 'maxzoom' and switches to the vector
+layer above it (see RasterOverview in choropleth_map).
+"""
+
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PathCollection
+from matplotlib.figure import Figure
+from matplotlib.path import Path as MplPath
+from PIL import Image
+
+from config import STORE_PATH
+from .choropleth_map import VIEW_SLUGS, choropleth_features, load_cbg_geometries, view_colors
+from .coverage_store import load_coverage_data
+from .manifest import RASTER_TILES_DIR, STATES, get_manifest
+from .vector_tiles import MERCATOR_HALF, MERCATOR_MAX_LAT, tile_bounds
+
+RASTER_TILES_PATH = STORE_PATH / RASTER_TILES_DIR
+DEFAULT_RASTER_MINZOOM = 3
+DEFAULT_RASTER_MAXZOOM = 7   # The map switches to vector CBGs above this zoom
+TILE_SIZE = 256
+BLOCK_TILES = 8              # Tiles per side of one rendered canvas (2048 px)
+SIMPLIFY_PIXELS = 0.5        # Simplification tolerance in screen pixels
+
+
+def _pixel_size(z: int) -> float:
+    """Web Mercator metres per pixel at a zoom level"""
+    return 2 * MERCATOR_HALF / (TILE_SIZE << z)
+
+
+def _to_pixels(coords: np.ndarray, z: int) -> np.ndarray:
+    """Web Mercator coordinates to global pixel coordinates (y down) at a zoom level"""
+    size = _pixel_size(z)
+    return np.column_stack([(coords[:, 0] + MERCATOR_HALF) / size, (MERCATOR_HALF - coords[:, 1]) / size])
+
+
+@lru_cache(maxsize=8)
+def state_geometry(state_code: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """(GEOIDs, Web Mercator geometries) of a state's CBGs, polygons oriented for nonzero filling"""
+    gdf = load_cbg_geometries(state_code)
+    if gdf is None:
+        return None
+    geometry = gdf.geometry.clip_by_rect(-180, -MERCATOR_MAX_LAT, 180, MERCATOR_MAX_LAT).to_crs(epsg=3857)
+    # Exteriors counter-clockwise and holes clockwise, so holes stay empty under the nonzero rule
+    return gdf['GEOID'].to_numpy(), shapely.orient_polygons(geometry.to_numpy())
+
+
+def state_colors(state_code: str, service: str, rate: int, geoids: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Fill colours of every view at one rate, aligned to the geometry rows
+
+    CBGs without coverage data are left transparent.
+    """
+    coverage_df = load_coverage_data(state_code, service, rate)
+    if coverage_df is None:
+        return {}
+    features, view_styles = choropleth_features(coverage_df)
+    rows = features.set_index('GEOID').index.get_indexer(geoids)
+    colors = {}
+    for view, slug in VIEW_SLUGS.items():
+        view_rgba = np.zeros((len(geoids), 4), dtype=np.uint8)
+        view_rgba[rows >= 0] = view_colors(features, view_styles[view])[rows[rows >= 0]]
+        colors[slug] = view_rgba
+    return colors
+
+
+def _paths(geometries: np.ndarray, z: int) -> Tuple[List[MplPath], np.ndarray, np.ndarray]:
+    """
+    One compound path per CBG in global pixel coordinates
+
+    Returns:
+        (paths, row of each path, pixel bounds [n x 4] of each path)
+    """
+    simplified = shapely.simplify(geometries, _pixel_size(z) * SIMPLIFY_PIXELS)
+    parts, part_row = shapely.get_parts(simplified, return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+    if len(coords) == 0:
+        return [], np.empty(0, dtype=int), np.empty((0, 4))
+    pixels = _to_pixels(coords, z)
+
+    codes = np.full(len(coords), MplPath.LINETO, dtype=MplPath.code_type)
+    ring_start = np.flatnonzero(np.diff(coord_ring, prepend=-1))
+    codes[ring_start] = MplPath.MOVETO
+    codes[np.append(ring_start[1:], len(coords)) - 1] = MplPath.CLOSEPOLY
+
+    coord_row = part_row[ring_part[coord_ring]]
+    splits = np.flatnonzero(np.diff(coord_row)) + 1
+    rows = coord_row[np.append(0, splits)]
+    paths = [MplPath(v, c) for v, c in zip(np.split(pixels, splits), np.split(codes, splits))]
+    starts = np.append(0, splits)
+    bounds = np.column_stack([
+        np.minimum.reduceat(pixels[:, 0], starts), np.minimum.reduceat(pixels[:, 1], starts),
+        np.maximum.reduceat(pixels[:, 0], starts), np.maximum.reduceat(pixels[:, 1], starts),
+    ])
+    return paths, rows, bounds
+
+
+@lru_cache(maxsize=32)
+def state_paths(state_code: str, z: int) -> Tuple[List[MplPath], np.ndarray, np.ndarray]:
+    """_paths of a state's CBGs at a zoom level, kept for on-demand rendering"""
+    return _paths(state_geometry(state_code)[1], z)
+
+
+def _tile_range(bounds: np.ndarray, z: int) -> Tuple[int, int, int, int]:
+    """Inclusive tile range (x0, y0, x1, y1) covering pixel bounds"""
+    n_tiles = 1 << z
+    x0, y0 = (np.floor(bounds[:, :2].min(axis=0) / TILE_SIZE)).astype(int).clip(0, n_tiles - 1)
+    x1, y1 = (np.floor(bounds[:, 2:].max(axis=0) / TILE_SIZE)).astype(int).clip(0, n_tiles - 1)
+    return x0, y0, x1, y1
+
+
+def _blocks(x0: int, y0: int, x1: int, y1: int, block: int = BLOCK_TILES) -> Iterator[Tuple[int, int, int, int]]:
+    """Split a tile range into blocks of at most block x block tiles"""
+    for bx in range(x0, x1 + 1, block):
+        for by in range(y0, y1 + 1, block):
+            yield bx, by, min(bx + block - 1, x1), min(by + block - 1, y1)
+
+
+def render_block(
+    paths: List[MplPath],
+    path_bounds: np.ndarray,
+    colors: Dict[Tuple, np.ndarray],
+    x0: int, y0: int, x1: int, y1: int
+) -> Iterator[Tuple[Tuple, int, int, np.ndarray]]:
+    """
+    Draw a block of tiles once per colouring and slice it into tiles
+
+    Args:
+        paths: CBG paths in global pixel coordinates (_paths)
+        path_bounds: Pixel bounds of each path
+        colors: Fill colours (uint8 RGBA per path) by colouring key, e.g. (rate, view)
+        x0, y0, x1, y1: Inclusive tile range of the block
+
+    Yields:
+        (colouring key, x, y, RGBA tile array) for every non-empty tile
+    """
+    left, top = x0 * TILE_SIZE, y0 * TILE_SIZE
+    width, height = (x1 - x0 + 1) * TILE_SIZE, (y1 - y0 + 1) * TILE_SIZE
+    inside = ((path_bounds[:, 2] >= left) & (path_bounds[:, 0] <= left + width)
+              & (path_bounds[:, 3] >= top) & (path_bounds[:, 1] <= top + height))
+    if not inside.any():
+        return
+    selected = np.flatnonzero(inside)
+
+    figure = Figure(figsize=(width / 100, height / 100), dpi=100)
+    figure.patch.set_alpha(0)
+    canvas = FigureCanvasAgg(figure)
+    axes = figure.add_axes((0, 0, 1, 1))
+    axes.set_axis_off()
+    axes.set_xlim(left, left + width)
+    axes.set_ylim(top + height, top)
+    collection = PathCollection([paths[i] for i in selected], linewidths=0, edgecolors='none', antialiaseds=True)
+    axes.add_collection(collection)
+
+    for key, rgba in colors.items():
+        collection.set_facecolors(rgba[selected] / 255.0)
+        canvas.draw()
+        image = np.asarray(canvas.buffer_rgba())
+        for ty in range(y1 - y0 + 1):
+            for tx in range(x1 - x0 + 1):
+                tile = image[ty * TILE_SIZE:(ty + 1) * TILE_SIZE, tx * TILE_SIZE:(tx + 1) * TILE_SIZE]
+                if tile[:, :, 3].any():
+                    yield key, x0 + tx, y0 + ty, tile.copy()
+
+
+def _write_png(path: Path, tile: np.ndarray) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+    Image.fromarray(tile, 'RGBA').save(tmp_path, format='PNG', compress_level=6)
+    tmp_path.replace(path)
+
+
+def tile_path(root: Path, rate: int, view: str, z: int, x: int, y: int) -> Path:
+    return root / str(rate) / view / str(z) / str(x) / f"{y}.png"
+
+
+def _overlaps(bounds: Optional[List[float]], box: Tuple[float, float, float, float]) -> bool:
+    """Whether state bounds (state_bounds) intersect a tile box"""
+    return not (bounds is None or bounds[0] > box[2] or bounds[2] < box[0]
+                or bounds[1] > box[3] or bounds[3] < box[1])
+
+
+def render_state(
+    state_code: str,
+    service: str,
+    rates: List[int],
+    minzoom: int,
+    maxzoom: int,
+    staging: Path
+) -> List[str]:
+    """
+    Render one state's tiles into staging/<state code>/ (process pool worker)
+
+    Returns:
+        Paths of the written tiles, relative to the state's staging directory
+    """
+    geometry = state_geometry(state_code)
+    if geometry is None:
+        return []
+    geoids, geometries = geometry
+    colors = {}
+    for rate in rates:
+        for view, rgba in state_colors(state_code, service, rate, geoids).items():
+            colors[(rate, view)] = rgba
+    if not colors:
+        return []
+
+    root = staging / state_code
+    written = []
+    for z in range(minzoom, maxzoom + 1):
+        paths, rows, bounds = _paths(geometries, z)
+        if not paths:
+            continue
+        path_colors = {key: rgba[rows] for key, rgba in colors.items()}
+        for block in _blocks(*_tile_range(bounds, z)):
+            for (rate, view), x, y, tile in render_block(paths, bounds, path_colors, *block):
+                path = tile_path(root, rate, view, z, x, y)
+                _write_png(path, tile)
+                written.append(str(path.relative_to(root)))
+    return written
+
+
+def _composite(sources: List[Path], path: Path) -> None:
+    """Alpha-composite tiles of neighbouring states into one"""
+    image = Image.open(sources[0]).convert('RGBA')
+    for source in sources[1:]:
+        image = Image.alpha_composite(image, Image.open(source).convert('RGBA'))
+    _write_png(path, np.asarray(image))
+
+
+def state_bounds(state_code: str) -> Optional[List[float]]:
+    """Web Mercator bounds of a state's CBGs"""
+    geometry = state_geometry(state_code)
+    if geometry is None:
+        return None
+    return [round(float(v), 1) for v in shapely.total_bounds(geometry[1])]
+
+
+def _write_metadata(root: Path, metadata: Dict) -> None:
+    tmp_path = root / "metadata.json.tmp"
+    tmp_path.write_text(json.dumps(metadata, indent=1))
+    tmp_path.replace(root / "metadata.json")
+
+
+def build_raster_tiles(
+    service: str,
+    path: Path = RASTER_TILES_PATH,
+    minzoom: int = DEFAULT_RASTER_MINZOOM,
+    maxzoom: int = DEFAULT_RASTER_MAXZOOM,
+    states: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    lazy: bool = False
+) -> Dict[str, int]:
+    """
+    Render the coverage choropleth of a service into a raster tile pyramid
+
+    Args:
+        service: 'arts' or 'hospitals'
+        path: Raster tile root; the pyramid goes into path/<service> (replaced)
+        minzoom: Lowest zoom level
+        maxzoom: Highest zoom level; the map draws vector CBGs above it
+        states: State codes to render (default: every state with coverage data);
+                the other states of an existing pyramid stay in its metadata,
+                and their tiles (including those shared with the rendered
+                states) are left to the tile server to render on demand
+        workers: Worker processes (default: one per CPU)
+        lazy: Only write the metadata; the tile server renders tiles on demand
+
+    Returns:
+        Number of tiles written per state
+    """
+    manifest = get_manifest()
+    codes = states or [state.code for state in STATES if manifest.rates(state.code, service)]
+    rates = {code: manifest.rates(code, service) for code in codes}
+
+    root = path / service
+    # A build of some states keeps the others of the previous pyramid, rendered on demand
+    previous = (read_raster_metadata(root) or {}) if states else {}
+    kept = {code: bounds for code, bounds in previous.get('states', {}).items() if code not in codes}
+    build_root = path / f"{service}.tmp"
+    shutil.rmtree(build_root, ignore_errors=True)
+    staging = build_root / "_staging"
+    counts = {code: 0 for code in codes}
+
+    if not lazy:
+        # One process per state; tiles shared by neighbouring states are composited afterwards
+        sources: Dict[str, List[Path]] = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = {code: pool.submit(render_state, code, service, rates[code], minzoom, maxzoom, staging)
+                    for code in codes}
+            for code, job in jobs.items():
+                tiles = job.result()
+                counts[code] = len(tiles)
+                for tile in tiles:
+                    sources.setdefault(tile, []).append(staging / code / tile)
+        for tile, tile_sources in sources.items():
+            rate, view, z, x, y = Path(tile).with_suffix('').parts
+            if any(_overlaps(bounds, tile_bounds(int(z), int(x), int(y))) for bounds in kept.values()):
+                continue  # Also draws a kept state: left to the tile server
+            target = build_root / tile
+            if len(tile_sources) == 1:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tile_sources[0].replace(target)
+            else:
+                _composite(tile_sources, target)
+        shutil.rmtree(staging, ignore_errors=True)
+
+    build_root.mkdir(parents=True, exist_ok=True)
+    _write_metadata(build_root, {
+        'service': service,
+        'rates': sorted({rate for code_rates in rates.values() for rate in code_rates}
+                        | set(previous.get('rates', []) if kept else [])),
+        'views': VIEW_SLUGS,
+        'minzoom': minzoom,
+        'maxzoom': maxzoom,
+        'complete': not lazy and not kept,
+        'states': dict(kept, **{code: state_bounds(code) for code in codes}),
+    })
+    shutil.rmtree(root, ignore_errors=True)
+    build_root.replace(root)
+    return counts
+
+
+def read_raster_metadata(root: Path) -> Optional[Dict]:
+    """metadata.json of a service's raster pyramid, or None if it is not built"""
+    try:
+        return json.loads((root / "metadata.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def render_tile(root: Path, metadata: Dict, rate: int, view: str, z: int, x: int, y: int) -> Optional[bytes]:
+    """
+    Render one missing tile on demand and cache it under root
+
+    Only the states whose bounds overlap the tile are drawn. An empty tile
+    is cached as a zero-byte file, so it is not rendered again.
+
+    Returns:
+        PNG bytes, or None if no CBG falls in the tile
+    """
+    path = tile_path(root, rate, view, z, x, y)
+    tile_box = tile_bounds(z, x, y)
+
+    image = None
+    for code, bounds in metadata.get('states', {}).items():
+        if not _overlaps(bounds, tile_box):
+            continue
+        if rate not in get_manifest().rates(code, metadata['service']):
+            continue
+        geometry = state_geometry(code)
+        if geometry is None:
+            continue
+        colors = state_colors(code, metadata['service'], rate, geometry[0])
+        if view not in colors:
+            continue
+        paths, rows, path_bounds = state_paths(code, z)
+        for _, _, _, tile in render_block(paths, path_bounds, {view: colors[view][rows]}, x, y, x, y):
+            layer = Image.fromarray(tile, 'RGBA')
+            image = layer if image is None else Image.alpha_composite(image, layer)
+
+    if image is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+        return None
+    _write_png(path, np.asarray(image))
+    return path.read_bytes()
@@ -10,7 +10,7 @@ import streamlit as st
 from typing import Dict, Optional, List, Tuple
 import random
 
-@st.cache_data(ttl=3600)
+@st.cache_data(max_entries=200)
 def load_school_locations_from_nces(state: str, nces_ids: List[str]) -> pd.DataFrame:
     """
     Create synthetic school location data based on NCES IDs
@@ -94,7 +94,7 @@ def load_school_locations_from_nces(state: str, nces_ids: List[str]) -> pd.DataF
     
     return pd.DataFrame(schools)
 
-@st.cache_data(ttl=3600)
+@st.cache_data(max_entries=200)
 def load_arts_locations(state: str, n_facilities: int) -> pd.DataFrame:
     """
     Create synthetic arts venue location data
@@ -129,7 +129,7 @@ def load_arts_locations(state: str, n_facilities: int) -> pd.DataFrame:
     
     return pd.DataFrame(arts_venues)
 
-@st.cache_data(ttl=3600)
+@st.cache_data(max_entries=200)
 def load_hospital_locations(state: str, n_facilities: int) -> pd.DataFrame:
     """
     Create synthetic hospital location data
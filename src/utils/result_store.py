@@ -0,0 +1,393 @@
+"""
+Columnar result store for SchoolShare DSS
+Compiles the optimization result CSVs into typed Parquet tables
+
+The store holds three tables, each partitioned by service and state:
+    metrics   - tidy scalar metrics (state, service, rate, metric, value)
+    schools   - activated schools, one row per (rate, order, ncessch)
+    pairings  - facility-school assignments, one row per (rate, facility_id, school_id)
+
+The baseline ('existing') column of the CSV is stored with rate = BASELINE_RATE.
+
+Results are returned as a dictionary whose per-rate entries are RateResult
+mappings: scalar metrics are available immediately, while the activated school
+list and pairings are parsed (or read from the store) on first access.
+"""
+
+import shutil
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import STORE_PATH
+from .cell_parser import EMPTY_IDS, EMPTY_PAIRS, parse_pairing_array, parse_school_ids
+from .manifest import DataManifest, canonical_service
+
+RESULT_STORE_PATH = STORE_PATH / "results"
+
+# Row labels of the transposed result CSV that hold lists rather than scalars
+SCHOOL_ROW = 'open facility NCESSCH'
+PAIRING_ROW = 'assignment(NCARID,NCESSCH)'
+
+BASELINE_COLUMN = 'existing'
+BASELINE_RATE = -1
+
+TABLES = ('metrics', 'schools', 'pairings')
+
+
+def activation_rate(column: str) -> int:
+    """Convert a result column label ('p=25%') to its activation rate (25)"""
+    return int(column.replace('p=', '').replace('%', ''))
+
+
+def metrics_from_csv(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the scalar rows of a transposed result CSV (read with index_col=0)
+    into a tidy (rate, metric, value) table
+    """
+    columns = [col for col in df.columns if col == BASELINE_COLUMN or col.startswith('p=')]
+    list_rows = [row for row in (SCHOOL_ROW, PAIRING_ROW) if row in df.index]
+
+    # Scalar metrics: every cell that parses as a number
+    scalars = df.loc[df.index.difference(list_rows), columns]
+    metrics = scalars.apply(pd.to_numeric, errors='coerce')
+    metrics.columns = [BASELINE_RATE if col == BASELINE_COLUMN else activation_rate(col) for col in columns]
+    metrics = (
+        metrics.rename_axis(index='metric', columns='rate')
+        .stack()
+        .rename('value')
+        .reset_index()
+    )
+    metrics['rate'] = metrics['rate'].astype(np.int16)
+    metrics['value'] = metrics['value'].astype(np.float64)
+    return metrics
+
+
+def _uniform_ids(table: pd.DataFrame) -> pd.DataFrame:
+    """Store a file's IDs as strings when its rates mix integer and string IDs"""
+    for col in ('ncessch', 'facility_id', 'school_id'):
+        if col in table.columns and table[col].dtype == object:
+            table[col] = table[col].astype(str)
+    return table
+
+
+def tables_from_csv(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Split a transposed result CSV (read with index_col=0) into tidy tables
+
+    Returns:
+        (metrics, schools, pairings) DataFrames keyed by rate
+    """
+    columns = [col for col in df.columns if col.startswith('p=')]
+
+    schools = []
+    pairings = []
+    for col in columns:
+        rate = activation_rate(col)
+
+        if SCHOOL_ROW in df.index:
+            ids = parse_school_ids(df.loc[SCHOOL_ROW, col])
+            if len(ids):
+                schools.append(pd.DataFrame({
+                    'rate': np.int16(rate),
+                    'order': np.arange(len(ids), dtype=np.int32),
+                    'ncessch': ids,
+                }))
+
+        if PAIRING_ROW in df.index:
+            pairs = parse_pairing_array(df.loc[PAIRING_ROW, col])
+            if len(pairs):
+                pairings.append(pd.DataFrame({
+                    'rate': np.int16(rate),
+                    'facility_id': pairs[:, 0],
+                    'school_id': pairs[:, 1],
+                }))
+
+    schools = _uniform_ids(pd.concat(schools, ignore_index=True)) if schools else pd.DataFrame(
+        {'rate': pd.Series(dtype=np.int16), 'order': pd.Series(dtype=np.int32),
+         'ncessch': pd.Series(dtype=np.int64)})
+    pairings = _uniform_ids(pd.concat(pairings, ignore_index=True)) if pairings else pd.DataFrame(
+        {'rate': pd.Series(dtype=np.int16), 'facility_id': pd.Series(dtype=np.int64),
+         'school_id': pd.Series(dtype=np.int64)})
+
+    return metrics_from_csv(df), schools, pairings
+
+
+class CsvCellSource:
+    """Raw list cells of one result column, parsed on demand"""
+
+    def __init__(self, school_cell, pairing_cell):
+        self.school_cell = school_cell
+        self.pairing_cell = pairing_cell
+
+    def load(self, field: str) -> np.ndarray:
+        if field == 'activated_schools':
+            return parse_school_ids(self.school_cell)
+        return parse_pairing_array(self.pairing_cell)
+
+
+class StoreSource:
+    """One (state, service, rate) slice of the Parquet result store"""
+
+    def __init__(self, state_code: str, service: str, rate: int, store_path: Path = RESULT_STORE_PATH):
+        self.state_code = state_code
+        self.service = canonical_service(service)
+        self.rate = rate
+        self.store_path = store_path
+
+    def load(self, field: str) -> np.ndarray:
+        # Each partition is read on its own: ID types may differ between states
+        filters = [('rate', '==', self.rate)]
+        if field == 'activated_schools':
+            path = partition_path('schools', self.state_code, self.service, self.store_path)
+            if not path.exists():
+                return EMPTY_IDS
+            table = pd.read_parquet(path, columns=['order', 'ncessch'], filters=filters)
+            return table.sort_values('order')['ncessch'].to_numpy()
+
+        path = partition_path('pairings', self.state_code, self.service, self.store_path)
+        if not path.exists():
+            return EMPTY_PAIRS
+        table = pd.read_parquet(path, columns=['facility_id', 'school_id'], filters=filters)
+        return table.to_numpy() if len(table) else EMPTY_PAIRS
+
+
+class RateResult(Mapping):
+    """
+    Results for one activation rate
+
+    Behaves like the plain dictionary the app has always used. The scalar
+    metrics are held directly; 'activated_schools' and 'facility_school_pairings'
+    are materialized from the source on first access and kept afterwards.
+    """
+
+    LAZY_FIELDS = ('activated_schools', 'facility_school_pairings')
+
+    def __init__(self, scalars: Dict, source):
+        self._data = dict(scalars)
+        self._source = source
+
+    def __getitem__(self, key):
+        if key in self.LAZY_FIELDS and key not in self._data:
+            self._data[key] = self._source.load(key)
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._data
+        yield from (field for field in self.LAZY_FIELDS if field not in self._data)
+
+    def __len__(self) -> int:
+        return len(set(self._data) | set(self.LAZY_FIELDS))
+
+    def is_materialized(self, field: str) -> bool:
+        """Whether a lazy field has been loaded yet"""
+        return field in self._data
+
+
+def _metric_table(metrics: pd.DataFrame) -> pd.DataFrame:
+    """Pivot tidy metrics to a metric x rate lookup table"""
+    return metrics.pivot_table(index='metric', columns='rate', values='value', aggfunc='first')
+
+
+def _rates(table: pd.DataFrame) -> List[int]:
+    return sorted(int(rate) for rate in table.columns if rate != BASELINE_RATE)
+
+
+def metadata_from_metrics(metrics: pd.DataFrame) -> Dict:
+    """
+    Extract the state metadata (problem sizes and distance thresholds)
+    and baseline metrics from a tidy metrics table
+    """
+    table = _metric_table(metrics)
+    rates = _rates(table)
+    first = rates[0] if rates else None
+
+    def value(metric, rate):
+        """Metric value, or None if the table lacks it (missing row, rate or cell)"""
+        try:
+            cell = table.loc[metric, rate]
+        except KeyError:
+            return None
+        return None if pd.isna(cell) else cell
+
+    def count(metric, rate):
+        # Missing counts read as 0, as for a table without rates
+        cell = value(metric, rate)
+        return int(cell) if cell is not None else 0
+
+    def measure(metric, rate):
+        cell = value(metric, rate)
+        if cell is None:
+            print(f"Missing {metric!r} for {'existing' if rate == BASELINE_RATE else f'p={rate}%'}")
+            return float('nan')
+        return float(cell)
+
+    return {
+        'metadata': {
+            'n_cbgs': count('|I|', first),
+            'n_schools': count('|J|', first),
+            'n_facilities': count('|Q|', first),
+            'primary_dist_m': measure('delta1 threshold', first) if first is not None else 0.0,
+            'secondary_dist_m': measure('delta2 threshold', first) if first is not None else 0.0,
+        },
+        'baseline': {
+            'primary_coverage': measure('Primary coverage', BASELINE_RATE),
+            'secondary_coverage': measure('Secondary coverage', BASELINE_RATE),
+            'avg_distance_m': measure('Customer Avg dist to fac', BASELINE_RATE),
+            'max_distance_m': measure('Customer Max dist to fac', BASELINE_RATE),
+        },
+    }
+
+
+def build_results(metrics: pd.DataFrame, sources: Dict[int, object], state: str, service: str) -> Dict:
+    """
+    Build the results dictionary used by the app
+
+    Args:
+        metrics: Tidy (rate, metric, value) table
+        sources: Per-rate sources for the lazy list fields
+        state: State name
+        service: Service label
+
+    Returns:
+        Dictionary with metadata, baseline and per-rate RateResult entries
+    """
+    table = _metric_table(metrics)
+
+    def value(metric, rate):
+        return table.loc[metric, rate]
+
+    results = {'state': state, 'service': service}
+    results.update(metadata_from_metrics(metrics))
+    results['optimized'] = {}
+
+    for rate in _rates(table):
+        try:
+            scalars = {
+                'n_schools_activated': int(value('num facility to open', rate)),
+                'primary_coverage': float(value('Primary coverage', rate)),
+                'secondary_coverage': float(value('Secondary coverage', rate)),
+                'avg_distance_m': float(value('Customer Avg dist to fac', rate)),
+                'max_distance_m': float(value('Customer Max dist to fac', rate)),
+                'min_distance_m': float(value('Customer Min dist to fac', rate)),
+                'nonwhite_pct': float(value('Nonwhite % (secondary cover)', rate)),
+                'nonbach_pct': float(value('NonBach % (secondary cover)', rate)),
+                'computation_time': float(value('Total Time (sec)', rate)),
+            }
+        except (KeyError, ValueError) as e:
+            print(f"Error parsing p={rate}%: {e}")
+            continue
+        results['optimized'][rate] = RateResult(scalars, sources[rate])
+
+    return results
+
+
+def results_from_csv(df: pd.DataFrame, state: str, service: str) -> Dict:
+    """
+    Build lazy results from a transposed result CSV (read with index_col=0)
+
+    Only the scalar rows are converted here; list cells are kept as raw
+    strings until a rate's school list or pairings are first accessed.
+    """
+    def cell(row, col):
+        return df.loc[row, col] if row in df.index else None
+
+    sources = {
+        activation_rate(col): CsvCellSource(cell(SCHOOL_ROW, col), cell(PAIRING_ROW, col))
+        for col in df.columns if col.startswith('p=')
+    }
+    return build_results(metrics_from_csv(df), sources, state, service)
+
+
+def partition_path(table: str, state_code: str, service: str, store_path: Path = RESULT_STORE_PATH) -> Path:
+    """Directory of one state and service in a store table"""
+    return store_path / table / f"service={canonical_service(service)}" / f"state={state_code}"
+
+
+def has_store_partition(state_code: str, service: str, store_path: Path = RESULT_STORE_PATH) -> bool:
+    """Check whether the store holds results for this state and service"""
+    return partition_path('metrics', state_code, service, store_path).exists()
+
+
+def read_store_metrics(state_code: str, service: str, store_path: Path = RESULT_STORE_PATH) -> Optional[pd.DataFrame]:
+    """
+    Read the tidy metrics partition for one state and service
+
+    Returns:
+        (rate, metric, value) DataFrame, or None if the state is not in the store
+    """
+    if not has_store_partition(state_code, service, store_path):
+        return None
+    filters = [('service', '==', canonical_service(service)), ('state', '==', state_code)]
+    return pd.read_parquet(store_path / 'metrics', columns=['rate', 'metric', 'value'], filters=filters)
+
+
+def load_results_from_store(state: str, state_code: str, service: str) -> Optional[Dict]:
+    """
+    Load the results dictionary for a state from the Parquet store
+
+    Returns:
+        Results dictionary, or None if the state is not in the store
+    """
+    metrics = read_store_metrics(state_code, service)
+    if metrics is None:
+        return None
+    sources = {
+        rate: StoreSource(state_code, service, rate)
+        for rate in metrics['rate'].unique().tolist() if rate != BASELINE_RATE
+    }
+    return build_results(metrics, sources, state, service)
+
+
+def _write_table(frames: List[pd.DataFrame], path: Path) -> None:
+    """Write one store table partitioned by service and state"""
+    if not frames:
+        return
+    # One partition per frame, so each keeps its own ID type (see _uniform_ids)
+    for table in frames:
+        if len(table):
+            table.to_parquet(path, index=False, partition_cols=['service', 'state'])
+
+
+def build_result_store(
+    manifest: Optional[DataManifest] = None,
+    store_path: Path = RESULT_STORE_PATH
+) -> Dict[str, int]:
+    """
+    Compile every result CSV into the Parquet result store
+
+    Args:
+        manifest: Data manifest listing the result files (scanned if not given)
+        store_path: Output directory; existing tables are replaced
+
+    Returns:
+        Number of result files compiled per service
+    """
+    manifest = manifest or DataManifest.scan()
+    frames = {name: [] for name in TABLES}
+    counts = {}
+
+    for (state_code, service, _, kind), entry in sorted(manifest.entries.items(), key=lambda item: str(item[0])):
+        if kind != 'result':
+            continue
+        df = pd.read_csv(entry.path, index_col=0)
+
+        for name, table in zip(TABLES, tables_from_csv(df)):
+            table.insert(0, 'state', state_code)
+            table.insert(0, 'service', service)
+            frames[name].append(table)
+
+        counts[service] = counts.get(service, 0) + 1
+        print(f"  {service}: {Path(entry.path).name}")
+
+    for name in TABLES:
+        path = store_path / name
+        if path.exists():
+            shutil.rmtree(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_table(frames[name], path)
+
+    return counts
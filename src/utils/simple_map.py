@@ -4,12 +4,11 @@ Simplified map visualization using only optimization results
 
 import folium
 import folium.plugins
-from folium.plugins import MarkerCluster
-import streamlit as st
 from typing import List, Tuple, Optional
-import pandas as pd
 from pathlib import Path
-from config import PROCESSED_PATH
+from .map_assets import use_local_assets
+from .marker_layer import marker_layer, point_coordinates
+from .point_store import load_points
 
 def create_clustered_school_map(
     state: str,
@@ -19,27 +18,9 @@ def create_clustered_school_map(
 ) -> Optional[folium.Map]:
     """
     Create a simple map with direct markers for all activated schools.
-    No limit by default - shows all schools selected by the optimization.
+    No limit by default - shows all schools selected by the optimization;
+    with max_markers, larger selections are drawn as zoom-dependent clusters.
     """
-    # State FIPS mapping
-    state_to_fips = {
-        'Alabama': '01', 'Arizona': '04', 'Arkansas': '05', 'California': '06',
-        'Colorado': '08', 'Connecticut': '09', 'Delaware': '10', 'District of Columbia': '11',
-        'Florida': '12', 'Georgia': '13', 'Idaho': '16', 'Illinois': '17',
-        'Indiana': '18', 'Iowa': '19', 'Kansas': '20', 'Kentucky': '21',
-        'Louisiana': '22', 'Maine': '23', 'Maryland': '24', 'Massachusetts': '25',
-        'Michigan': '26', 'Minnesota': '27', 'Mississippi': '28', 'Missouri': '29',
-        'Montana': '30', 'Nebraska': '31', 'Nevada': '32', 'New Hampshire': '33',
-        'New Jersey': '34', 'New Mexico': '35', 'New York': '36', 'North Carolina': '37',
-        'North Dakota': '38', 'Ohio': '39', 'Oklahoma': '40', 'Oregon': '41',
-        'Pennsylvania': '42', 'Rhode Island': '44', 'South Carolina': '45',
-        'South Dakota': '46', 'Tennessee': '47', 'Texas': '48', 'Utah': '49',
-        'Vermont': '50', 'Virginia': '51', 'Washington': '53', 'West Virginia': '54',
-        'Wisconsin': '55', 'Wyoming': '56'
-    }
-
-    state_fips = state_to_fips.get(state, '48')
-
     # State centers for map initialization
     state_centers = {
         'Texas': (31.0, -99.0), 'California': (36.7, -119.4), 'New York': (42.9, -75.5),
@@ -49,18 +30,9 @@ def create_clustered_school_map(
     }
     center = state_centers.get(state, (39.8, -98.5))
 
-    # Try to load school data from configurable path
-    file_path = PROCESSED_PATH / f"HS_gdf_meters_clipped_{state_fips}.pkl"
-
-    if not file_path.exists():
-        return None
-
-    try:
-        gdf = pd.read_pickle(file_path)
-        if hasattr(gdf, 'geometry'):
-            gdf = gdf.to_crs(epsg=4326)
-    except Exception as e:
-        st.warning(f"Could not load school data: {e}")
+    # School locations, already in WGS84
+    gdf = load_points('schools', state, [])
+    if gdf is None:
         return None
 
     # Create simple base map - no extra plugins
@@ -71,33 +43,19 @@ def create_clustered_school_map(
     )
 
     activated_set = set(str(s) for s in activated_schools)
-    count = 0
-
-    # Add markers directly to map (simpler, more reliable)
-    for idx, school in gdf.iterrows():
-        if str(idx) in activated_set:
-            if hasattr(school, 'geometry'):
-                lat, lon = school.geometry.y, school.geometry.x
-            else:
-                continue
+    coords = point_coordinates(gdf[gdf.index.astype(str).isin(activated_set)])
 
-            # Simple circle marker - small for performance with many markers
-            folium.CircleMarker(
-                location=[lat, lon],
-                radius=3,  # Smaller for dense areas
-                color='#27ae60',
-                fill=True,
-                fillColor='#2ecc71',
-                fillOpacity=0.7,
-                weight=1
-            ).add_to(m)
-
-            count += 1
-            # Only limit if explicitly set
-            if max_markers and count >= max_markers:
-                break
+    # One canvas-drawn layer added directly to the map - small markers for dense areas
+    marker_layer(
+        coords,
+        {},
+        style={'radius': 3, 'color': '#27ae60', 'fillColor': '#2ecc71', 'fillOpacity': 0.7, 'weight': 1},
+        max_markers=max_markers,
+        cluster_label='schools',
+        control=False
+    ).add_to(m)
 
-    return m
+    return use_local_assets(m)
 
 def create_simple_optimization_map(
     state: str,
@@ -215,7 +173,7 @@ def create_simple_optimization_map(
     # Add scale
     folium.plugins.MiniMap().add_to(m)
     
-    return m
+    return use_local_assets(m)
 
 def create_coverage_circles_map(
     state: str,
@@ -281,4 +239,4 @@ def create_coverage_circles_map(
                 fillOpacity=0.8
             ).add_to(m)
     
-    return m
\ No newline at end of file
+    return use_local_assets(m)
\ No newline at end of file
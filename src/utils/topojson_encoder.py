@@ -0,0 +1,203 @@
+"""
+TopoJSON encoder for CBG boundaries
+
+Adjacent CBGs share edges, so serializing every polygon ring independently
+(GeoJSON) sends each shared edge twice at full float64 precision. This encoder
+builds a TopoJSON topology instead:
+
+    1. Coordinates are quantized to an integer grid over the layer's bounds.
+    2. Rings are cut at junctions, points where the neighbouring vertices
+       differ between the rings passing through them, into arcs; arcs shared
+       by neighbouring CBGs are stored once and referenced from both.
+    3. Arcs are simplified (Douglas-Peucker) with their endpoints fixed, so
+       neighbours keep sharing the same simplified edge and no gaps open.
+    4. Arcs are delta-encoded as the TopoJSON spec allows with a transform.
+
+Everything except the per-ring arc cutting is vectorized with NumPy/shapely.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+DEFAULT_QUANTIZATION = 100000
+
+
+def build_topology(
+    gdf: gpd.GeoDataFrame,
+    object_name: str = 'cbg',
+    quantization: int = DEFAULT_QUANTIZATION,
+    tolerance: float = 0.0
+) -> Dict:
+    """
+    Encode polygon geometries as a quantized TopoJSON topology
+
+    Args:
+        gdf: GeoDataFrame of Polygon/MultiPolygon geometries
+        object_name: Name of the GeometryCollection in 'objects'
+        quantization: Grid size per axis (1e5 is ~15 m across Texas)
+        tolerance: Arc simplification tolerance in CRS units (0 = none)
+
+    Returns:
+        TopoJSON dict; geometries are in gdf row order and have no
+        properties (see with_properties)
+    """
+    geoms = gdf.geometry.values
+    n_features = len(geoms)
+    x0, y0, x1, y1 = gdf.total_bounds if n_features else (0.0, 0.0, 1.0, 1.0)
+    sx = (x1 - x0) / (quantization - 1) or 1.0
+    sy = (y1 - y0) / (quantization - 1) or 1.0
+
+    parts, part_feature = shapely.get_parts(geoms, return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+
+    # Quantize, then drop each ring's closing point and repeated points
+    qx = np.rint((coords[:, 0] - x0) / sx).astype(np.int64)
+    qy = np.rint((coords[:, 1] - y0) / sy).astype(np.int64)
+    keep = np.ones(len(coords), dtype=bool)
+    if len(coords):
+        new_ring = np.r_[True, coord_ring[1:] != coord_ring[:-1]]
+        last_of_ring = np.r_[new_ring[1:], True]
+        keep = ~last_of_ring & (new_ring | (qx != np.roll(qx, 1)) | (qy != np.roll(qy, 1)))
+    qx, qy, coord_ring = qx[keep], qy[keep], coord_ring[keep]
+    # A ring's last point can still repeat its first after quantization
+    starts = np.searchsorted(coord_ring, np.arange(len(rings)))
+    ends = np.searchsorted(coord_ring, np.arange(len(rings)), side='right')
+    wraps = (ends - starts > 1)
+    wrap_last = ends[wraps] - 1
+    dup = (qx[wrap_last] == qx[starts[wraps]]) & (qy[wrap_last] == qy[starts[wraps]])
+    if dup.any():
+        keep = np.ones(len(qx), dtype=bool)
+        keep[wrap_last[dup]] = False
+        qx, qy, coord_ring = qx[keep], qy[keep], coord_ring[keep]
+        starts = np.searchsorted(coord_ring, np.arange(len(rings)))
+        ends = np.searchsorted(coord_ring, np.arange(len(rings)), side='right')
+    lengths = ends - starts
+
+    # Junctions: points whose neighbour pair differs between occurrences
+    key = (qx << 32) | qy
+    pos = np.arange(len(key)) - np.repeat(starts, lengths)
+    ring_len = np.repeat(lengths, lengths)
+    idx = np.arange(len(key))
+    prev_key = key[np.where(pos == 0, idx + ring_len - 1, idx - 1)]
+    next_key = key[np.where(pos == ring_len - 1, idx - ring_len + 1, idx + 1)]
+    pairs = np.unique(np.stack([key, np.minimum(prev_key, next_key), np.maximum(prev_key, next_key)], axis=1), axis=0)
+    keys, counts = np.unique(pairs[:, 0], return_counts=True)
+    is_junction = np.isin(key, keys[counts > 1])
+
+    # Cut rings into arcs and deduplicate them
+    points = np.stack([qx, qy], axis=1)
+    arc_index: Dict[bytes, int] = {}
+    arcs: List[np.ndarray] = []
+
+    def add_arc(arc: np.ndarray, closed: bool) -> int:
+        forward = arc.tobytes()
+        if forward in arc_index:
+            return arc_index[forward]
+        backward = arc[::-1]
+        if closed:
+            # Closed arcs are stored rotated to their smallest point
+            backward = _rotate_to_min(backward[:-1])
+        reverse = backward.tobytes()
+        if reverse in arc_index:
+            return ~arc_index[reverse]
+        arc_index[forward] = len(arcs)
+        arcs.append(arc)
+        return len(arcs) - 1
+
+    ring_arcs: List[Optional[List[int]]] = []
+    for r in range(len(rings)):
+        if lengths[r] < 3:
+            ring_arcs.append(None)
+            continue
+        ring = points[starts[r]:ends[r]]
+        cuts = np.flatnonzero(is_junction[starts[r]:ends[r]])
+        if len(cuts) == 0:
+            ring_arcs.append([add_arc(_rotate_to_min(ring), closed=True)])
+            continue
+        ring = np.roll(ring, -cuts[0], axis=0)
+        cuts = np.r_[cuts - cuts[0], len(ring)]
+        ring = np.vstack([ring, ring[:1]])
+        ring_arcs.append([add_arc(ring[a:b + 1], closed=False) for a, b in zip(cuts[:-1], cuts[1:])])
+
+    if tolerance > 0 and arcs:
+        arcs = _simplify_arcs(arcs, tolerance / max(sx, sy))
+
+    # Assemble Polygon/MultiPolygon geometries from their rings' arcs
+    polygons: List[List[List[int]]] = [[] for _ in range(len(parts))]
+    for r, arc_ids in enumerate(ring_arcs):
+        is_exterior = r == 0 or ring_part[r] != ring_part[r - 1]
+        if arc_ids is None:
+            if is_exterior:
+                polygons[ring_part[r]] = None
+            continue
+        if polygons[ring_part[r]] is not None:
+            polygons[ring_part[r]].append(arc_ids)
+
+    feature_polygons: List[List] = [[] for _ in range(n_features)]
+    for p, polygon in enumerate(polygons):
+        if polygon:
+            feature_polygons[part_feature[p]].append(polygon)
+
+    geometries = []
+    for polygon_list in feature_polygons:
+        if not polygon_list:
+            geometries.append({'type': None})
+        elif len(polygon_list) == 1:
+            geometries.append({'type': 'Polygon', 'arcs': polygon_list[0]})
+        else:
+            geometries.append({'type': 'MultiPolygon', 'arcs': polygon_list})
+
+    return {
+        'type': 'Topology',
+        'transform': {'scale': [sx, sy], 'translate': [float(x0), float(y0)]},
+        'objects': {object_name: {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': [_delta_encode(arc) for arc in arcs],
+    }
+
+
+def with_properties(topology: Dict, records: Sequence[Dict], object_name: str = 'cbg') -> Dict:
+    """
+    Attach per-feature properties to a topology without modifying it
+
+    Args:
+        topology: Topology from build_topology (may be shared/cached)
+        records: One properties dict per geometry, in the same order
+    """
+    geometries = topology['objects'][object_name]['geometries']
+    return {
+        **topology,
+        'objects': {object_name: {
+            'type': 'GeometryCollection',
+            'geometries': [{**geometry, 'properties': props} for geometry, props in zip(geometries, records)],
+        }},
+    }
+
+
+def _rotate_to_min(ring: np.ndarray) -> np.ndarray:
+    """Closed arc for a junction-free ring, starting at its smallest point"""
+    start = np.lexsort((ring[:, 1], ring[:, 0]))[0]
+    ring = np.roll(ring, -start, axis=0)
+    return np.vstack([ring, ring[:1]])
+
+
+def _simplify_arcs(arcs: List[np.ndarray], tolerance: float) -> List[np.ndarray]:
+    """Douglas-Peucker on every arc; endpoints (junctions) never move"""
+    lines = shapely.linestrings(np.vstack(arcs), indices=np.repeat(np.arange(len(arcs)), [len(a) for a in arcs]))
+    simplified = shapely.simplify(lines, tolerance, preserve_topology=False)
+    coords, index = shapely.get_coordinates(simplified, return_index=True)
+    bounds = np.searchsorted(index, np.arange(len(arcs) + 1))
+    result = []
+    for i, arc in enumerate(arcs):
+        new = coords[bounds[i]:bounds[i + 1]].astype(np.int64)
+        closed = len(arc) > 2 and (arc[0] == arc[-1]).all()
+        # Keep closed rings from collapsing below a triangle
+        result.append(arc if (closed and len(new) < 4) or len(new) < 2 else new)
+    return result
+
+
+def _delta_encode(arc: np.ndarray) -> List[List[int]]:
+    return np.vstack([arc[:1], np.diff(arc, axis=0)]).tolist()
@@ -0,0 +1,332 @@
+"""
+CBG vector tiles for SchoolShare DSS
+
+`python src/ingest.py tiles` cuts the national CBG geopackage into a Mapbox
+Vector Tile pyramid stored as MBTiles (SQLite) at STORE_PATH/tiles/cbg.mbtiles:
+
+    layer     - 'cbg', polygons in a 4096-unit tile extent
+    feature   - id = GEOID as an integer, one property GEOID (12-char string)
+    zooms     - DEFAULT_MINZOOM..DEFAULT_MAXZOOM; Leaflet overzooms the last
+    tile_data - gzip-compressed protobuf, rows in TMS order (MBTiles 1.3)
+
+Geometry is simplified per zoom to a fraction of a screen pixel and clipped
+to each tile with a small buffer, so the browser only downloads the tiles in
+view at the detail it can display. Tiles carry no coverage values; the map
+joins them to the current scenario by GEOID client-side, so one pyramid
+serves every service and activation rate.
+
+The protobuf is written directly (no mapbox-vector-tile dependency); see
+https://github.com/mapbox/vector-tile-spec/tree/master/2.1.
+"""
+
+import gzip
+import json
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from config import STORE_PATH
+from .cbg_store import CBG_GPKG_PATH, GEOID_COLUMN, read_cbg_geopackage
+from .manifest import CBG_TILES_FILE, STATES
+
+CBG_TILES_PATH = STORE_PATH / CBG_TILES_FILE
+CBG_TILE_LAYER = 'cbg'
+
+DEFAULT_MINZOOM = 4
+DEFAULT_MAXZOOM = 10
+TILE_EXTENT = 4096
+TILE_BUFFER = 64            # Clip buffer in tile units, hides seams at tile edges
+SIMPLIFY_UNITS = 8          # Simplification tolerance in tile units (1/2 screen pixel)
+
+MERCATOR_HALF = 20037508.342789244
+MERCATOR_MAX_LAT = 85.0511
+
+_POLYGON = 3
+
+
+def _varints(values: np.ndarray) -> Tuple[bytes, np.ndarray]:
+    """
+    Protobuf base-128 varint encoding of non-negative integers, vectorized
+
+    Returns:
+        (encoded bytes, byte length of each value)
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    shifts = np.arange(10, dtype=np.uint64) * np.uint64(7)
+    shifted = values[:, None] >> shifts
+    n_bytes = np.maximum(1, (shifted != 0).sum(axis=1))
+    more = np.arange(10) < (n_bytes - 1)[:, None]
+    encoded = ((shifted & np.uint64(0x7f)) | np.where(more, np.uint64(0x80), np.uint64(0))).astype(np.uint8)
+    return encoded[np.arange(10) < n_bytes[:, None]].tobytes(), n_bytes
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """Length-delimited field"""
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _ring_index(ring: np.ndarray, n_rings: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Start, length and per-point position of contiguous rings"""
+    starts = np.searchsorted(ring, np.arange(n_rings))
+    lengths = np.searchsorted(ring, np.arange(n_rings), side='right') - starts
+    return starts, lengths, np.arange(len(ring)) - starts[ring]
+
+
+def encode_geometries(geometries: np.ndarray, bounds: Tuple[float, float, float, float],
+                      extent: int = TILE_EXTENT) -> Tuple[np.ndarray, List[bytes]]:
+    """
+    MVT geometry commands of polygons clipped to one tile, vectorized
+
+    Coordinates are quantized to the tile extent (y down); rings are
+    deduplicated and wound as the spec requires (exterior with positive area
+    in tile coordinates, holes negative). Degenerate rings are dropped, and
+    a whole polygon when its exterior is degenerate.
+
+    Args:
+        geometries: Polygon/MultiPolygon geometries in Web Mercator metres
+        bounds: Tile bounds (minx, miny, maxx, maxy)
+        extent: Tile extent in integer units
+
+    Returns:
+        (indices of the geometries that survive, packed varint command
+        stream of each)
+    """
+    x0, y0, x1, y1 = bounds
+    parts, part_feature = shapely.get_parts(geometries, return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, ring = shapely.get_coordinates(rings, return_index=True)
+    q = np.empty((len(coords), 2), dtype=np.int64)
+    q[:, 0] = np.rint((coords[:, 0] - x0) / (x1 - x0) * extent)
+    q[:, 1] = np.rint((y1 - coords[:, 1]) / (y1 - y0) * extent)
+
+    # Drop closing points and repeated points, then a last point equal to the first
+    first = np.r_[True, ring[1:] != ring[:-1]]
+    last = np.r_[first[1:], True]
+    keep = ~last & (first | np.r_[True, (q[1:] != q[:-1]).any(axis=1)])
+    q, ring = q[keep], ring[keep]
+    starts, lengths, pos = _ring_index(ring, len(rings))
+    closing = (pos == lengths[ring] - 1) & (pos > 0) & (q == q[starts[ring]]).all(axis=1)
+    q, ring = q[~closing], ring[~closing]
+    starts, lengths, pos = _ring_index(ring, len(rings))
+
+    # Signed area per ring (shoelace, doubled) decides validity and winding
+    nxt = np.where(pos == lengths[ring] - 1, starts[ring], np.arange(len(ring)) + 1) if len(ring) else ring
+    area = np.bincount(ring, q[:, 0] * q[nxt, 1] - q[nxt, 0] * q[:, 1], minlength=len(rings))
+    exterior = np.r_[True, ring_part[1:] != ring_part[:-1]] if len(rings) else np.zeros(0, dtype=bool)
+    valid = (lengths >= 3) & (area != 0)
+    valid &= valid[np.flatnonzero(exterior)][np.cumsum(exterior) - 1]
+    reverse = (area > 0) != exterior
+
+    # Reorder the kept points: kept rings only, reversed where the winding is wrong
+    point = valid[ring]
+    ring, pos = ring[point], pos[point]
+    source = starts[ring] + np.where(reverse[ring], lengths[ring] - 1 - pos, pos)
+    pts = q[source]
+    feature = part_feature[ring_part[ring]]
+
+    # Deltas from the previous point; the pen starts at (0, 0) for each feature
+    deltas = np.diff(pts, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    feature_start = np.r_[True, feature[1:] != feature[:-1]] if len(feature) else np.zeros(0, dtype=bool)
+    deltas[feature_start] = pts[feature_start]
+    zigzag = ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64)
+
+    # Per ring: MoveTo(1) x y LineTo(n-1) x y ... ClosePath, 2n + 3 integers
+    kept = np.flatnonzero(valid)
+    n = lengths[kept]
+    ring_out = np.zeros(len(rings), dtype=np.int64)
+    ring_out[kept] = np.cumsum(2 * n + 3) - (2 * n + 3)
+    stream = np.empty(int((2 * n + 3).sum()), dtype=np.uint64)
+    stream[ring_out[kept]] = 1 | 1 << 3
+    stream[ring_out[kept] + 3] = 2 | (n - 1) << 3
+    stream[ring_out[kept] + 2 * n + 2] = 7 | 1 << 3
+    slot = ring_out[ring] + np.where(pos == 0, 1, 2 * pos + 2)
+    stream[slot] = zigzag[:, 0]
+    stream[slot + 1] = zigzag[:, 1]
+
+    # Split the encoded stream at feature boundaries
+    encoded, n_bytes = _varints(stream)
+    ring_feature = part_feature[ring_part[kept]]
+    features, first_ring = np.unique(ring_feature, return_index=True)
+    offsets = np.r_[0, np.cumsum(n_bytes)][np.r_[ring_out[kept][first_ring], len(stream)]]
+    return features, [encoded[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def encode_tile(geoids: np.ndarray, geometries: np.ndarray, bounds: Tuple[float, float, float, float],
+                layer: str = CBG_TILE_LAYER, extent: int = TILE_EXTENT) -> Optional[bytes]:
+    """
+    Encode clipped Web Mercator polygons as one single-layer vector tile
+
+    Args:
+        geoids: 12-character GEOID per geometry
+        geometries: Polygon/MultiPolygon geometries already clipped to the tile
+        bounds: Tile bounds (minx, miny, maxx, maxy) in Web Mercator metres
+        layer: Layer name
+        extent: Tile extent in integer units
+
+    Returns:
+        Uncompressed tile protobuf, or None if no feature survives
+    """
+    kept, commands = encode_geometries(geometries, bounds, extent)
+    if len(kept) == 0:
+        return None
+
+    features, values = [], []
+    for i, (f, geometry) in enumerate(zip(kept, commands)):
+        geoid = str(geoids[f])
+        values.append(_field(4, _field(1, geoid.encode())))
+        features.append(_field(2, (
+            _varint(1 << 3) + _varint(int(geoid)) +       # id
+            _field(2, _varint(0) + _varint(i)) +          # tags: GEOID -> value i
+            _varint(3 << 3) + _varint(_POLYGON) +         # type
+            _field(4, geometry)                           # geometry
+        )))
+
+    payload = (
+        _varint(15 << 3) + _varint(2) +
+        _field(1, layer.encode()) +
+        b''.join(features) +
+        _field(3, GEOID_COLUMN.encode()) +
+        b''.join(values) +
+        _varint(5 << 3) + _varint(extent)
+    )
+    return _field(3, payload)
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Web Mercator bounds of an XYZ tile"""
+    size = 2 * MERCATOR_HALF / (1 << z)
+    return (-MERCATOR_HALF + x * size, MERCATOR_HALF - (y + 1) * size,
+            -MERCATOR_HALF + (x + 1) * size, MERCATOR_HALF - y * size)
+
+
+def _tiles_at_zoom(geoids: np.ndarray, geometries: np.ndarray,
+                   z: int) -> Iterator[Tuple[int, int, bytes]]:
+    """Encode every non-empty tile of one zoom level"""
+    n_tiles = 1 << z
+    size = 2 * MERCATOR_HALF / n_tiles
+    buffer = size * TILE_BUFFER / TILE_EXTENT
+    simplified = shapely.simplify(geometries, size * SIMPLIFY_UNITS / TILE_EXTENT)
+    bounds = shapely.bounds(simplified)
+
+    # Tile ranges touched by each feature (with buffer), expanded to (feature, tile) pairs
+    tx0 = np.clip(np.floor((bounds[:, 0] - buffer + MERCATOR_HALF) / size), 0, n_tiles - 1).astype(np.int64)
+    tx1 = np.clip(np.floor((bounds[:, 2] + buffer + MERCATOR_HALF) / size), 0, n_tiles - 1).astype(np.int64)
+    ty0 = np.clip(np.floor((MERCATOR_HALF - bounds[:, 3] - buffer) / size), 0, n_tiles - 1).astype(np.int64)
+    ty1 = np.clip(np.floor((MERCATOR_HALF - bounds[:, 1] + buffer) / size), 0, n_tiles - 1).astype(np.int64)
+    nx, ny = tx1 - tx0 + 1, ty1 - ty0 + 1
+    feature = np.repeat(np.arange(len(geometries)), nx * ny)
+    offset = np.arange(len(feature)) - np.repeat(np.cumsum(nx * ny) - nx * ny, nx * ny)
+    tx = tx0[feature] + offset % nx[feature]
+    ty = ty0[feature] + offset // nx[feature]
+
+    order = np.lexsort((feature, ty, tx))
+    feature, tx, ty = feature[order], tx[order], ty[order]
+    breaks = np.flatnonzero(np.r_[True, (tx[1:] != tx[:-1]) | (ty[1:] != ty[:-1]), True])
+    for a, b in zip(breaks[:-1], breaks[1:]):
+        x, y = int(tx[a]), int(ty[a])
+        bx0, by0, bx1, by1 = tile_bounds(z, x, y)
+        clipped = shapely.clip_by_rect(simplified[feature[a:b]],
+                                       bx0 - buffer, by0 - buffer, bx1 + buffer, by1 + buffer)
+        keep = ~shapely.is_empty(clipped)
+        # Clipping can leave line/point fragments along the buffer edge
+        clipped = shapely.get_parts(clipped[keep], return_index=True)
+        polygons = shapely.get_type_id(clipped[0]) == 3
+        if not polygons.any():
+            continue
+        features, index = np.unique(clipped[1][polygons], return_inverse=True)
+        geoms = shapely.multipolygons(clipped[0][polygons], indices=index)
+        ids = geoids[feature[a:b][keep][features]]
+        data = encode_tile(ids, geoms, (bx0, by0, bx1, by1))
+        if data is not None:
+            yield x, y, data
+
+
+def read_cbg_national(gpkg_path: Path = CBG_GPKG_PATH) -> gpd.GeoDataFrame:
+    """All CBGs of the geopackage (GEOID and geometry) in Web Mercator"""
+    frames = [read_cbg_geopackage(gpkg_path, state.fips)[[GEOID_COLUMN, 'geometry']] for state in STATES]
+    gdf = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs=4326)
+    gdf['geometry'] = gdf.geometry.clip_by_rect(-180, -MERCATOR_MAX_LAT, 180, MERCATOR_MAX_LAT)
+    return gdf.to_crs(epsg=3857)
+
+
+def build_cbg_tiles(
+    gpkg_path: Path = CBG_GPKG_PATH,
+    path: Path = CBG_TILES_PATH,
+    minzoom: int = DEFAULT_MINZOOM,
+    maxzoom: int = DEFAULT_MAXZOOM,
+    gdf: Optional[gpd.GeoDataFrame] = None
+) -> Dict[int, int]:
+    """
+    Cut the CBG geometries into an MBTiles vector tile pyramid
+
+    Args:
+        gpkg_path: National CBG geopackage
+        path: MBTiles file to write (replaced if it exists)
+        minzoom: Lowest zoom level
+        maxzoom: Highest zoom level (overzoomed by the map beyond it)
+        gdf: CBGs to tile instead of reading the geopackage (any CRS)
+
+    Returns:
+        Number of tiles written per zoom level
+    """
+    gdf = read_cbg_national(gpkg_path) if gdf is None else gdf.to_crs(epsg=3857)
+    geoids = gdf[GEOID_COLUMN].astype(str).str.zfill(12).to_numpy()
+    geometries = gdf.geometry.to_numpy()
+
+    # Write to a sibling file and swap it in, so the tile server never reads a partial pyramid
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+    counts = {}
+    with closing(sqlite3.connect(tmp_path)) as conn, conn:
+        conn.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        conn.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+        for z in range(minzoom, maxzoom + 1):
+            rows = ((z, x, (1 << z) - 1 - y, gzip.compress(data, 6))
+                    for x, y, data in _tiles_at_zoom(geoids, geometries, z))
+            counts[z] = conn.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", rows).rowcount
+        conn.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+
+        west, south, east, north = gdf.to_crs(epsg=4326).total_bounds
+        metadata = {
+            'name': 'cbg', 'format': 'pbf', 'type': 'overlay', 'version': '1',
+            'minzoom': str(minzoom), 'maxzoom': str(maxzoom),
+            'bounds': f"{west:.4f},{south:.4f},{east:.4f},{north:.4f}",
+            'center': f"{(west + east) / 2:.4f},{(south + north) / 2:.4f},{minzoom}",
+            'json': json.dumps({'vector_layers': [{
+                'id': CBG_TILE_LAYER, 'fields': {GEOID_COLUMN: 'String'},
+                'minzoom': minzoom, 'maxzoom': maxzoom,
+            }]}),
+        }
+        conn.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+    tmp_path.replace(path)
+    return counts
+
+
+def read_tile(conn: sqlite3.Connection, z: int, x: int, y: int) -> Optional[bytes]:
+    """gzip-compressed tile at XYZ coordinates, or None if the pyramid has none"""
+    row = conn.execute(
+        "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+        (z, x, (1 << z) - 1 - y)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def read_metadata(conn: sqlite3.Connection) -> Dict[str, str]:
+    """MBTiles metadata table as a dict"""
+    return dict(conn.execute("SELECT name, value FROM metadata"))